@@ -1,16 +1,83 @@
+import json
 import os
 import logging
+import time
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from functools import partial
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+import click
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify
+
+from analytics import INTERVALS, build_analytics
+from assets import Assets
+from changes import ChangeFeed
+from bulk import (EXPORTS, FORMATS, IMPORTS, MIMETYPES, TIMESTAMP_FORMAT, export_rows, guess_format, import_rows,
+                  read_rows, text_stream, write_rows)
+from chat import ChatHub
+from grader import Grader, feedback_from_result
+from jobs import JobQueue, JobQueueFull
+from pagination import json_page, page_args, paginate
+from pair_sync import PairSyncHub
+from recommend import MODES as RECOMMENDATION_MODES, build_recommender
+from profiling import RequestMetrics
+from render_cache import RenderCache
+from routing import LazyBuildRule
+from scheduler import Scheduler
+from search import build_index, index_message, index_question, index_share
+from similarity import build_similarity_index, fingerprint_share, fingerprint_submission
+from store import DataStore
+from throttle import RateLimiter, SingleFlight, StreamLimit
+
+# Configure logging (DEBUG logs every request's internals and slows them down)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 app = Flask(__name__)
+# Routes register without compiling their URL builders (see routing.py)
+app.url_rule_class = LazyBuildRule
 app.secret_key = os.environ.get("SESSION_SECRET", "university-dashboard-secret-key")
+# Persistence backend: "memory" (default) or "sql" (SQLAlchemy, see sql_store.py)
+app.config['DATA_BACKEND'] = os.environ.get("DATA_BACKEND", "memory")
+app.config['DATABASE_URL'] = os.environ.get("DATABASE_URL", "sqlite:///eduhub.db")
+# Rendered page cache budget in bytes (0 disables). Off by default for the sql
+# backend, where another process's writes invalidate this process' cache only
+# once the change feed delivers them (up to CHANGE_FEED_INTERVAL later)
+app.config['RENDER_CACHE_BYTES'] = int(os.environ.get(
+    "RENDER_CACHE_BYTES", 0 if app.config['DATA_BACKEND'] == 'sql' else 32 * 1024 * 1024))
+# Default and maximum page sizes for paginated listings
+app.config['PAGE_SIZE'] = int(os.environ.get("PAGE_SIZE", "20"))
+app.config['MAX_PAGE_SIZE'] = int(os.environ.get("MAX_PAGE_SIZE", "100"))
+# Background job workers (bounded concurrency for follow-up work)
+app.config['JOB_WORKERS'] = int(os.environ.get("JOB_WORKERS", "4"))
+# Per-route timing histograms served at /metrics ("0" removes the hooks entirely)
+app.config['METRICS_ENABLED'] = os.environ.get("METRICS_ENABLED", "1") == "1"
+# Admin token allowing ?profile=1 sampling profiles (profiling is off when unset)
+app.config['PROFILE_TOKEN'] = os.environ.get("PROFILE_TOKEN")
+# Verify the incremental analytics counters against a full recompute on every read
+app.config['ANALYTICS_CONSISTENCY_CHECK'] = os.environ.get("ANALYTICS_CONSISTENCY_CHECK") == "1"
+# Per-client token buckets on the polling endpoints (429 when exceeded)
+app.config['RATE_LIMITS_ENABLED'] = os.environ.get("RATE_LIMITS_ENABLED", "1") == "1"
+# "production" serves minified, fingerprinted and precompressed assets with
+# year-long cache headers; "development" serves static files as edited
+app.config['APP_MODE'] = os.environ.get("APP_MODE", "development")
+app.config['ASSET_PIPELINE'] = os.environ.get(
+    "ASSET_PIPELINE", "1" if app.config['APP_MODE'] == 'production' else "0") == "1"
+# Server-Sent Events streams open at once per process. Each holds a request
+# thread while its tab is open, so keep it well below the threads serving
+# requests (WEB_THREADS); past it pages poll instead
+app.config['SSE_MAX_STREAMS'] = int(os.environ.get(
+    "SSE_MAX_STREAMS", max(1, int(os.environ.get("WEB_THREADS", "32")) // 2)))
+# Seconds a pair session's sync channel and edit history stay in memory once
+# nobody is watching or editing it (reloaded from the store on next use)
+app.config['PAIR_IDLE_TIMEOUT'] = float(os.environ.get("PAIR_IDLE_TIMEOUT", "600"))
+# Seconds between polls for the changes other processes on the same database
+# (gunicorn workers, flask CLI commands) made to their in-memory state; sql
+# backend only
+app.config['CHANGE_FEED_INTERVAL'] = float(os.environ.get("CHANGE_FEED_INTERVAL", "0.5"))
+# Seconds per deadline scheduler tick: questions open and close at most this late
+app.config['SCHEDULER_TICK'] = float(os.environ.get("SCHEDULER_TICK", "1"))
 
-# In-memory data storage
-students = [
+# Seed data
+seed_students = [
     {"id": 1, "name": "Arjun Sharma", "email": "arjun.sharma@university.edu"},
     {"id": 2, "name": "Priya Patel", "email": "priya.patel@university.edu"},
     {"id": 3, "name": "Rahul Kumar", "email": "rahul.kumar@university.edu"},
@@ -21,7 +88,7 @@ students = [
     {"id": 8, "name": "Meera Joshi", "email": "meera.joshi@university.edu"}
 ]
 
-questions = [
+seed_questions = [
     {
         'id': 1,
         'type': 'coding',
@@ -29,7 +96,17 @@ questions = [
         'description': 'Given an array of integers nums and an integer target, return indices of the two numbers such that they add up to target. You may assume that each input would have exactly one solution, and you may not use the same element twice.',
         'difficulty': 'Easy',
         'created_at': '2025-08-07 12:00:00',
-        'assigned_to': 'all'
+        'assigned_to': 'all',
+        'tests': {
+            'function': 'two_sum',
+            'unordered': True,
+            'cases': [
+                {'args': [[2, 7, 11, 15], 9], 'expected': [0, 1]},
+                {'args': [[3, 2, 4], 6], 'expected': [1, 2]},
+                {'args': [[3, 3], 6], 'expected': [0, 1]},
+                {'args': [[-1, -2, -3, -4, -5], -8], 'expected': [2, 4]}
+            ]
+        }
     },
     {
         'id': 2,
@@ -47,15 +124,23 @@ questions = [
         'description': 'Implement binary search algorithm to find a target value in a sorted array. The function should return the index of the target if found, otherwise return -1.',
         'difficulty': 'Medium',
         'created_at': '2025-08-07 12:30:00',
-        'assigned_to': 'all'
+        'assigned_to': 'all',
+        'tests': {
+            'function': 'binary_search',
+            'cases': [
+                {'args': [[-1, 0, 3, 5, 9, 12], 9], 'expected': 4},
+                {'args': [[-1, 0, 3, 5, 9, 12], 2], 'expected': -1},
+                {'args': [[5], 5], 'expected': 0},
+                {'args': [[], 1], 'expected': -1},
+                {'args': [list(range(0, 2000, 2)), 1556], 'expected': 778}
+            ]
+        }
     }
 ]
 
-submissions = []
-feedback = []
 
 # Peer Collaboration Data
-study_groups = [
+seed_study_groups = [
     {
         'id': 1,
         'name': 'Delhi Code Warriors',
@@ -85,8 +170,7 @@ study_groups = [
     }
 ]
 
-pair_programming_sessions = []
-code_shares = [
+seed_code_shares = [
     {
         'id': 1,
         'student_id': 1,
@@ -110,16 +194,366 @@ code_shares = [
         'comments': []
     }
 ]
-group_messages = []
+def create_store():
+    """Build the data store selected by DATA_BACKEND"""
+    if app.config['DATA_BACKEND'] == 'sql':
+        from sql_store import SqlStore
+        return SqlStore(app.config['DATABASE_URL'])
+    return DataStore()
+
+# Request timing and on-demand profiling
+request_metrics = RequestMetrics(app, enabled=app.config['METRICS_ENABLED'],
+                                 profile_token=app.config['PROFILE_TOKEN'])
+
+# Fingerprinted static assets (asset_url in templates, flask assets build)
+assets = Assets(app, enabled=app.config['ASSET_PIPELINE'])
+
+# Data storage: indexed in-memory dicts or a database, seeded when empty
+store = request_metrics.instrument(create_store())
+if not store.count_students():
+    store.load(students=seed_students,
+               questions=seed_questions,
+               study_groups=seed_study_groups,
+               code_shares=seed_code_shares)
+
+# What this process changes in the in-memory state below, published to the
+# other processes sharing the database, and what they change, applied here
+change_feed = ChangeFeed(store, enabled=app.config['DATA_BACKEND'] == 'sql',
+                         interval=app.config['CHANGE_FEED_INTERVAL'])
+
+# Full-text search over questions, code shares and group messages
+search_index = build_index(store)
+
+# Copy detection across submitted answers and shared code
+similarity_index = build_similarity_index(store)
+
+# Columnar submission/score arrays behind the professor dashboard charts
+cohort_analytics = build_analytics(store)
+
+# Skill vectors behind partner and study group suggestions
+recommender = build_recommender(store, cohort_analytics)
+
+# Push channel for live pair programming sessions; history checkpoints go
+# into the store's blob store when it keeps one
+pair_sync = PairSyncHub(store, blobs=getattr(store, 'blobs', None),
+                        idle_timeout=app.config['PAIR_IDLE_TIMEOUT'],
+                        on_version=partial(change_feed.publish, 'pair'))
+
+# Study group chat: recent history in memory, pushed to members
+chat_hub = ChatHub(store)
+
+# Cache for heavy pages, invalidated by the write routes
+render_cache = RenderCache(app.config['RENDER_CACHE_BYTES'])
+
+def invalidate(*entities):
+    """Bump cached pages showing ``entities``, here and in the other processes"""
+    render_cache.bump(*entities)
+    change_feed.publish('invalidate', *entities)
+
+# Sandboxed auto-grader for coding questions with test cases
+grader = Grader()
+
+# Limits for clients polling on timers, and sharing of identical concurrent reads
+rate_limiter = RateLimiter(enabled=app.config['RATE_LIMITS_ENABLED'])
+single_flight = SingleFlight()
+# Cap on open push streams, so they cannot take every request thread
+stream_limit = StreamLimit(app.config['SSE_MAX_STREAMS'])
 
-# Global counter for IDs
-next_question_id = 4
-next_submission_id = 1
-next_feedback_id = 1
-next_group_id = 4
-next_session_id = 1
-next_share_id = 3
-next_message_id = 1
+def event_stream(frames):
+    """A Server-Sent Events response, or 503 when every stream slot is taken and the page must poll"""
+    body = stream_limit.open(frames)
+    if body is None:
+        response = jsonify({'error': 'Too many open streams, poll instead', 'retry_after': 30})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    return Response(body, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def client_key(session_id=None):
+    """Rate limit bucket of the requesting client: its address and the pair session it works on"""
+    if session_id is None:
+        data = request.get_json(silent=True) if request.is_json else None
+        session_id = json_int(data.get('session_id')) if isinstance(data, dict) else None
+    # Only real sessions get their own bucket, or any made-up id would be a fresh one
+    if session_id is not None and pair_sync.channel(session_id) is None:
+        session_id = None
+    # The client id is whatever the client sends, so it cannot pick the bucket
+    return f'{request.remote_addr}:{session_id or ""}'
+
+# Background jobs so write routes return immediately; on a database their
+# status is kept there, so any worker can report it
+job_queue = JobQueue(workers=app.config['JOB_WORKERS'],
+                     journal=store if app.config['DATA_BACKEND'] == 'sql' else None)
+
+def index_submission(submission, question):
+    """Add a stored answer to copy detection and the cohort analytics"""
+    fingerprint_submission(similarity_index, submission, question)
+    cohort_analytics.add_submission(submission)
+
+@job_queue.register('index_submission')
+def index_submission_job(submission_id):
+    """Index a new submission, then queue its auto-grading if it is due one"""
+    submission = store.get_submission(submission_id)
+    question = store.get_question(submission['question_id'])
+    index_submission(submission, question)
+    change_feed.publish('submission', submission_id)
+    # Graded after indexing, so the score finds its analytics row. Questions
+    # with a deadline are graded in one batch when they close
+    if not grader.is_gradable(question) or question.get('closes_at'):
+        return {'graded': False}
+    try:
+        job_queue.enqueue('grade_submission', submission_id)
+    except JobQueueFull:
+        # A retry of this job would index the submission twice: grade it here
+        grade_submission_job(submission_id)
+    return {'graded': True}
+
+@job_queue.register('grade_submission')
+def grade_submission_job(submission_id):
+    """Auto-grade one submission and store the generated feedback"""
+    submission = store.get_submission(submission_id)
+    question = store.get_question(submission['question_id'])
+    result = grader.run(submission['answer'], question['tests'])
+    cohort_analytics.set_score(store.set_feedback(feedback_from_result(submission, result)))
+    recommender.mark(submission['student_id'])
+    change_feed.publish('feedback', [submission_id])
+    invalidate('feedback', f"status:{submission['student_id']}")
+    return {'score': result['score']}
+
+@job_queue.register('grade_question')
+def grade_question_job(question_id):
+    """Auto-grade every submission for a question across all cores"""
+    question = store.get_question(question_id)
+    question_submissions = store.submissions_for_question(question_id)
+    results = grader.grade_many([s['answer'] for s in question_submissions], question['tests'])
+    for submission, result in zip(question_submissions, results):
+        cohort_analytics.set_score(store.set_feedback(feedback_from_result(submission, result)))
+        recommender.mark(submission['student_id'])
+    change_feed.publish('feedback', [submission['id'] for submission in question_submissions])
+    invalidate('feedback', 'status')
+    return {'graded': len(results)}
+
+@job_queue.register('close_question')
+def close_question_job(question_id):
+    """Close-out work for a question whose deadline passed: batch grading and an analytics snapshot"""
+    closed_at = datetime.now().strftime(TIMESTAMP_FORMAT)
+    # Setting closed_at claims the close, so one process does the work, and
+    # the summary finishes it: a retry or a restart resumes a close left without one
+    if not store.close_question(question_id, closed_at):
+        question = store.get_question(question_id)
+        if question is None or question.get('close_summary'):
+            return {'closed': False}
+        closed_at = question['closed_at']
+    question = store.get_question(question_id)
+    graded = grade_question_job(question_id)['graded'] if grader.is_gradable(question) else 0
+    summary = {
+        'closed_at': closed_at,
+        'submissions': store.count_submissions(question_id=question_id),
+        'students': store.count_students(),
+        'auto_graded': graded,
+        'scores': cohort_analytics.score_distribution(question_id=question_id),
+    }
+    store.update_question(question_id, {'close_summary': summary})
+    invalidate('questions')
+    return {'closed': True, 'graded': graded}
+
+# Question open/close events on a timer wheel
+scheduler = Scheduler(tick=app.config['SCHEDULER_TICK'])
+
+@app.before_request
+def start_background_threads():
+    # Once in every process that serves requests, however it was started
+    # (gunicorn worker, flask run, python app.py): not in CLI commands, nor in
+    # a gunicorn master whose threads would not survive the fork
+    scheduler.ensure_started()
+    change_feed.ensure_started()
+
+@scheduler.register('question_opens')
+def question_opens(question_id):
+    """List the question as open on cached pages"""
+    render_cache.bump('questions', 'status')
+
+@scheduler.register('question_closes')
+def question_closes(question_id):
+    """List the question as closed and queue its close-out work"""
+    render_cache.bump('questions', 'status')
+    try:
+        job_queue.enqueue('close_question', question_id)
+    except JobQueueFull:
+        # Backlogged: try again in a few seconds rather than leave the close to a restart
+        app.logger.warning('Job queue full, retrying the close of question %s shortly', question_id)
+        scheduler.schedule(('closes', question_id), time.time() + 5, 'question_closes', question_id)
+
+def timestamp(value):
+    """Seconds since the epoch of a stored local time string"""
+    return datetime.strptime(value, TIMESTAMP_FORMAT).timestamp()
+
+def window_state(question, now):
+    """'upcoming', 'open' or 'closed': where ``now`` (a stored time string) falls in the question's window"""
+    if question.get('opens_at') and now < question['opens_at']:
+        return 'upcoming'
+    if question.get('closes_at') and now >= question['closes_at']:
+        return 'closed'
+    return 'open'
+
+def schedule_window(question):
+    """Schedule the open/close events of a question with a submission window"""
+    if question.get('opens_at') and timestamp(question['opens_at']) > time.time():
+        scheduler.schedule(('opens', question['id']), timestamp(question['opens_at']),
+                           'question_opens', question['id'])
+    # A deadline that passed while the app was down (or a close it cut short)
+    # fires on the next tick
+    if question.get('closes_at') and not question.get('close_summary'):
+        scheduler.schedule(('closes', question['id']), timestamp(question['closes_at']),
+                           'question_closes', question['id'])
+
+def schedule_pending_windows():
+    """Schedule every question window that has not opened or closed yet"""
+    for question in store.pending_windows(datetime.now().strftime(TIMESTAMP_FORMAT)):
+        schedule_window(question)
+
+schedule_pending_windows()
+
+def load_dataset(dataset):
+    """Bulk-load records (e.g. from benchmarks.synthetic) and index them"""
+    store.load(**dataset)
+    for question in dataset.get('questions', ()):
+        index_question(search_index, question)
+        schedule_window(question)
+    for share in dataset.get('code_shares', ()):
+        index_share(search_index, share)
+        fingerprint_share(similarity_index, share)
+    for message in dataset.get('group_messages', ()):
+        index_message(search_index, message)
+    questions = {question['id']: question for question in dataset.get('questions', ())}
+    for submission in dataset.get('submissions', ()):
+        question = questions.get(submission['question_id']) or store.get_question(submission['question_id'])
+        fingerprint_submission(similarity_index, submission, question)
+    cohort_analytics.add_submissions(dataset.get('submissions', ()))
+    cohort_analytics.set_scores(dataset.get('feedback', ()))
+    recommender.rebuild()
+    change_feed.publish('rebuild')
+    invalidate('students', 'questions', 'submissions', 'feedback', 'status', 'groups', 'shares')
+
+@app.cli.command('seed')
+@click.option('--students', default=1000, help='Number of synthetic students')
+@click.option('--questions', default=50, help='Number of synthetic questions')
+@click.option('--submissions', default=100000, help='Number of synthetic submissions')
+@click.option('--feedback-ratio', default=0.5, help='Fraction of submissions that get feedback')
+@click.option('--groups', default=0, help='Number of synthetic study groups')
+@click.option('--shares', default=0, help='Number of synthetic code shares')
+@click.option('--sessions', default=0, help='Number of synthetic pair programming sessions')
+@click.option('--messages', default=0, help='Number of synthetic group chat messages')
+def seed_command(students, questions, submissions, feedback_ratio, groups, shares, sessions, messages):
+    """Bulk-load a synthetic dataset into the configured store"""
+    from benchmarks.synthetic import generate
+    
+    start = datetime.now()
+    load_dataset(generate(store, students, questions, submissions, feedback_ratio,
+                          groups=groups, shares=shares, sessions=sessions, messages=messages))
+    click.echo(f'Loaded {store.count_submissions()} submissions in {(datetime.now() - start).total_seconds():.2f}s')
+
+def index_imported(kind, records):
+    """Index and invalidate for a batch of bulk-imported records"""
+    if kind == 'questions':
+        for question in records:
+            index_question(search_index, question)
+            schedule_window(question)
+            change_feed.publish('question', question['id'])
+    invalidate(kind)
+
+# Changes published by the other processes on the database, applied here
+
+@change_feed.register('invalidate')
+def invalidated(*entities):
+    render_cache.bump(*entities)
+
+@change_feed.register('question')
+def question_added(question_id):
+    question = store.get_question(question_id)
+    index_question(search_index, question)
+    schedule_window(question)
+
+@change_feed.register('submission')
+def submission_indexed(submission_id):
+    submission = store.get_submission(submission_id)
+    index_submission(submission, store.get_question(submission['question_id']))
+
+@change_feed.register('feedback')
+def feedback_given(submission_ids):
+    given = [feedback for feedback in map(store.feedback_for_submission, submission_ids) if feedback]
+    cohort_analytics.set_scores(given)
+    for feedback in given:
+        recommender.mark(feedback['student_id'])
+
+@change_feed.register('member')
+def member_joined(group_id, student_id):
+    recommender.joined(group_id, student_id)
+
+@change_feed.register('share')
+def share_added(share_id):
+    share = store.get_share(share_id)
+    index_share(search_index, share)
+    fingerprint_share(similarity_index, share)
+
+@change_feed.register('message')
+def message_posted(message):
+    chat_hub.receive(message)
+    index_message(search_index, message)
+
+@change_feed.register('pair')
+def pair_version(session_id, version, delta, client_id):
+    pair_sync.receive(session_id, version, delta, client_id)
+
+@change_feed.register('rebuild')
+@change_feed.on_resync
+def rebuild_state():
+    """Rebuild the indexes from the store, after a bulk load or missed changes"""
+    global search_index, similarity_index, cohort_analytics, recommender
+    search_index = build_index(store)
+    similarity_index = build_similarity_index(store)
+    cohort_analytics = build_analytics(store)
+    recommender = build_recommender(store, cohort_analytics)
+    chat_hub.reload()
+    schedule_pending_windows()
+    render_cache.bump('students', 'questions', 'submissions', 'feedback', 'status', 'groups', 'shares')
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='File format (default: from the extension)')
+def import_command(kind, path, fmt):
+    """Import a student roster or question bank from CSV/JSONL"""
+    fmt = fmt or guess_format(path)
+    with click.open_file(path, 'rb') as binary, text_stream(binary) as lines:
+        report = import_rows(store, kind, read_rows(lines, fmt), on_batch=index_imported)
+    for error in report.errors:
+        click.echo(f'line {error["line"]}: {"; ".join(error["errors"])}', err=True)
+    if report.rejected > len(report.errors):
+        click.echo(f'... and {report.rejected - len(report.errors)} more rejected rows', err=True)
+    click.echo(f'Imported {report.imported} {kind}, rejected {report.rejected} rows')
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.argument('path', default='-', type=click.Path(dir_okay=False, writable=True, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='File format (default: from the extension, else csv)')
+@click.option('--question-id', type=int, help='Only grades for this question')
+@click.option('--answers', is_flag=True, help='Include submitted answers with the grades')
+def export_command(kind, path, fmt, question_id, answers):
+    """Export the roster, question bank or grades as CSV/JSONL (to stdout by default)"""
+    fields, rows = export_rows(store, kind, question_id=question_id, answers=answers)
+    with click.open_file(path, 'w', encoding='utf-8', errors='strict') as out:
+        for chunk in write_rows(fields, rows, fmt or guess_format(path)):
+            out.write(chunk)
+
+def check_aggregates():
+    """Log any drift between the running counters and a full recompute"""
+    if not app.config['ANALYTICS_CONSISTENCY_CHECK']:
+        return
+    mismatches = store.verify_aggregates()
+    if mismatches:
+        app.logger.error("Analytics aggregates out of sync: %s", mismatches)
 
 @app.route('/')
 def index():
@@ -139,32 +573,35 @@ def professor_portal():
 @app.route('/student')
 def student():
     """Student main page with login form"""
-    return render_template('student_login.html', students=students)
+    return render_template('student_login.html', students=store.all_students())
 
 @app.route('/professor/dashboard')
+@render_cache.cached('students', 'questions', 'submissions', 'feedback')
 def professor_dashboard():
     """Professor dashboard with overview and analytics"""
+    check_aggregates()
+    
     # Calculate analytics
-    total_questions = len(questions)
-    total_submissions = len(submissions)
-    total_students = len(students)
+    total_questions = store.count_questions()
+    total_submissions = store.totals()['submissions']
+    total_students = store.count_students()
     
-    # Student progress data
+    # Student progress data from the precomputed counters
+    all_stats = store.all_student_stats()
     student_progress = []
-    for student in students:
-        student_submissions = [s for s in submissions if s['student_id'] == student['id']]
-        student_feedback = [f for f in feedback if f['student_id'] == student['id']]
+    for student in store.all_students():
+        stats = all_stats[student['id']]
         
         progress = {
             'student': student,
-            'submissions_count': len(student_submissions),
-            'feedback_count': len(student_feedback),
-            'completion_rate': (len(student_submissions) / max(total_questions, 1)) * 100
+            'submissions_count': stats['submissions'],
+            'feedback_count': stats['feedback'],
+            'completion_rate': (stats['submissions'] / max(total_questions, 1)) * 100
         }
         student_progress.append(progress)
     
     return render_template('professor_dashboard.html', 
-                         questions=questions,
+                         questions=store.all_questions(),
                          student_progress=student_progress,
                          total_questions=total_questions,
                          total_submissions=total_submissions,
@@ -173,8 +610,6 @@ def professor_dashboard():
 @app.route('/professor/assign_question', methods=['GET', 'POST'])
 def assign_question():
     """Assign new coding/interview question"""
-    global next_question_id
-    
     if request.method == 'POST':
         question_type = request.form.get('type')
         title = request.form.get('title')
@@ -185,57 +620,107 @@ def assign_question():
             flash('All fields are required!', 'error')
             return redirect(url_for('assign_question'))
         
+        # Optional submission window, from datetime-local inputs
+        try:
+            opens_at, closes_at = (form_time(request.form.get(field)) for field in ('opens_at', 'closes_at'))
+        except ValueError:
+            flash('Opening and closing times must be valid dates and times!', 'error')
+            return redirect(url_for('assign_question'))
+        now = datetime.now().strftime(TIMESTAMP_FORMAT)
+        if closes_at and (closes_at <= now or (opens_at and closes_at <= opens_at)):
+            flash('The closing time must be in the future and after the opening time!', 'error')
+            return redirect(url_for('assign_question'))
+        
         new_question = {
-            'id': next_question_id,
             'type': question_type,
             'title': title,
             'description': description,
             'difficulty': difficulty,
-            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'assigned_to': 'all'  # For simplicity, assign to all students
+            'created_at': now,
+            'assigned_to': 'all',  # For simplicity, assign to all students
+            'opens_at': opens_at,
+            'closes_at': closes_at
         }
         
-        questions.append(new_question)
-        next_question_id += 1
+        store.add_question(new_question)
+        index_question(search_index, new_question)
+        schedule_window(new_question)
+        change_feed.publish('question', new_question['id'])
+        invalidate('questions')
         
         flash(f'{question_type.title()} question "{title}" assigned successfully!', 'success')
         return redirect(url_for('professor_dashboard'))
     
     return render_template('professor.html', show_assign_form=True)
 
+def form_time(value):
+    """A datetime-local form value as a stored time string, or None when empty"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value).strftime(TIMESTAMP_FORMAT)
+
 @app.route('/professor/view_questions')
+@render_cache.cached('questions')
 def view_questions():
     """View all assigned questions"""
-    return render_template('professor.html', questions=questions, show_questions=True)
+    return render_template('professor.html', questions=store.all_questions(), show_questions=True)
+
+@app.route('/professor/bulk', methods=['GET', 'POST'])
+def bulk_data():
+    """Import a roster or question bank file; links to the exports"""
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        upload = request.files.get('file')
+        if kind not in IMPORTS or not upload or not upload.filename:
+            flash('Choose what to import and a CSV or JSONL file!', 'error')
+            return redirect(url_for('bulk_data'))
+        
+        report = import_rows(store, kind, read_rows(text_stream(upload.stream), guess_format(upload.filename)),
+                             on_batch=index_imported)
+        flash(report.summary(), 'warning' if report.rejected else 'success')
+        return redirect(url_for('bulk_data'))
+    
+    return render_template('professor.html', show_bulk_form=True)
+
+def similar_records(kind, record_id, limit=3):
+    """Closest matches of an answer or share, labelled for display"""
+    similar = []
+    for match_kind, match_id, score in similarity_index.matches(kind, record_id)[:limit]:
+        if match_kind == 'submission':
+            record = store.get_submission(match_id)
+            label = store.student_name(record['student_id'])
+        else:
+            record = store.get_share(match_id)
+            label = f'{record["title"]} (shared by {store.student_name(record["student_id"])})'
+        similar.append({'kind': match_kind, 'id': match_id, 'score': score, 'label': label})
+    return similar
 
 @app.route('/professor/view_submissions/<int:question_id>')
 def view_submissions(question_id):
     """View submissions for a specific question"""
-    question = next((q for q in questions if q['id'] == question_id), None)
+    question = store.get_question(question_id)
     if not question:
         flash('Question not found!', 'error')
         return redirect(url_for('professor_dashboard'))
     
-    question_submissions = [s for s in submissions if s['question_id'] == question_id]
-    
-    # Get student names for submissions
+    # One page of submissions joined with student names and feedback
+    after, limit = page_args()
+    question_submissions, next_cursor = paginate(
+        store.submission_details_for_question(question_id, after=after, limit=limit + 1), limit)
     for submission in question_submissions:
-        student = next((s for s in students if s['id'] == submission['student_id']), None)
-        submission['student_name'] = student['name'] if student else 'Unknown'
-        
-        # Get feedback for this submission
-        submission_feedback = [f for f in feedback if f['submission_id'] == submission['id']]
-        submission['feedback'] = submission_feedback[0] if submission_feedback else None
+        submission['similar'] = similar_records('submission', submission['id'])
     
     return render_template('view_submissions.html', 
                          question=question, 
-                         submissions=question_submissions)
+                         submissions=question_submissions,
+                         total_submissions=store.count_submissions(question_id=question_id),
+                         after=after,
+                         limit=limit,
+                         next_cursor=next_cursor)
 
 @app.route('/professor/provide_feedback', methods=['POST'])
 def provide_feedback():
     """Provide feedback for a student submission"""
-    global next_feedback_id
-    
     submission_id = int(request.form.get('submission_id'))
     feedback_text = request.form.get('feedback')
     score = request.form.get('score')
@@ -244,17 +729,13 @@ def provide_feedback():
         flash('All feedback fields are required!', 'error')
         return redirect(request.referrer)
     
-    submission = next((s for s in submissions if s['id'] == submission_id), None)
+    submission = store.get_submission(submission_id)
     if not submission:
         flash('Submission not found!', 'error')
         return redirect(request.referrer)
     
-    # Remove existing feedback for this submission
-    global feedback
-    feedback = [f for f in feedback if f['submission_id'] != submission_id]
-    
+    # Replaces any existing feedback for this submission
     new_feedback = {
-        'id': next_feedback_id,
         'submission_id': submission_id,
         'student_id': submission['student_id'],
         'question_id': submission['question_id'],
@@ -263,41 +744,45 @@ def provide_feedback():
         'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     }
     
-    feedback.append(new_feedback)
-    next_feedback_id += 1
+    store.set_feedback(new_feedback)
+    cohort_analytics.set_score(new_feedback)
+    recommender.mark(submission['student_id'])
+    change_feed.publish('feedback', [submission_id])
+    invalidate('feedback', f"status:{submission['student_id']}")
     
     flash('Feedback provided successfully!', 'success')
     return redirect(request.referrer)
 
+@app.route('/professor/grade_question/<int:question_id>', methods=['POST'])
+def grade_question(question_id):
+    """Batch auto-grade every submission for a coding question"""
+    question = store.get_question(question_id)
+    if not grader.is_gradable(question):
+        flash('This question has no test cases to grade against!', 'error')
+        return redirect(url_for('view_submissions', question_id=question_id))
+    
+    job_id = job_queue.enqueue('grade_question', question_id)
+    
+    flash(f'Auto-grading started in the background (job #{job_id}). Refresh to see the results.', 'info')
+    return redirect(url_for('view_submissions', question_id=question_id))
+
 @app.route('/student/dashboard/<int:student_id>')
 def student_dashboard(student_id):
     """Student personal dashboard"""
-    student = next((s for s in students if s['id'] == student_id), None)
+    student = store.get_student(student_id)
     if not student:
         flash('Student not found!', 'error')
         return redirect(url_for('student'))
     
-    # Get student's submissions and feedback
-    student_submissions = [s for s in submissions if s['student_id'] == student_id]
-    student_feedback = [f for f in feedback if f['student_id'] == student_id]
+    # One page of the student's submissions with question details and feedback
+    after, limit = page_args()
+    student_submissions, next_cursor = paginate(
+        store.submission_details_for_student(student_id, after=after, limit=limit + 1), limit)
     
     # Calculate analytics
-    total_questions = len(questions)
-    completed_questions = len(student_submissions)
-    average_score = 0
-    
-    if student_feedback:
-        average_score = sum(f['score'] for f in student_feedback) / len(student_feedback)
-    
-    # Get question details for submissions
-    for submission in student_submissions:
-        question = next((q for q in questions if q['id'] == submission['question_id']), None)
-        submission['question_title'] = question['title'] if question else 'Unknown'
-        submission['question_type'] = question['type'] if question else 'Unknown'
-        
-        # Get feedback for this submission
-        submission_feedback = next((f for f in feedback if f['submission_id'] == submission['id']), None)
-        submission['feedback'] = submission_feedback
+    total_questions = store.count_questions()
+    completed_questions = store.count_submissions(student_id)
+    average_score = store.average_score(student_id)
     
     return render_template('student_dashboard.html',
                          student=student,
@@ -305,44 +790,47 @@ def student_dashboard(student_id):
                          total_questions=total_questions,
                          completed_questions=completed_questions,
                          average_score=average_score,
-                         questions=questions)
+                         questions=store.all_questions(),
+                         after=after,
+                         limit=limit,
+                         next_cursor=next_cursor)
 
 @app.route('/student/view_questions/<int:student_id>')
+@render_cache.cached('questions', lambda student_id: f'status:{student_id}')
 def view_student_questions(student_id):
     """View available questions for student"""
-    student = next((s for s in students if s['id'] == student_id), None)
+    student = store.get_student(student_id)
     if not student:
         flash('Student not found!', 'error')
         return redirect(url_for('student'))
     
-    # Mark which questions have been submitted
-    student_submissions = [s for s in submissions if s['student_id'] == student_id]
-    submitted_question_ids = [s['question_id'] for s in student_submissions]
+    # One page of questions, joined with the student's precomputed status map
+    after, limit = page_args()
+    questions, next_cursor = paginate(store.iter_questions(after=after, limit=limit + 1), limit)
+    status = store.question_status(student_id)
+    feedback = {question['id']: store.feedback_for_submission(status[question['id']]['submission_id'])
+                for question in questions
+                if question['id'] in status and status[question['id']]['feedback_id'] is not None}
     
-    questions_with_status = []
-    for question in questions:
-        question_copy = question.copy()
-        question_copy['submitted'] = question['id'] in submitted_question_ids
-        
-        # Get feedback if submitted
-        if question_copy['submitted']:
-            submission = next((s for s in student_submissions if s['question_id'] == question['id']), None)
-            if submission:
-                question_feedback = next((f for f in feedback if f['submission_id'] == submission['id']), None)
-                question_copy['feedback'] = question_feedback
-        
-        questions_with_status.append(question_copy)
+    # Open/closed as of now; the open and close events refresh the cached page
+    now = datetime.now().strftime(TIMESTAMP_FORMAT)
+    windows = {question['id']: window_state(question, now) for question in questions}
     
     return render_template('student.html',
                          student=student,
-                         questions=questions_with_status,
-                         show_questions=True)
+                         questions=questions,
+                         status=status,
+                         feedback=feedback,
+                         windows=windows,
+                         total_questions=store.count_questions(),
+                         show_questions=True,
+                         after=after,
+                         limit=limit,
+                         next_cursor=next_cursor)
 
 @app.route('/student/submit_answer', methods=['POST'])
 def submit_answer():
     """Submit answer for a question"""
-    global next_submission_id
-    
     student_id = int(request.form.get('student_id'))
     question_id = int(request.form.get('question_id'))
     answer = request.form.get('answer')
@@ -351,88 +839,212 @@ def submit_answer():
         flash('All fields are required!', 'error')
         return redirect(request.referrer)
     
-    # Check if student has already submitted for this question
-    existing_submission = next((s for s in submissions 
-                              if s['student_id'] == student_id and s['question_id'] == question_id), None)
+    question = store.get_question(question_id)
+    if not question:
+        flash('Question not found!', 'error')
+        return redirect(request.referrer)
     
-    if existing_submission:
-        flash('You have already submitted an answer for this question!', 'error')
+    # Only inside the question's submission window, if it has one
+    now = datetime.now().strftime(TIMESTAMP_FORMAT)
+    state = window_state(question, now)
+    if state != 'open':
+        if state == 'upcoming':
+            flash(f'Submissions for this question open at {question["opens_at"]}!', 'error')
+        else:
+            flash(f'Submissions for this question closed at {question["closes_at"]}!', 'error')
         return redirect(request.referrer)
     
     new_submission = {
-        'id': next_submission_id,
         'student_id': student_id,
         'question_id': question_id,
         'answer': answer,
-        'submitted_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        'submitted_at': now
     }
     
-    submissions.append(new_submission)
-    next_submission_id += 1
+    # One answer per question: checked and stored atomically, so a double
+    # submit racing on another thread or worker cannot store two
+    if not store.add_submission_if_new(new_submission):
+        flash('You have already submitted an answer for this question!', 'error')
+        return redirect(request.referrer)
+    invalidate('submissions', f'status:{student_id}')
+    
+    # Copy detection, analytics and auto-grading run in the background;
+    # feedback appears when done
+    try:
+        job_queue.enqueue('index_submission', new_submission['id'])
+    except JobQueueFull:
+        # The answer is stored: index it now so analytics stay complete, and
+        # leave the grading to the batch grade
+        app.logger.warning('Job queue full, indexing submission %s inline without grading it',
+                           new_submission['id'])
+        index_submission(new_submission, question)
+        change_feed.publish('submission', new_submission['id'])
     
     flash('Answer submitted successfully!', 'success')
     return redirect(url_for('view_student_questions', student_id=student_id))
 
 @app.route('/api/analytics_data')
+@rate_limiter.limit('analytics_data', rate=1, burst=5, key=client_key)
 def analytics_data():
     """API endpoint for chart data"""
+    # Dashboards reloading at once share one computation and serialised body
+    body = single_flight.do('analytics_data', lambda: json.dumps(completion_data()))
+    return Response(body, mimetype='application/json')
+
+def completion_data():
+    """Completion rate of every student, for the dashboard chart"""
+    check_aggregates()
+    
     # Student completion rates
-    student_data = []
     labels = []
     completion_rates = []
+    total_questions = store.count_questions()
+    all_stats = store.all_student_stats()
     
-    for student in students:
-        student_submissions = [s for s in submissions if s['student_id'] == student['id']]
-        completion_rate = (len(student_submissions) / max(len(questions), 1)) * 100
+    for student in store.all_students():
+        stats = all_stats[student['id']]
+        completion_rate = (stats['submissions'] / max(total_questions, 1)) * 100
         
         labels.append(student['name'])
         completion_rates.append(completion_rate)
     
-    return jsonify({
+    return {
         'labels': labels,
         'completion_rates': completion_rates,
-        'total_questions': len(questions),
-        'total_submissions': len(submissions)
-    })
+        'total_questions': total_questions,
+        'total_submissions': store.totals()['submissions']
+    }
+
+@app.route('/api/analytics/questions')
+def question_analytics():
+    """API endpoint with score statistics per question (difficulty chart)"""
+    stats = cohort_analytics.question_stats()
+    questions = [store.get_question(question_id) for question_id in stats['question_ids']]
+    stats['titles'] = [question['title'] if question else 'Unknown' for question in questions]
+    stats['difficulty'] = [question['difficulty'] if question else None for question in questions]
+    return jsonify(stats)
+
+@app.route('/api/analytics/scores')
+def score_analytics():
+    """API endpoint with the score histogram and percentiles, overall or for one question"""
+    bins = min(max(request.args.get('bins', 10, type=int), 1), 100)
+    return jsonify(cohort_analytics.score_distribution(bins=bins,
+                                                       question_id=request.args.get('question_id', type=int)))
+
+@app.route('/api/analytics/trends')
+def trend_analytics():
+    """API endpoint with mean score over time for the cohort and selected students"""
+    interval = request.args.get('interval', 'week')
+    if interval not in INTERVALS:
+        return jsonify({'error': f'interval must be one of {", ".join(INTERVALS)}'}), 400
+    
+    trends = cohort_analytics.trends(interval=interval,
+                                     student_ids=request.args.getlist('student_id', type=int)[:20],
+                                     movers=min(request.args.get('movers', 5, type=int), 50))
+    for mover in trends['improving'] + trends['declining']:
+        mover['student_name'] = store.student_name(mover['student_id'])
+    return jsonify(trends)
+
+@app.route('/api/analytics/cohorts')
+def group_analytics():
+    """API endpoint comparing study groups on activity, completion and scores"""
+    groups = store.all_groups()
+    comparison = cohort_analytics.cohorts(((group['id'], group['members']) for group in groups),
+                                          question_count=store.count_questions())
+    comparison['names'] = [group['name'] for group in groups]
+    return jsonify(comparison)
 
 # Peer Collaboration Routes
 @app.route('/collaboration')
+@render_cache.cached('students', 'groups')
 def collaboration():
     """Main collaboration hub"""
     return render_template('collaboration.html', 
-                         students=students,
-                         study_groups=study_groups)
+                         students=store.all_students(),
+                         study_groups=store.all_groups())
 
 @app.route('/collaboration/<int:student_id>')
 def student_collaboration(student_id):
     """Student-specific collaboration dashboard"""
-    student = next((s for s in students if s['id'] == student_id), None)
+    student = store.get_student(student_id)
     if not student:
         flash('Student not found!', 'error')
         return redirect(url_for('collaboration'))
     
-    # Get student's groups
-    student_groups = [g for g in study_groups if student_id in g['members']]
+    return render_template('student_collaboration.html',
+                         student=student,
+                         students=store.all_students(),
+                         study_groups=store.groups_for_student(student_id),
+                         all_groups=store.all_groups(),
+                         code_shares=store.shares_for_student(student_id, limit=5),
+                         active_sessions=store.active_sessions_for_student(student_id),
+                         suggested_partners=suggested_partners(student_id),
+                         suggested_groups=suggested_groups(student_id))
+
+def suggested_partners(student_id, limit=5, mode='similar'):
+    """Recommended partners with their names"""
+    partners = recommender.partners(student_id, limit=limit, mode=mode)
+    for partner in partners:
+        partner['name'] = store.student_name(partner['student_id'])
+    return partners
+
+def suggested_groups(student_id, limit=3, mode='similar'):
+    """Recommended study groups with their name, description and size"""
+    suggestions = []
+    for suggestion in recommender.groups(student_id, limit=limit, mode=mode):
+        group = store.get_group(suggestion['group_id'])
+        if group and group['active']:
+            suggestions.append(dict(suggestion, name=group['name'], description=group['description'],
+                                    members=len(group['members'])))
+    return suggestions
+
+@app.route('/api/students/<int:student_id>/recommendations')
+def recommendations_api(student_id):
+    """API endpoint suggesting pair programming partners and study groups for a student"""
+    if not store.get_student(student_id):
+        return jsonify({'error': 'Student not found'}), 404
     
-    # Get recent code shares
-    student_shares = [s for s in code_shares if s['student_id'] == student_id][-5:]
+    mode = request.args.get('mode', 'similar')
+    if mode not in RECOMMENDATION_MODES:
+        return jsonify({'error': f'mode must be one of {", ".join(RECOMMENDATION_MODES)}'}), 400
+    limit = min(max(request.args.get('limit', 5, type=int), 1), 50)
+    kind = request.args.get('kind')
+    result = {'student_id': student_id, 'mode': mode}
+    if kind in (None, 'partners'):
+        result['partners'] = suggested_partners(student_id, limit=limit, mode=mode)
+    if kind in (None, 'groups'):
+        result['groups'] = suggested_groups(student_id, limit=limit, mode=mode)
+    return jsonify(result)
+
+@app.route('/api/recommender_stats')
+def recommender_stats():
+    """API endpoint with skill vector index size and refresh counters"""
+    return jsonify(recommender.metrics())
+
+@app.route('/collaboration/group/<int:group_id>/chat/<int:student_id>')
+def group_chat(group_id, student_id):
+    """Live chat room for a study group"""
+    group = store.get_group(group_id)
+    student = store.get_student(student_id)
+    if not group or not student:
+        flash('Study group not found!', 'error')
+        return redirect(url_for('collaboration'))
     
-    # Get active pair programming sessions
-    active_sessions = [s for s in pair_programming_sessions if s['active'] and student_id in [s['student1_id'], s['student2_id']]]
+    if not store.is_group_member(group_id, student_id):
+        flash('Join the group to take part in its chat!', 'error')
+        return redirect(url_for('student_collaboration', student_id=student_id))
     
-    return render_template('student_collaboration.html',
+    messages = chat_hub.messages(group_id)[-50:]
+    return render_template('group_chat.html',
+                         group=group,
                          student=student,
-                         students=students,
-                         study_groups=student_groups,
-                         all_groups=study_groups,
-                         code_shares=student_shares,
-                         active_sessions=active_sessions)
+                         messages=messages,
+                         last_id=messages[-1]['id'] if messages else 0,
+                         member_names={member_id: store.student_name(member_id) for member_id in group['members']})
 
 @app.route('/collaboration/create_group', methods=['POST'])
 def create_study_group():
     """Create a new study group"""
-    global next_group_id
-    
     group_name = request.form.get('group_name')
     description = request.form.get('description')
     creator_id = int(request.form.get('creator_id'))
@@ -442,7 +1054,6 @@ def create_study_group():
         return redirect(request.referrer)
     
     new_group = {
-        'id': next_group_id,
         'name': group_name,
         'description': description,
         'members': [creator_id],
@@ -451,8 +1062,10 @@ def create_study_group():
         'active': True
     }
     
-    study_groups.append(new_group)
-    next_group_id += 1
+    store.add_group(new_group)
+    recommender.joined(new_group['id'], creator_id)
+    change_feed.publish('member', new_group['id'], creator_id)
+    invalidate('groups')
     
     flash(f'Study group "{group_name}" created successfully!', 'success')
     return redirect(url_for('student_collaboration', student_id=creator_id))
@@ -463,13 +1076,15 @@ def join_study_group():
     group_id = int(request.form.get('group_id'))
     student_id = int(request.form.get('student_id'))
     
-    group = next((g for g in study_groups if g['id'] == group_id), None)
+    group = store.get_group(group_id)
     if not group:
         flash('Study group not found!', 'error')
         return redirect(request.referrer)
     
-    if student_id not in group['members']:
-        group['members'].append(student_id)
+    if store.add_group_member(group_id, student_id):
+        recommender.joined(group_id, student_id)
+        change_feed.publish('member', group_id, student_id)
+        invalidate('groups')
         flash(f'Successfully joined "{group["name"]}"!', 'success')
     else:
         flash('You are already a member of this group!', 'warning')
@@ -480,8 +1095,6 @@ def join_study_group():
 def pair_programming():
     """Start or join pair programming session"""
     if request.method == 'POST':
-        global next_session_id
-        
         student1_id = int(request.form.get('student1_id'))
         student2_id = int(request.form.get('student2_id'))
         problem_title = request.form.get('problem_title')
@@ -491,7 +1104,6 @@ def pair_programming():
             return redirect(request.referrer)
         
         new_session = {
-            'id': next_session_id,
             'student1_id': student1_id,
             'student2_id': student2_id,
             'problem_title': problem_title,
@@ -500,36 +1112,36 @@ def pair_programming():
             'active': True
         }
         
-        pair_programming_sessions.append(new_session)
-        next_session_id += 1
+        store.add_session(new_session)
         
         flash('Pair programming session started!', 'success')
         return redirect(url_for('pair_session', session_id=new_session['id']))
     
-    return render_template('pair_programming.html', students=students)
+    student_id = request.args.get('student_id', type=int)
+    return render_template('pair_programming.html', students=store.all_students(), student_id=student_id,
+                           suggested_partners=suggested_partners(student_id) if student_id else [])
 
 @app.route('/collaboration/pair_session/<int:session_id>')
 def pair_session(session_id):
     """Live pair programming session"""
-    session = next((s for s in pair_programming_sessions if s['id'] == session_id), None)
+    session = store.get_session(session_id)
     if not session:
         flash('Session not found!', 'error')
         return redirect(url_for('pair_programming'))
     
     # Get student names
-    student1 = next((s for s in students if s['id'] == session['student1_id']), None)
-    student2 = next((s for s in students if s['id'] == session['student2_id']), None)
+    student1 = store.get_student(session['student1_id'])
+    student2 = store.get_student(session['student2_id'])
     
     return render_template('pair_session.html', 
                          session=session,
+                         sync_version=pair_sync.snapshot(session_id)['version'],
                          student1=student1,
                          student2=student2)
 
 @app.route('/collaboration/share_code', methods=['POST'])
 def share_code():
     """Share code with peers"""
-    global next_share_id
-    
     student_id = int(request.form.get('student_id'))
     title = request.form.get('title')
     code = request.form.get('code')
@@ -541,7 +1153,6 @@ def share_code():
         return redirect(request.referrer)
     
     new_share = {
-        'id': next_share_id,
         'student_id': student_id,
         'title': title,
         'code': code,
@@ -551,45 +1162,376 @@ def share_code():
         'comments': []
     }
     
-    code_shares.append(new_share)
-    next_share_id += 1
+    store.add_share(new_share)
+    index_share(search_index, new_share)
+    fingerprint_share(similarity_index, new_share)
+    change_feed.publish('share', new_share['id'])
+    invalidate('shares')
     
     flash('Code shared successfully!', 'success')
     return redirect(url_for('student_collaboration', student_id=student_id))
 
 @app.route('/collaboration/code_gallery')
+@render_cache.cached('students', 'shares')
 def code_gallery():
     """View all shared code"""
-    # Get student names for each share
-    for share in code_shares:
-        student = next((s for s in students if s['id'] == share['student_id']), None)
-        share['student_name'] = student['name'] if student else 'Unknown'
+    after, limit = page_args()
+    code_shares, next_cursor = paginate(store.iter_shares(after=after, limit=limit + 1), limit)
+    
+    # Get student names for each share without touching the stored records
+    code_shares = [dict(share, student_name=store.student_name(share['student_id'])) for share in code_shares]
     
     return render_template('code_gallery.html', 
                          code_shares=code_shares,
-                         students=students)
+                         total_shares=store.count_shares(),
+                         help_needed_shares=store.count_shares(help_needed=True),
+                         students=store.all_students(),
+                         after=after,
+                         limit=limit,
+                         next_cursor=next_cursor)
+
+@app.route('/api/questions')
+def questions_api():
+    """Paginated JSON listing of questions"""
+    after, limit = page_args()
+    return json_page(store.iter_questions(after=after, limit=limit + 1), limit)
+
+@app.route('/api/questions/<int:question_id>/submissions')
+def question_submissions_api(question_id):
+    """Paginated JSON listing of a question's submissions with feedback"""
+    after, limit = page_args()
+    return json_page(store.submission_details_for_question(question_id, after=after, limit=limit + 1), limit)
+
+@app.route('/api/students/<int:student_id>/submissions')
+def student_submissions_api(student_id):
+    """Paginated JSON listing of a student's submissions with feedback"""
+    after, limit = page_args()
+    return json_page(store.submission_details_for_student(student_id, after=after, limit=limit + 1), limit)
+
+@app.route('/api/students/<int:student_id>/question_status')
+@render_cache.cached('questions', lambda student_id: f'status:{student_id}')
+def question_status_api(student_id):
+    """The student's answered questions: question id -> submission/feedback ids and score"""
+    if not store.get_student(student_id):
+        return jsonify({'error': 'Student not found'}), 404
+    status = store.question_status(student_id)
+    return jsonify({
+        'student_id': student_id,
+        'total_questions': store.count_questions(),
+        'answered': len(status),
+        'graded': sum(1 for state in status.values() if state['feedback_id'] is not None),
+        'questions': status,
+    })
+
+@app.route('/api/code_shares')
+def code_shares_api():
+    """Paginated JSON listing of shared code"""
+    after, limit = page_args()
+    return json_page(store.iter_shares(after=after, limit=limit + 1), limit,
+                     transform=lambda share: dict(share, student_name=store.student_name(share['student_id'])))
+
+@app.route('/api/import/<kind>', methods=['POST'])
+def import_data(kind):
+    """Bulk import from an uploaded file or the raw request body; returns the per-row report"""
+    if kind not in IMPORTS:
+        return jsonify({'error': f'Can only import {", ".join(sorted(IMPORTS))}'}), 404
+    upload = request.files.get('file')
+    body = upload.stream if upload else request.stream
+    fmt = request.args.get('format') or guess_format(upload.filename if upload else None, request.mimetype)
+    if fmt not in FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(FORMATS)}'}), 400
+    
+    report = import_rows(store, kind, read_rows(text_stream(body), fmt), on_batch=index_imported)
+    return jsonify(report.to_dict())
+
+@app.route('/api/export/<kind>')
+def export_data(kind):
+    """Stream the roster, question bank or grades as a chunked CSV/JSONL download"""
+    if kind not in EXPORTS:
+        return jsonify({'error': f'Can only export {", ".join(sorted(EXPORTS))}'}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(FORMATS)}'}), 400
+    
+    fields, rows = export_rows(store, kind, question_id=request.args.get('question_id', type=int),
+                               answers=request.args.get('answers') == '1')
+    return Response(write_rows(fields, rows, fmt), mimetype=MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={kind}.{fmt}'})
+
+@app.route('/api/search')
+def search_api():
+    """Ranked full-text search; ``q`` words ending in ``*`` match as prefixes"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query'}), 400
+    
+    filters = {key: request.args[key] for key in ('difficulty', 'type') if request.args.get(key)}
+    if request.args.get('help_needed'):
+        filters['help_needed'] = request.args['help_needed'].lower() in ('1', 'true', 'yes', 'on')
+    _, limit = page_args()
+    hits = search_index.search(query, limit=limit, kind=request.args.get('kind') or None, **filters)
+    
+    results = []
+    for hit in hits:
+        if hit['kind'] == 'question':
+            record = store.get_question(hit['id'])
+            hit.update(title=record['title'], difficulty=record['difficulty'], type=record['type'])
+        elif hit['kind'] == 'code_share':
+            record = store.get_share(hit['id'])
+            hit.update(title=record['title'], help_needed=record['help_needed'],
+                       student_name=store.student_name(record['student_id']))
+        else:
+            record = store.get_message(hit['id'])
+            hit.update(group_id=record['group_id'], content=record['content'][:200])
+        results.append(hit)
+    
+    return jsonify({'query': query, 'results': results})
+
+@app.route('/api/submissions/<int:submission_id>/similar')
+def submission_similarity(submission_id):
+    """API endpoint with the answers and shared code most similar to a submission"""
+    if not store.get_submission(submission_id):
+        return jsonify({'error': 'Submission not found'}), 404
+    
+    return jsonify(similar_records('submission', submission_id, limit=None))
+
+@app.route('/api/similarity_stats')
+def similarity_stats():
+    """API endpoint with fingerprint index size and candidate counts"""
+    return jsonify(similarity_index.metrics())
+
+def json_int(value):
+    """An id or offset sent in a JSON body (an int or a numeric string), or None"""
+    # bool is an int subclass, but never a valid id
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def pair_write_body(*int_fields):
+    """The JSON object of a pair programming write with ``int_fields`` as ints, or None if malformed"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None
+    fields = {name: json_int(data.get(name)) for name in int_fields}
+    if None in fields.values():
+        return None
+    return dict(data, **fields)
 
 @app.route('/api/update_pair_code', methods=['POST'])
+@rate_limiter.limit('update_pair_code', rate=5, burst=20, key=client_key)
 def update_pair_code():
-    """API endpoint to update pair programming code in real-time"""
-    session_id = int(request.json.get('session_id'))
-    code = request.json.get('code')
+    """API endpoint to update pair programming code (polling fallback)"""
+    data = pair_write_body('session_id')
+    if data is None or not isinstance(data.get('code'), str):
+        return jsonify({'success': False, 'error': 'session_id and code are required'}), 400
+    base_version = data.get('base_version')
+    if base_version is not None:
+        base_version = json_int(base_version)
+        if base_version is None:
+            return jsonify({'success': False, 'error': 'base_version must be an integer'}), 400
     
-    session = next((s for s in pair_programming_sessions if s['id'] == session_id), None)
-    if session:
-        session['code'] = code
-        return jsonify({'success': True})
+    try:
+        accepted, payload = pair_sync.replace(data['session_id'], data['code'], client_id=data.get('client_id'),
+                                              base_version=base_version)
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Session not found'})
     
-    return jsonify({'success': False, 'error': 'Session not found'})
+    if not accepted:
+        # Written against an old version: the client must rebase onto this snapshot
+        return jsonify(dict(payload, success=False, error='Version conflict')), 409
+    return jsonify(dict(payload, success=True))
 
 @app.route('/api/get_pair_code/<int:session_id>')
+@rate_limiter.limit('get_pair_code', rate=2, burst=10, key=client_key)
 def get_pair_code(session_id):
-    """API endpoint to get current pair programming code"""
-    session = next((s for s in pair_programming_sessions if s['id'] == session_id), None)
-    if session:
-        return jsonify({'code': session['code']})
+    """API endpoint to get current pair programming code (polling fallback)"""
+    try:
+        etag, snapshot = pair_sync.poll(session_id, if_none_match=request.if_none_match.contains)
+    except KeyError:
+        return jsonify({'error': 'Session not found'})
+    
+    if snapshot:
+        # Every partner tab polling the same version gets one serialised body
+        body = single_flight.do(('pair_code', etag), lambda: json.dumps(snapshot))
+        response = Response(body, mimetype='application/json')
+    else:
+        response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/pair_sync_stats')
+def pair_sync_stats():
+    """API endpoint with poll/write counters for pair programming sync"""
+    return jsonify(pair_sync.metrics())
+
+@app.route('/api/pair_delta', methods=['POST'])
+@rate_limiter.limit('pair_delta', rate=20, burst=60, key=client_key)
+def pair_delta():
+    """API endpoint to apply one text delta to a pair programming session"""
+    data = pair_write_body('session_id', 'base_version', 'start', 'end')
+    if data is None or not isinstance(data.get('text', ''), str):
+        return jsonify({'success': False, 'error': 'session_id, base_version, start, end and text are required'}), 400
+    delta = {'start': data['start'], 'end': data['end'], 'text': data.get('text', '')}
     
-    return jsonify({'error': 'Session not found'})
+    try:
+        accepted, payload = pair_sync.apply(data['session_id'], data['base_version'],
+                                            delta, client_id=data.get('client_id'))
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Session not found'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if not accepted:
+        # Client is behind: it must rebase onto the current snapshot
+        return jsonify(dict(payload, success=False, error='Version conflict')), 409
+    return jsonify(dict(payload, success=True))
+
+@app.route('/api/pair_history/<int:session_id>')
+def pair_history(session_id):
+    """API endpoint listing the retained edits of a pair programming session"""
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', type=int)
+    try:
+        return jsonify(pair_sync.history(session_id, after=after, limit=limit))
+    except KeyError:
+        return jsonify({'error': 'Session not found'}), 404
+
+@app.route('/api/pair_history/<int:session_id>/<int:version>')
+def pair_code_at(session_id, version):
+    """API endpoint with the code of a pair programming session as of one version"""
+    try:
+        return jsonify({'session_id': session_id, 'version': version,
+                        'code': pair_sync.code_at(session_id, version)})
+    except KeyError:
+        return jsonify({'error': 'Session not found'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 410
+
+@app.route('/api/pair_revert', methods=['POST'])
+def pair_revert():
+    """API endpoint to restore an earlier version of a pair programming session"""
+    data = pair_write_body('session_id', 'version')
+    if data is None:
+        return jsonify({'success': False, 'error': 'session_id and version are required'}), 400
+    try:
+        payload = pair_sync.revert(data['session_id'], data['version'], client_id=data.get('client_id'))
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Session not found'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 410
+    return jsonify(dict(payload, success=True))
+
+@app.route('/api/blob_stats')
+def blob_stats():
+    """API endpoint with the size of the deduplicated code/answer storage"""
+    return jsonify(pair_sync.blobs.metrics())
+
+@app.route('/api/pair_stream/<int:session_id>')
+def pair_stream(session_id):
+    """Server-Sent Events stream of edits for a pair programming session"""
+    if pair_sync.channel(session_id) is None:
+        return jsonify({'error': 'Session not found'}), 404
+    
+    return event_stream(pair_sync.stream(session_id, client_id=request.args.get('client_id')))
+
+@app.route('/api/groups/<int:group_id>/messages', methods=['GET', 'POST'])
+def group_messages(group_id):
+    """Post a chat message, or read the messages after the ``since`` id"""
+    if not store.get_group(group_id):
+        return jsonify({'error': 'Study group not found'}), 404
+    
+    if request.method == 'GET':
+        messages = chat_hub.messages(group_id, since=request.args.get('since', type=int),
+                                     limit=request.args.get('limit', type=int))
+        return jsonify({'messages': messages, 'last_id': messages[-1]['id'] if messages else None})
+    
+    data = request.get_json(silent=True) or request.form
+    content = (data.get('content') or '').strip()
+    try:
+        student_id = int(data.get('student_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'student_id is required'}), 400
+    if not content:
+        return jsonify({'error': 'Message is empty'}), 400
+    if not store.is_group_member(group_id, student_id):
+        return jsonify({'error': 'Only group members can post'}), 403
+    
+    message = chat_hub.post(group_id, student_id, content)
+    index_message(search_index, message)
+    change_feed.publish('message', message)
+    return jsonify(message), 201
+
+@app.route('/api/groups/<int:group_id>/stream')
+def group_stream(group_id):
+    """Server-Sent Events stream of a group's chat, resuming after ``since``"""
+    student_id = request.args.get('student_id', type=int)
+    if not store.get_group(group_id):
+        return jsonify({'error': 'Study group not found'}), 404
+    if not store.is_group_member(group_id, student_id):
+        return jsonify({'error': 'Only group members can listen'}), 403
+    
+    # EventSource sends the last id it saw when it reconnects
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    return event_stream(chat_hub.stream(group_id, student_id, since=since))
+
+@app.route('/api/chat_stats')
+def chat_stats():
+    """API endpoint with chat delivery, backpressure and history counters"""
+    return jsonify(chat_hub.metrics())
+
+@app.route('/metrics')
+def metrics():
+    """Request metrics in the Prometheus text format"""
+    if not request_metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    
+    return Response(request_metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/throttle_stats')
+def throttle_stats():
+    """API endpoint with rate limit, request coalescing and stream cap counters"""
+    return jsonify({'rate_limits': rate_limiter.metrics(), 'single_flight': single_flight.metrics(),
+                    'streams': stream_limit.metrics()})
+
+@app.route('/api/asset_stats')
+def asset_stats():
+    """API endpoint with the built static assets and the encodings served"""
+    return jsonify(assets.metrics())
+
+@app.route('/api/render_cache_stats')
+def render_cache_stats():
+    """API endpoint with render cache hit/miss counters and size"""
+    return jsonify(render_cache.metrics())
+
+@app.route('/api/scheduler_stats')
+def scheduler_stats():
+    """API endpoint with pending deadline timers and event counters"""
+    return jsonify(scheduler.metrics())
+
+@app.route('/api/change_feed_stats')
+def change_feed_stats():
+    """API endpoint with the changes published to and applied from other processes"""
+    return jsonify(change_feed.metrics())
+
+@app.route('/api/jobs/<int:job_id>')
+def job_status(job_id):
+    """API endpoint with the status of a background job"""
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(status)
+
+@app.route('/api/jobs')
+def job_metrics():
+    """API endpoint with job queue depth, outcomes and latency"""
+    return jsonify(job_queue.metrics())
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,289 @@
+"""Fingerprinted, precompressed static assets for production.
+
+With the pipeline on (``APP_MODE=production``) the stylesheet and script are
+served from a build in ``static/dist``: minified, with a hash of their
+content in the file name (``style.3f2a9c1e.css``), and with a ``.gz`` copy
+(and ``.br`` when the optional ``brotli`` package is installed) compressed
+once at build time instead of on every request. A changed file gets a new
+name, so ``/assets/`` responses are cached for a year as ``immutable`` and
+browsers never revalidate them.
+
+Templates call ``asset_url('css/style.css')``: the fingerprinted URL when a
+build is loaded, the plain ``/static/`` one otherwise, so in development
+edits show up on reload. ``flask --app app assets build`` writes the build;
+production startup rebuilds it when a source has changed since.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import threading
+
+import click
+from flask import abort, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip variants are built
+    brotli = None
+
+MANIFEST = 'manifest.json'
+ONE_YEAR = 365 * 24 * 3600
+# Tried in order against the client's Accept-Encoding
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+logger = logging.getLogger(__name__)
+
+
+def _string_end(text, start):
+    """Index just past the string literal opening at ``start``"""
+    quote, i = text[start], start + 1
+    while i < len(text):
+        if text[i] == '\\':
+            i += 2
+        elif text[i] == quote:
+            return i + 1
+        else:
+            i += 1
+    return i
+
+
+def minify_css(text):
+    """Drop comments and collapse whitespace, leaving strings untouched"""
+    out, i, space = [], 0, False
+    while i < len(text):
+        char = text[i]
+        if char in '"\'':
+            end = _string_end(text, i)
+            chunk = text[i:end]
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = len(text) if end < 0 else end + 2
+            space = True
+            continue
+        elif char.isspace():
+            space = True
+            i += 1
+            continue
+        else:
+            end, chunk = i + 1, char
+        # A space after a colon is never needed, one before it can be a descendant selector
+        if space and out and out[-1][-1] not in '{};,>:' and chunk not in '{};,>':
+            out.append(' ')
+        if chunk == '}' and out and out[-1] == ';':
+            out.pop()
+        out.append(chunk)
+        space, i = False, end
+    return ''.join(out)
+
+
+def minify_js(text):
+    """Drop comments and indentation, leaving strings, templates and regexes untouched.
+
+    Line breaks are kept (one per run of whitespace containing any) so
+    automatic semicolon insertion reads the code exactly as before.
+    """
+    out, i, previous = [], 0, ''
+    while i < len(text):
+        char = text[i]
+        if char in '"\'`':
+            end = _string_end(text, i)
+        elif text.startswith('//', i):
+            end = text.find('\n', i)
+            i = len(text) if end < 0 else end
+            continue
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = len(text) if end < 0 else end + 2
+            if out and not out[-1].isspace():
+                out.append(' ')
+            continue
+        elif char == '/' and (not previous or previous in '(,=:[!&|?{};+-*%<>~^'):
+            # A regular expression literal: copy up to its closing slash
+            end, in_class = i + 1, False
+            while end < len(text) and text[end] != '\n':
+                if text[end] == '\\':
+                    end += 1
+                elif text[end] == '[':
+                    in_class = True
+                elif text[end] == ']':
+                    in_class = False
+                elif text[end] == '/' and not in_class:
+                    break
+                end += 1
+            end += 1
+        elif char.isspace():
+            end = i
+            while end < len(text) and text[end].isspace():
+                end += 1
+            gap = '\n' if '\n' in text[i:end] else ' '
+            if out and out[-1] in (' ', '\n'):
+                out[-1] = '\n' if '\n' in (gap, out[-1]) else ' '
+            elif out:
+                out.append(gap)
+            i = end
+            continue
+        else:
+            end = i + 1
+        out.append(text[i:end])
+        previous = text[end - 1]
+        i = end
+    return ''.join(out).strip() + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _sources(static_folder, output):
+    """Stylesheets and scripts under ``static_folder``, outside the build"""
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != output)
+        for name in sorted(files):
+            if os.path.splitext(name)[1] in MINIFIERS:
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+
+def build(static_folder, output):
+    """Minify, fingerprint and compress every asset; returns the manifest.
+
+    The manifest maps each source name to its built file, the digest of
+    the source it was built from and the encodings written next to it.
+    Files from earlier builds are left in place for pages still pointing
+    at them.
+    """
+    manifest = {}
+    os.makedirs(output, exist_ok=True)
+    for name, path in _sources(static_folder, output):
+        with open(path, 'rb') as f:
+            source = f.read()
+        stem, extension = os.path.splitext(name)
+        data = MINIFIERS[extension](source.decode('utf-8')).encode('utf-8')
+        built = f'{stem}.{_digest(data)[:8]}{extension}'
+        target = os.path.join(output, built)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        variants = {'': data, '.gz': gzip.compress(data, 9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+        entry = {'file': built, 'source': _digest(source), 'bytes': len(source), 'encodings': {}}
+        for suffix, content in variants.items():
+            # A compressed copy no smaller than the original is not worth sending
+            if suffix and len(content) >= len(data):
+                continue
+            with open(target + suffix, 'wb') as f:
+                f.write(content)
+            encoding = {'': 'identity', '.gz': 'gzip', '.br': 'br'}[suffix]
+            entry['encodings'][encoding] = len(content)
+        manifest[name] = entry
+    with open(os.path.join(output, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def is_current(static_folder, output, manifest):
+    """Whether ``manifest`` was built from the sources as they are now"""
+    sources = dict(_sources(static_folder, output))
+    if sources.keys() != manifest.keys():
+        return False
+    for name, path in sources.items():
+        with open(path, 'rb') as f:
+            if _digest(f.read()) != manifest[name]['source']:
+                return False
+    return all(os.path.exists(os.path.join(output, entry['file'])) for entry in manifest.values())
+
+
+class Assets:
+    """``asset_url`` for templates and the ``/assets/`` route serving the build"""
+
+    def __init__(self, app, enabled=False, folder='dist'):
+        self.app = app
+        self.enabled = enabled
+        self.output = os.path.join(app.static_folder, folder)
+        self.manifest = {}
+        # Built file name -> (mimetype, encodings written)
+        self._files = {}
+        self._lock = threading.Lock()
+        self.stats = {'served': 0, 'br': 0, 'gzip': 0, 'identity': 0}
+
+        app.add_template_global(self.url, 'asset_url')
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+
+        @app.cli.group('assets')
+        def assets_cli():
+            """Static asset pipeline"""
+
+        @assets_cli.command('build')
+        def build_command():
+            """Minify, fingerprint and precompress the static assets."""
+            manifest = self.build()
+            for name, entry in sorted(manifest.items()):
+                sizes = ', '.join(f'{encoding} {size}' for encoding, size in entry['encodings'].items())
+                click.echo(f'{name} -> {entry["file"]} ({entry["bytes"]} bytes; {sizes})')
+
+        if enabled:
+            self.load()
+
+    def build(self):
+        self._use(build(self.app.static_folder, self.output))
+        return self.manifest
+
+    def load(self):
+        """Use the build in the output folder, rebuilding it when it is missing or stale"""
+        try:
+            with open(os.path.join(self.output, MANIFEST)) as f:
+                manifest = json.load(f)
+            if is_current(self.app.static_folder, self.output, manifest):
+                self._use(manifest)
+                return
+        except (OSError, ValueError):
+            pass
+        try:
+            self.build()
+            logger.info('Built %d static assets into %s', len(self.manifest), self.output)
+        except OSError as exc:
+            # A read-only deployment without a build still serves /static/
+            logger.warning('Static asset build failed, serving unbuilt files: %s', exc)
+
+    def _use(self, manifest):
+        self.manifest = manifest
+        self._files = {entry['file']: (mimetypes.guess_type(name)[0], entry['encodings'])
+                       for name, entry in manifest.items()}
+
+    def url(self, filename):
+        """URL of a static file: its fingerprinted build if there is one"""
+        entry = self.manifest.get(filename) if self.enabled else None
+        if entry is None:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=entry['file'])
+
+    def serve(self, filename):
+        """A built file, precompressed in the best encoding the client accepts"""
+        if filename not in self._files:
+            abort(404)
+        mimetype, encodings = self._files[filename]
+        for encoding, suffix in ENCODINGS:
+            if encoding in encodings and request.accept_encodings[encoding]:
+                break
+        else:
+            encoding, suffix = 'identity', ''
+        response = send_from_directory(self.output, filename + suffix, mimetype=mimetype, max_age=ONE_YEAR)
+        if suffix:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        with self._lock:
+            self.stats['served'] += 1
+            self.stats[encoding] += 1
+        return response
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+        return dict(stats, enabled=self.enabled, brotli=brotli is not None, files=self.manifest)
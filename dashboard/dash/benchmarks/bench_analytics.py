@@ -0,0 +1,207 @@
+"""Columnar (NumPy) cohort analytics against a pure-Python baseline.
+
+Generates submissions with scores spread over a term, loads them into
+``CohortAnalytics`` and times each dashboard query next to a straightforward
+pure-Python version over the same records (dict accumulators and sorted
+lists, as the routes would do without the columns). Both versions must
+agree on the results before any timing is reported.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_analytics --rows 1000000
+"""
+import argparse
+import math
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from analytics import PASS_SCORE, PERCENTILES, CohortAnalytics
+
+TERM_START = datetime(2025, 1, 6)
+
+
+def make_records(rows, students, questions, groups, group_size, graded_ratio, seed):
+    """Submission dicts plus feedback; each student drifts up or down over the term"""
+    rng = random.Random(seed)
+    drift = [rng.uniform(-1.5, 1.5) for _ in range(students + 1)]
+    submissions, feedback = [], []
+    for submission_id in range(1, rows + 1):
+        student_id = rng.randint(1, students)
+        day = rng.randint(0, 111)
+        submissions.append({
+            'id': submission_id,
+            'student_id': student_id,
+            'question_id': rng.randint(1, questions),
+            'submitted_at': (TERM_START + timedelta(days=day, seconds=rng.randint(0, 86399))).strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        if rng.random() < graded_ratio:
+            score = min(100, max(0, round(rng.gauss(55, 18) + drift[student_id] * day / 7)))
+            feedback.append({'submission_id': submission_id, 'score': score})
+    study_groups = [(group_id, rng.sample(range(1, students + 1), group_size)) for group_id in range(1, groups + 1)]
+    return submissions, feedback, study_groups
+
+
+def percentile(ordered, p):
+    """Linear interpolation between closest ranks, like numpy.percentile"""
+    position = (len(ordered) - 1) * p / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+# Pure-Python baseline over joined records
+
+def join(submissions, feedback):
+    scores = {record['submission_id']: record['score'] for record in feedback}
+    return [dict(submission, score=scores.get(submission['id']),
+                 ts=datetime.strptime(submission['submitted_at'], '%Y-%m-%d %H:%M:%S')
+                 .replace(tzinfo=timezone.utc).timestamp())
+            for submission in submissions]
+
+
+def python_question_stats(records):
+    by_question = defaultdict(list)
+    counts = defaultdict(int)
+    for record in records:
+        counts[record['question_id']] += 1
+        if record['score'] is not None:
+            by_question[record['question_id']].append(record['score'])
+    result = {}
+    for question_id in sorted(counts):
+        scores = sorted(by_question[question_id])
+        mean = sum(scores) / len(scores)
+        result[question_id] = {
+            'submissions': counts[question_id],
+            'mean_score': mean,
+            'median_score': percentile(scores, 50),
+            'pass_rate': 100 * sum(score >= PASS_SCORE for score in scores) / len(scores),
+        }
+    return result
+
+
+def python_score_distribution(records, bins=10):
+    scores = sorted(record['score'] for record in records if record['score'] is not None)
+    counts = [0] * bins
+    for score in scores:
+        counts[min(int(score * bins / 100), bins - 1)] += 1
+    return counts, [percentile(scores, p) for p in PERCENTILES]
+
+
+def python_trends(records):
+    weekly = defaultdict(lambda: [0, 0])
+    per_student = defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0.0])
+    start = min(record['ts'] for record in records)
+    for record in records:
+        if record['score'] is None:
+            continue
+        week = (int(record['ts']) // 86400 + 3) // 7
+        weekly[week][0] += record['score']
+        weekly[week][1] += 1
+        x, y = (record['ts'] - start) / 86400, record['score']
+        sums = per_student[record['student_id']]
+        sums[0] += 1
+        sums[1] += x
+        sums[2] += y
+        sums[3] += x * x
+        sums[4] += x * y
+    slopes = {}
+    for student_id, (n, sx, sy, sxx, sxy) in per_student.items():
+        denominator = n * sxx - sx * sx
+        if n >= 3 and denominator > 1e-9:
+            slopes[student_id] = 7 * (n * sxy - sx * sy) / denominator
+    means = [total / count for _, (total, count) in sorted(weekly.items())]
+    return means, max(slopes, key=slopes.get)
+
+
+def python_cohorts(records, study_groups):
+    per_student = defaultdict(lambda: [0, 0, 0])
+    for record in records:
+        stats = per_student[record['student_id']]
+        stats[0] += 1
+        if record['score'] is not None:
+            stats[1] += 1
+            stats[2] += record['score']
+    result = []
+    for _, members in study_groups:
+        graded = sum(per_student[m][1] for m in members)
+        result.append(sum(per_student[m][2] for m in members) / graded if graded else None)
+    return result
+
+
+def timed(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def close(a, b):
+    return a is None and b is None or a is not None and b is not None and abs(a - b) < 0.01
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--students', type=int, default=20_000)
+    parser.add_argument('--questions', type=int, default=500)
+    parser.add_argument('--groups', type=int, default=2_000)
+    parser.add_argument('--group-size', type=int, default=8)
+    parser.add_argument('--graded-ratio', type=float, default=0.7)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    submissions, feedback, study_groups = make_records(args.rows, args.students, args.questions, args.groups,
+                                                       args.group_size, args.graded_ratio, args.seed)
+    print(f'Generated {len(submissions)} submissions, {len(feedback)} graded, in {time.perf_counter() - start:.1f}s')
+
+    start = time.perf_counter()
+    analytics = CohortAnalytics()
+    analytics.add_submissions(submissions)
+    analytics.set_scores(feedback)
+    print(f'Columnar load: {time.perf_counter() - start:.2f}s')
+    start = time.perf_counter()
+    records = join(submissions, feedback)
+    print(f'Pure-Python join: {time.perf_counter() - start:.2f}s')
+
+    # Agreement checks before timing
+    questions = analytics.question_stats()
+    baseline = python_question_stats(records)
+    for i, question_id in enumerate(questions['question_ids']):
+        expected = baseline[question_id]
+        assert questions['submissions'][i] == expected['submissions']
+        assert close(questions['mean_score'][i], expected['mean_score']), question_id
+        assert close(questions['median_score'][i], expected['median_score']), question_id
+        assert close(questions['pass_rate'][i], expected['pass_rate']), question_id
+    distribution = analytics.score_distribution()
+    counts, percentiles = python_score_distribution(records)
+    assert distribution['counts'] == counts
+    assert all(close(a, b) for a, b in zip(distribution['percentiles'].values(), percentiles))
+    trends = analytics.trends(movers=1)
+    means, top_mover = python_trends(records)
+    assert all(close(a, b) for a, b in zip([m for m in trends['cohort']['mean_score'] if m is not None], means))
+    assert trends['improving'][0]['student_id'] == top_mover
+    cohorts = analytics.cohorts(study_groups, args.questions)
+    assert all(close(a, b) for a, b in zip(cohorts['mean_score'], python_cohorts(records, study_groups)))
+    print('Columnar and pure-Python results agree\n')
+
+    queries = [
+        ('question difficulty', lambda: analytics.question_stats(), lambda: python_question_stats(records)),
+        ('score histogram', lambda: analytics.score_distribution(), lambda: python_score_distribution(records)),
+        ('weekly trends + movers', lambda: analytics.trends(), lambda: python_trends(records)),
+        ('study group cohorts', lambda: analytics.cohorts(study_groups, args.questions),
+         lambda: python_cohorts(records, study_groups)),
+    ]
+    print(f'{"query":<24}{"numpy ms":>12}{"python ms":>12}{"speedup":>10}')
+    for name, columnar, python in queries:
+        numpy_ms, _ = timed(columnar, args.repeat)
+        python_ms, _ = timed(python, args.repeat)
+        print(f'{name:<24}{numpy_ms:12.1f}{python_ms:12.1f}{python_ms / numpy_ms:9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Cold start and bytes sent per page load, with and without the asset pipeline.
+
+Cold start runs ``--runs`` fresh interpreters that import the app and serve
+the home page, and reports the median time to the import being done and to
+the first response, next to a bare interpreter and one importing only Flask.
+
+Bytes per page load fetches each page's HTML and the local stylesheets and
+scripts it links, as a browser sending ``Accept-Encoding: gzip, br``
+would, for:
+
+* development: the plain ``/static/`` files, uncompressed, revalidated with
+  a conditional request on every later visit;
+* production: the fingerprinted build, precompressed, and not requested
+  again on later visits while it is cached (``immutable``).
+
+CDN files (Bootstrap, Font Awesome, Chart.js) are counted as requests only,
+as their size depends on the CDN.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_assets --runs 10
+"""
+import argparse
+import logging
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import app as app_module
+
+PAGES = ('/', '/student/dashboard/1', '/professor/dashboard', '/collaboration', '/collaboration/1',
+         '/collaboration/code_gallery')
+LINKS = re.compile(r'(?:href|src)="([^"]+)"')
+
+COLD_START = '''
+import time
+began = time.perf_counter()
+{imports}
+imported = time.perf_counter()
+{request}
+print(imported - began, time.perf_counter() - began)
+'''
+
+
+def cold_start(imports, request='', runs=10):
+    """Median seconds from interpreter start to the imports being done and to the end of ``request``"""
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = COLD_START.format(imports=imports, request=request)
+    imported, served, total = [], [], []
+    for _ in range(runs):
+        began = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True,
+                                env=dict(os.environ, PYTHONPATH=here), check=True).stdout
+        total.append(time.perf_counter() - began)
+        first, second = map(float, output.split())
+        imported.append(first)
+        served.append(second)
+    return statistics.median(imported), statistics.median(served), statistics.median(total)
+
+
+def page_load(client, path, repeat_visit):
+    """``(requests, bytes)`` sent for ``path`` and its local assets, and the number of CDN requests"""
+    encodings = {'Accept-Encoding': 'gzip, br', 'X-Cache-Bypass': '1'}
+    html = client.get(path, headers=encodings)
+    requests, sent, cdn = 1, len(html.data), 0
+    for link in LINKS.findall(html.get_data(as_text=True)):
+        if link.startswith('http'):
+            cdn += link.endswith(('.css', '.js')) or 'chart.js' in link
+            continue
+        if not link.startswith(('/static/', '/assets/')):
+            continue
+        if repeat_visit and link.startswith('/assets/'):
+            # Cached as immutable: the browser does not ask again
+            continue
+        first = client.get(link, headers=encodings)
+        if repeat_visit:
+            response = client.get(link, headers=dict(encodings, **{'If-None-Match': first.headers['ETag']}))
+        else:
+            response = first
+        requests += 1
+        sent += len(response.data)
+    return requests, sent, cdn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters per cold start measurement')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(f'{"cold start (ms, median of " + str(args.runs) + ")":<44}{"imported":>10}{"served /":>10}{"process":>10}')
+    for name, imports, request in (
+            ('python -c pass', 'pass', ''),
+            ('import flask', 'import flask', ''),
+            ('import app', 'import app', 'app.app.test_client().get("/")'),
+            ('import app, ASSET_PIPELINE=1', 'import os; os.environ["ASSET_PIPELINE"] = "1"; import app',
+             'app.app.test_client().get("/")')):
+        imported, served, total = cold_start(imports, request, args.runs)
+        print(f'{name:<44}{imported * 1000:>10.1f}{served * 1000 if request else float("nan"):>10.1f}'
+              f'{total * 1000:>10.1f}')
+
+    client = app_module.app.test_client()
+    assets = app_module.assets
+    print(f'\n{"page load":<44}{"requests":>10}{"bytes":>10}{"CDN":>6}'
+          f'{"repeat requests":>18}{"repeat bytes":>14}')
+    totals = {}
+    for enabled in (False, True):
+        assets.enabled = enabled
+        if enabled:
+            assets.load()
+        for path in PAGES:
+            first = page_load(client, path, repeat_visit=False)
+            repeat = page_load(client, path, repeat_visit=True)
+            name = f'{path} ({"production" if enabled else "development"})'
+            print(f'{name:<44}{first[0]:>10}{first[1]:>10}{first[2]:>6}{repeat[0]:>18}{repeat[1]:>14}')
+            total = totals.setdefault(enabled, [0, 0])
+            total[0] += first[1]
+            total[1] += repeat[1]
+    for enabled, (first, repeat) in totals.items():
+        print(f'{"all pages, " + ("production" if enabled else "development"):<44}'
+              f'{first:>20} bytes first visit, {repeat} bytes repeat visit')
+    for name, entry in sorted(assets.manifest.items()):
+        sizes = ', '.join(f'{encoding} {size}' for encoding, size in entry['encodings'].items())
+        print(f'  {name}: {entry["bytes"]} bytes as written, {sizes}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Memory held by code and answer text: plain strings vs the blob store.
+
+Builds a synthetic workload shaped like a course's collaboration data:
+
+* code shares, most of them forks (identical copies) of a smaller set of
+  programs and the rest small variations of one;
+* submitted answers, some the question's starter code left unchanged and
+  the rest the starter code with a short solution filled in;
+* long pair programming sessions, each edited keystroke by keystroke.
+
+and reports the Python heap (tracemalloc) taken by the text when every
+record holds its own string, as the store used to, against the same text
+in a ``BlobStore`` (deduplicated only, and deduplicated plus compressed).
+For session history it compares keeping a full snapshot per version with
+the ``EditHistory`` deltas and checkpoints. Finally it times a pair
+session edit (``PairSyncHub.apply``), which now stores the buffer as a
+blob on every keystroke.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_blobs --shares 5000 --submissions 50000 --sessions 500 --edits 500
+"""
+import argparse
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+
+from blobs import BlobStore
+from pair_sync import EditHistory, PairSyncHub, apply_delta
+from store import DataStore
+
+NAMES = ('items', 'values', 'graph', 'grid', 'words', 'matrix', 'nodes', 'scores')
+
+
+def program(rng, lines):
+    """A plausible Python module of about ``lines`` lines"""
+    out = []
+    while len(out) < lines:
+        name, arg = f'step_{rng.randrange(10_000)}', rng.choice(NAMES)
+        out += [f'def {name}({arg}, limit={rng.randrange(100)}):',
+                f'    """Process {arg} up to limit"""',
+                '    result = []',
+                f'    for index, value in enumerate({arg}):',
+                '        if index >= limit:',
+                '            break',
+                f'        result.append(value * {rng.randrange(2, 9)})',
+                '    return result',
+                '']
+    return '\n'.join(out) + '\n'
+
+
+def copy(text):
+    """An equal but distinct string, as each request body decodes to"""
+    return (text + ' ')[:-1]
+
+
+def share_texts(rng, count):
+    originals = [program(rng, rng.randrange(30, 150)) for _ in range(max(1, count // 10))]
+    for n in range(count):
+        base = rng.choice(originals)
+        if rng.random() < 0.6:
+            yield copy(base)
+        else:
+            yield base + f'\nprint(step_{n}([1, 2, 3]))\n'
+
+
+def answer_texts(rng, count, questions=50):
+    starters = [f'def solve(items):\n    """Question {q}: {program(rng, 3)}"""\n    # Your code here\n    pass\n'
+                for q in range(questions)]
+    for n in range(count):
+        starter = rng.choice(starters)
+        if rng.random() < 0.3:
+            yield copy(starter)
+        else:
+            yield starter.replace('    pass\n', f'    return sorted(items)[:{n % 97}]\n')
+
+
+def measure(build):
+    """``(bytes still allocated by build(), result)``"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return current, result
+
+
+def keystrokes(rng, code, edits):
+    """``edits`` single-character deltas typed at a few cursor positions"""
+    deltas, cursor = [], rng.randrange(len(code))
+    for n in range(edits):
+        if n % 40 == 0:
+            cursor = rng.randrange(len(code))
+        if rng.random() < 0.15 and cursor:
+            delta = {'start': cursor - 1, 'end': cursor, 'text': ''}
+            cursor -= 1
+        else:
+            delta = {'start': cursor, 'end': cursor, 'text': rng.choice('abcdefgh ()=\n')}
+            cursor += 1
+        code = apply_delta(code, delta)
+        deltas.append((delta, code))
+    return deltas
+
+
+def report(name, raw, stored):
+    print(f'{name:<44}{raw / 1e6:>10.1f}{stored / 1e6:>10.1f}{raw / max(stored, 1):>9.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shares', type=int, default=5000)
+    parser.add_argument('--submissions', type=int, default=50_000)
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--edits', type=int, default=500, help='Keystrokes per session')
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    texts = list(share_texts(rng, args.shares)) + list(answer_texts(rng, args.submissions))
+    print(f'{len(texts)} shares and answers, {sum(map(len, texts)) / 1e6:.1f} MB of text\n')
+
+    print(f'{"text storage (MB)":<44}{"strings":>10}{"blobs":>10}{"saved":>10}')
+    raw, _ = measure(lambda: [copy(text) for text in texts])
+    for name, threshold in (('shares + answers, deduplicated', None), ('shares + answers, + zlib', 256)):
+        def build():
+            blobs = BlobStore(threshold=threshold)
+            return [blobs.put(copy(text)) for text in texts], blobs
+
+        stored, (_, blobs) = measure(build)
+        report(name, raw, stored)
+    print(f'  {len(blobs)} distinct texts for {len(texts)} records')
+
+    sessions = [program(rng, rng.randrange(40, 120)) for _ in range(args.sessions)]
+    edits = [keystrokes(rng, code, args.edits) for code in sessions]
+
+    def snapshots():
+        return [[copy(code) for _, code in session] for session in edits]
+
+    def histories():
+        blobs = BlobStore()
+        kept = []
+        for code, session in zip(sessions, edits):
+            history = EditHistory(blobs, code, limit=args.edits)
+            for delta, new_code in session:
+                # Each delta arrives as its own decoded request body
+                history.record(dict(delta, text=copy(delta['text'])), new_code)
+            kept.append(history)
+        return kept, blobs
+
+    raw, _ = measure(snapshots)
+    stored, _ = measure(histories)
+    report(f'session history, {args.edits} versions each', raw, stored)
+
+    print(f'\n{"pair edit latency (us)":<44}{"p50":>10}{"p95":>10}')
+    store = DataStore()
+    for n, code in enumerate(sessions[:50], 1):
+        store.add_session({'id': n, 'student1_id': 1, 'student2_id': 2, 'problem_title': 'P',
+                           'code': code, 'active': True})
+    hub = PairSyncHub(store, blobs=store.blobs, history=args.edits)
+    samples = []
+    gc.disable()
+    try:
+        for n, session in enumerate(edits[:50], 1):
+            for version, (delta, _) in enumerate(session):
+                start = time.perf_counter()
+                hub.apply(n, version, delta)
+                samples.append((time.perf_counter() - start) * 1e6)
+    finally:
+        gc.enable()
+    samples.sort()
+    print(f'{"apply + store the buffer as a blob":<44}{statistics.median(samples):>10.1f}'
+          f'{samples[int(len(samples) * 0.95)]:>10.1f}')
+    assert store.get_session(1)['code'] == edits[0][-1][1]
+    assert hub.code_at(1, 0) == sessions[0]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Bulk import/export throughput and peak memory at growing file sizes.
+
+Writes a roster CSV and a question bank JSONL of each size to a temporary
+directory, imports them into a fresh SQLite-backed store and exports the
+roster and the grades back out. Each operation is timed, then repeated on
+a second database under tracemalloc (which slows allocation down too much
+to time) for its peak Python allocations: since rows are streamed, the
+peak should stay flat as the row count grows. Records live in the database
+file, so the store itself does not grow in memory.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_bulk --rows 10000 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from bulk import export_rows, import_rows, read_rows, write_rows
+from sql_store import SqlStore
+
+
+def write_files(directory, rows):
+    roster = os.path.join(directory, f'roster-{rows}.csv')
+    with open(roster, 'w', newline='') as out:
+        out.write('name,email\n')
+        for n in range(rows):
+            out.write(f'Student {n},student{n}@university.edu\n')
+    bank = os.path.join(directory, f'bank-{rows}.jsonl')
+    with open(bank, 'w') as out:
+        for n in range(rows):
+            out.write(json.dumps({'type': 'coding', 'title': f'Question {n}', 'description': 'Reverse a list',
+                                  'difficulty': 'Easy', 'tests': {'function': 'solve', 'cases': [
+                                      {'args': [[1, 2, 3]], 'expected': [3, 2, 1]}]}}) + '\n')
+    return roster, bank
+
+
+def add_grades(store):
+    """One submission with feedback per imported student, for the grades export"""
+    students = [row['id'] for row in store.iter_students()]
+    question_id = next(store.iter_questions())['id']
+    timestamp = '2025-08-07 12:00:00'
+    submissions = [{'id': n + 1, 'student_id': student_id, 'question_id': question_id,
+                    'answer': 'def solve(items):\n    return items[::-1]\n', 'submitted_at': timestamp}
+                   for n, student_id in enumerate(students)]
+    store.load(submissions=submissions,
+               feedback=[{'submission_id': s['id'], 'student_id': s['student_id'], 'question_id': question_id,
+                          'feedback': 'Correct', 'score': 100, 'created_at': timestamp} for s in submissions])
+
+
+def timed(operation):
+    """Run ``operation``; returns (seconds, result)"""
+    start = time.perf_counter()
+    result = operation()
+    return time.perf_counter() - start, result
+
+
+def traced(operation):
+    """Run ``operation``; returns (peak MB of new allocations, result)"""
+    tracemalloc.start()
+    result = operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6, result
+
+
+def operations(store, roster, bank, directory):
+    """``(name, run)`` pairs in order; grades are added just before they are exported"""
+    def export_grades():
+        add_grades(store)
+        return lambda: export_file(store, 'grades', os.path.join(directory, 'out.jsonl'), 'jsonl')
+
+    yield 'import roster (csv)', lambda: import_file(store, 'students', roster, 'csv')
+    yield 'import questions (jsonl)', lambda: import_file(store, 'questions', bank, 'jsonl')
+    yield 'export roster (csv)', lambda: export_file(store, 'students', os.path.join(directory, 'out.csv'), 'csv')
+    yield 'export grades (jsonl)', export_grades()
+
+
+def import_file(store, kind, path, fmt):
+    with open(path, newline='', encoding='utf-8-sig') as lines:
+        return import_rows(store, kind, read_rows(lines, fmt))
+
+
+def export_file(store, kind, path, fmt):
+    fields, rows = export_rows(store, kind)
+    with open(path, 'w', newline='') as out:
+        for chunk in write_rows(fields, rows, fmt):
+            out.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f'{"operation":<28}{"rows":>9}{"seconds":>10}{"rows/s":>10}{"peak MB":>10}')
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.rows:
+            roster, bank = write_files(directory, rows)
+            timing_store = SqlStore(f'sqlite:///{os.path.join(directory, f"timed-{rows}.db")}')
+            tracing_store = SqlStore(f'sqlite:///{os.path.join(directory, f"traced-{rows}.db")}')
+            for (name, run), (_, run_traced) in zip(operations(timing_store, roster, bank, directory),
+                                                     operations(tracing_store, roster, bank, directory)):
+                seconds, result = timed(run)
+                if name.startswith('import'):
+                    assert result.imported == rows and not result.rejected, result.to_dict()
+                peak, _ = traced(run_traced)
+                print(f'{name:<28}{rows:>9}{seconds:>10.2f}{rows / seconds:>10.0f}{peak:>10.2f}')
+            timing_store.engine.dispose()
+            tracing_store.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
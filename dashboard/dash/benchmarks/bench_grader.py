@@ -0,0 +1,60 @@
+"""Auto-grading throughput in submissions graded per second.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_grader --submissions 500
+"""
+import argparse
+import os
+import time
+
+from app import seed_questions
+from grader import Grader
+
+TWO_SUM = seed_questions[0]['tests']
+
+ANSWERS = [
+    # Correct hash-map solution
+    'def two_sum(nums, target):\n'
+    '    seen = {}\n'
+    '    for i, n in enumerate(nums):\n'
+    '        if target - n in seen:\n'
+    '            return [seen[target - n], i]\n'
+    '        seen[n] = i\n',
+    # Correct brute force
+    'def two_sum(nums, target):\n'
+    '    for i in range(len(nums)):\n'
+    '        for j in range(i + 1, len(nums)):\n'
+    '            if nums[i] + nums[j] == target:\n'
+    '                return [i, j]\n',
+    # Wrong answer
+    'def two_sum(nums, target):\n'
+    '    return [0, 1]\n',
+    # Syntax error
+    'def two_sum(nums, target)\n'
+    '    return []\n',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--submissions', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    answers = [ANSWERS[i % len(ANSWERS)] for i in range(args.submissions)]
+    grader = Grader(workers=args.workers)
+    grader.run(answers[0], TWO_SUM)  # warm up
+
+    start = time.perf_counter()
+    results = grader.grade_many(answers, TWO_SUM)
+    elapsed = time.perf_counter() - start
+    grader.shutdown()
+
+    passed = sum(1 for result in results if result['score'] == 100)
+    print(f'{len(results)} submissions ({passed} fully correct) on {args.workers} workers '
+          f'in {elapsed:.2f}s: {len(results) / elapsed:.1f} submissions/s')
+
+
+if __name__ == '__main__':
+    main()
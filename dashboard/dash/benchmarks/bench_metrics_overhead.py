@@ -0,0 +1,93 @@
+"""Per-request cost of the request metrics, disabled and enabled.
+
+The app is imported with ``METRICS_ENABLED=0``, which installs no hooks and
+leaves the store unwrapped. The benchmark then alternates rounds of the same
+route mix with the metrics hooks and store wrapper attached and detached, so
+both modes run in the same process on the same warmed-up data. It reports
+the fastest round of each mode in CPU time, which filters out most noise
+from other processes.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_metrics_overhead --requests 2000
+"""
+import argparse
+import logging
+import os
+import time
+
+os.environ['METRICS_ENABLED'] = '0'
+os.environ.pop('PROFILE_TOKEN', None)
+
+import app as app_module  # noqa: E402
+from flask import before_render_template, template_rendered  # noqa: E402
+from profiling import InstrumentedStore, RequestMetrics  # noqa: E402
+
+ROUTES = [
+    '/',
+    '/professor/view_questions',
+    '/professor/view_submissions/1',
+    '/student/dashboard/1',
+    '/api/analytics_data',
+    '/api/questions',
+    '/collaboration/code_gallery',
+]
+
+
+def attach(app, raw_store):
+    """Install the same hooks and store wrapper that METRICS_ENABLED=1 does"""
+    # Flask refuses init-style registration after the first request, so go direct
+    metrics = RequestMetrics()
+    app.before_request_funcs.setdefault(None, []).insert(0, metrics._before)
+    app.after_request_funcs.setdefault(None, []).append(metrics._after)
+    before_render_template.connect(metrics._render_started, app)
+    template_rendered.connect(metrics._render_finished, app)
+    app_module.store = InstrumentedStore(raw_store)
+    return metrics
+
+
+def detach(app, metrics, raw_store):
+    app.before_request_funcs[None].remove(metrics._before)
+    app.after_request_funcs[None].remove(metrics._after)
+    before_render_template.disconnect(metrics._render_started, app)
+    template_rendered.disconnect(metrics._render_finished, app)
+    app_module.store = raw_store
+
+
+def run_round(client, requests):
+    start = time.process_time()
+    for n in range(requests):
+        client.get(ROUTES[n % len(ROUTES)], headers={'X-Cache-Bypass': '1'})
+    return (time.process_time() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=8)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    app, raw_store = app_module.app, app_module.store
+    client = app.test_client()
+    for url in ROUTES:
+        client.get(url)  # warm up templates and caches
+
+    best = {'disabled': None, 'enabled': None}
+    for _ in range(args.rounds):
+        mean = run_round(client, args.requests)
+        best['disabled'] = min(mean, best['disabled'] or mean)
+        metrics = attach(app, raw_store)
+        mean = run_round(client, args.requests)
+        best['enabled'] = min(mean, best['enabled'] or mean)
+        detach(app, metrics, raw_store)
+
+    for mode, mean in best.items():
+        print(f'metrics {mode:<8}: {mean:8.1f} us CPU/request')
+    overhead = best['enabled'] - best['disabled']
+    print(f'enabled overhead: {overhead:+.1f} us/request ({100 * overhead / best["disabled"]:+.1f}%)')
+    print('disabled overhead: none by construction (no hooks are installed and the store is not wrapped)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Student question listing: per-question lookups vs the precomputed status map.
+
+Loads a large course (10k questions x 50k students by default) and compares,
+for a sample of students:
+
+* the old listing join: copy every question and look up the student's
+  submission and feedback for each one;
+* the status map join over the same full listing (no copies);
+* the status map joined with one page of questions, as the page now does;
+
+then renders the page with every question on it (as it used to be) and
+times the paginated page and the JSON status endpoint through the app,
+uncached (``X-Cache-Bypass``) and from the render cache.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_question_status --students 50000 --questions 10000
+
+Set ``DATA_BACKEND=sql`` (and optionally ``DATABASE_URL``) to measure the
+SQLAlchemy backend instead of the in-memory store.
+"""
+import argparse
+import gc
+import logging
+import random
+import statistics
+import time
+
+from flask import render_template
+
+from app import app, render_cache, store
+from benchmarks.synthetic import populate
+from render_cache import BYPASS_HEADER
+
+
+def legacy_listing(student_id):
+    """The listing join before the status map: a copy and two lookups per question"""
+    questions = []
+    for question in store.all_questions():
+        question_copy = question.copy()
+        submission = store.find_submission(student_id, question['id'])
+        question_copy['submitted'] = submission is not None
+        if submission:
+            question_copy['feedback'] = store.feedback_for_submission(submission['id'])
+        questions.append(question_copy)
+    return questions
+
+
+def status_listing(student_id):
+    """Every question joined with the status map, without copying"""
+    status = store.question_status(student_id)
+    return [(question, status.get(question['id'])) for question in store.all_questions()]
+
+
+def status_page(student_id, limit):
+    """The first page of questions joined with the status map and its feedback"""
+    questions = list(store.iter_questions(limit=limit))
+    status = store.question_status(student_id)
+    feedback = {question['id']: store.feedback_for_submission(status[question['id']]['submission_id'])
+                for question in questions
+                if question['id'] in status and status[question['id']]['feedback_id'] is not None}
+    return questions, status, feedback
+
+
+def latencies(function, students):
+    """Milliseconds per call of ``function(student_id)`` across ``students``.
+
+    The collector is paused while timing, as ``timeit`` does: with millions
+    of records loaded, a full collection landing in one call dwarfs the
+    join being measured.
+    """
+    samples = []
+    gc.disable()
+    try:
+        for student_id in students:
+            start = time.perf_counter()
+            function(student_id)
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        gc.enable()
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f'{name:<40}{statistics.median(samples):>10.3f}{p95:>10.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=50_000)
+    parser.add_argument('--questions', type=int, default=10_000)
+    parser.add_argument('--submissions', type=int, default=500_000)
+    parser.add_argument('--sample', type=int, default=200, help='Students timed per measurement')
+    parser.add_argument('--legacy-sample', type=int, default=20, help='Students timed with the old join')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    start = time.perf_counter()
+    student_ids, _ = populate(store, args.students, args.questions, args.submissions)
+    render_cache.bump('questions', 'submissions', 'feedback', 'status')
+    print(f'Loaded {store.count_questions()} questions, {store.count_students()} students and '
+          f'{store.count_submissions()} submissions in {time.perf_counter() - start:.1f}s\n')
+
+    rng = random.Random(7)
+    sample = rng.sample(student_ids, min(args.sample, len(student_ids)))
+    limit = app.config['PAGE_SIZE']
+    answered = statistics.mean(len(store.question_status(student_id)) for student_id in sample)
+    print(f'{answered:.1f} answered questions per sampled student, page size {limit}\n')
+
+    # The two full-listing joins must agree before they are timed
+    for student_id in sample[:5]:
+        old = legacy_listing(student_id)
+        new = status_listing(student_id)
+        assert [q['submitted'] for q in old] == [state is not None for _, state in new]
+        assert [q.get('feedback') and q['feedback']['id'] for q in old] == \
+            [state and state['feedback_id'] for _, state in new]
+
+    print(f'{"join (ms)":<40}{"p50":>10}{"p95":>10}')
+    report('old: copy + lookups, all questions', latencies(legacy_listing, sample[:args.legacy_sample]))
+    report('status map, all questions', latencies(status_listing, sample))
+    report(f'status map, one page of {limit}', latencies(lambda s: status_page(s, limit), sample))
+
+    def render_all(student_id):
+        questions = store.all_questions()
+        _, status, feedback = status_page(student_id, 0)
+        with app.test_request_context(f'/student/view_questions/{student_id}'):
+            render_template('student.html', student=store.get_student(student_id), questions=questions,
+                            status=status, feedback=feedback, total_questions=len(questions),
+                            show_questions=True)
+
+    client = app.test_client()
+    print(f'\n{"route (ms)":<40}{"p50":>10}{"p95":>10}')
+    report('page rendering all questions', latencies(render_all, sample[:args.legacy_sample]))
+    for name, url in (('page', '/student/view_questions/{}'), ('json', '/api/students/{}/question_status')):
+        def fetch(student_id, headers=None):
+            response = client.get(url.format(student_id), headers=headers)
+            assert response.status_code == 200, (url, response.status_code)
+            return response
+
+        report(f'{name}, uncached', latencies(lambda s: fetch(s, {BYPASS_HEADER: '1'}), sample))
+        report(f'{name}, first view (cache miss)', latencies(fetch, sample))
+        report(f'{name}, repeat view (cache hit)', latencies(fetch, sample))
+        assert fetch(sample[0]).headers['X-Cache'] in ('HIT', 'BYPASS')
+
+
+if __name__ == '__main__':
+    main()
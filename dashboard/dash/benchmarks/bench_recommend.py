@@ -0,0 +1,112 @@
+"""Partner and study group suggestions at 50k students.
+
+Loads a synthetic course, builds the recommender from the analytics
+columns and reports:
+
+* the build time and index size;
+* partner and group query latency for a sample of students;
+* the cost of the query right after a grade lands (the student's row and
+  those of their group mates are recomputed first), and of the full pass
+  that follows once ``REBUILD_FRACTION`` of the students have changed;
+* the JSON endpoint and the collaboration page through the app.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_recommend --students 50000 --submissions 500000 --groups 5000
+"""
+import argparse
+import gc
+import logging
+import random
+import statistics
+import time
+
+import app as app_module
+from benchmarks.synthetic import populate
+from recommend import build_recommender
+
+TIMESTAMP = '2025-08-07 12:00:00'
+
+
+def timed(function, arguments):
+    """Milliseconds per ``function(argument)``, with the collector paused as ``timeit`` does"""
+    samples = []
+    gc.disable()
+    try:
+        for argument in arguments:
+            start = time.perf_counter()
+            function(argument)
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        gc.enable()
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f'{name:<44}{statistics.median(samples):>10.3f}{p95:>10.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=50_000)
+    parser.add_argument('--questions', type=int, default=200)
+    parser.add_argument('--submissions', type=int, default=500_000)
+    parser.add_argument('--groups', type=int, default=5000)
+    parser.add_argument('--sample', type=int, default=500)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    store = app_module.store
+    student_ids, _ = populate(store, args.students, args.questions, args.submissions, groups=args.groups)
+    analytics = app_module.cohort_analytics
+    analytics.add_submissions(store.iter_submissions())
+    analytics.set_scores(store.iter_feedback())
+
+    start = time.perf_counter()
+    recommender = build_recommender(store, analytics)
+    build = time.perf_counter() - start
+    metrics = recommender.metrics()
+    print(f'{args.students} students, {args.submissions} submissions, {args.groups} groups: built in {build:.2f}s, '
+          f'{metrics["students"]} students with a vector, '
+          f'{recommender._vectors.nbytes / 1e6:.1f} MB of vectors\n')
+
+    rng = random.Random(5)
+    sample = rng.sample(student_ids, args.sample)
+    print(f'{"query (ms)":<44}{"p50":>10}{"p95":>10}')
+    report('partners, similar', timed(recommender.partners, sample))
+    report('partners, complement', timed(lambda s: recommender.partners(s, mode='complement'), sample))
+    report('groups', timed(recommender.groups, sample))
+
+    submissions = rng.sample(list(store.iter_submissions()), args.sample)
+
+    def graded_then_query(submission):
+        feedback = store.set_feedback({'submission_id': submission['id'], 'student_id': submission['student_id'],
+                                       'question_id': submission['question_id'], 'feedback': 'Regraded',
+                                       'score': rng.randrange(101), 'created_at': TIMESTAMP})
+        analytics.set_score(feedback)
+        recommender.mark(submission['student_id'])
+        recommender.partners(submission['student_id'])
+
+    before = recommender.stats['renormalized']
+    samples = timed(graded_then_query, submissions)
+    report('grade lands, then partners', samples)
+    print(f'  {recommender.stats["renormalized"] - before} full passes during those {len(samples)} grades')
+    with recommender._lock:
+        start = time.perf_counter()
+        recommender._renormalize()
+        print(f'  one full pass: {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    # The app's own recommender, rebuilt with the synthetic data
+    app_module.recommender.rebuild()
+    client = app_module.app.test_client()
+    print(f'\n{"route (ms)":<44}{"p50":>10}{"p95":>10}')
+    report('/api/students/<id>/recommendations',
+           timed(lambda s: client.get(f'/api/students/{s}/recommendations'), sample[:100]))
+    report('/api/students/<id>/recommendations?kind=partners',
+           timed(lambda s: client.get(f'/api/students/{s}/recommendations?kind=partners'), sample[:100]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""Keeping ``--timers`` deadlines pending: timer wheel against a heap and a poll.
+
+Schedules ``--timers`` deadlines spread over ``--days`` days of one second
+ticks, then runs the clock forward ``--hours`` hours, with:
+
+* the hierarchical timer wheel (``scheduler.TimerWheel``);
+* a ``heapq`` of ``(expires, key)``, cancelling lazily with a tombstone set;
+* a poll scanning every deadline each tick, as a cron job querying for
+  questions past their ``closes_at`` would.
+
+It reports the cost to schedule and cancel a timer, the cost per tick
+(median and worst), the memory held by the pending timers, and checks that
+every structure fired exactly the timers due, at their tick. The poll only
+runs ``--poll-ticks`` ticks, its cost per tick not depending on the time.
+
+Then it times ``/student/submit_answer`` through the app, to questions with
+and without a submission window, with the timers pending in the app's
+scheduler.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_scheduler --timers 100000 --days 30 --hours 24
+"""
+import argparse
+import heapq
+import logging
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import app as app_module
+from benchmarks.synthetic import populate
+from bulk import TIMESTAMP_FORMAT
+from scheduler import TimerWheel
+
+START = 1_000_000_000
+
+
+class HeapTimers:
+    """The textbook alternative: a binary heap, cancelled entries skipped when popped"""
+
+    def __init__(self, tick=0):
+        self.tick = tick
+        self._heap = []
+        self._live = {}
+
+    def schedule(self, key, expires, value=None):
+        self._live[key] = expires
+        heapq.heappush(self._heap, (max(expires, self.tick + 1), expires, key, value))
+
+    def cancel(self, key):
+        return self._live.pop(key, None) is not None
+
+    def advance(self, tick):
+        fired = []
+        heap = self._heap
+        while heap and heap[0][0] <= tick:
+            _, expires, key, value = heapq.heappop(heap)
+            # Cancelled or rescheduled since it was pushed
+            if self._live.get(key) != expires:
+                continue
+            del self._live[key]
+            fired.append((key, expires, value))
+        self.tick = tick
+        return fired
+
+
+class PollTimers:
+    """Every pending deadline checked on every tick"""
+
+    def __init__(self, tick=0):
+        self.tick = tick
+        self._pending = {}
+
+    def schedule(self, key, expires, value=None):
+        self._pending[key] = (expires, value)
+
+    def cancel(self, key):
+        return self._pending.pop(key, None) is not None
+
+    def advance(self, tick):
+        self.tick = tick
+        due = [(key, expires, value) for key, (expires, value) in self._pending.items() if expires <= tick]
+        for key, _, _ in due:
+            del self._pending[key]
+        return due
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(factory, deadlines, cancelled, ticks):
+    """Schedule, cancel and tick through ``ticks``; returns the timings, memory and what fired"""
+    # Memory from a separate build, as tracing allocations slows them down
+    tracemalloc.start()
+    timers = factory(START)
+    for key, expires in deadlines:
+        timers.schedule(key, expires, key)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    timers = factory(START)
+    began = time.perf_counter()
+    for key, expires in deadlines:
+        timers.schedule(key, expires, key)
+    scheduled = time.perf_counter() - began
+
+    began = time.perf_counter()
+    for key in cancelled:
+        timers.cancel(key)
+    cancelling = time.perf_counter() - began
+
+    per_tick, fired = [], {}
+    for tick in range(START + 1, START + ticks + 1):
+        began = time.perf_counter()
+        due = timers.advance(tick)
+        per_tick.append(time.perf_counter() - began)
+        for key, _, _ in due:
+            fired[key] = tick
+    return {
+        'schedule_us': scheduled / len(deadlines) * 1e6,
+        'cancel_us': cancelling / max(1, len(cancelled)) * 1e6,
+        'tick_p50_us': statistics.median(per_tick) * 1e6,
+        'tick_max_us': max(per_tick) * 1e6,
+        'total_s': sum(per_tick),
+        'memory_mb': memory / 2 ** 20,
+        'fired': fired,
+    }
+
+
+def submit(client, student_id, question_id):
+    """Milliseconds to submit one answer"""
+    began = time.perf_counter()
+    response = client.post('/student/submit_answer', headers={'Referer': '/'},
+                           data={'student_id': student_id, 'question_id': question_id, 'answer': 'print(42)'})
+    assert response.status_code == 302, response.status_code
+    return (time.perf_counter() - began) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--timers', type=int, default=100_000, help='Pending deadlines')
+    parser.add_argument('--days', type=int, default=30, help='Deadlines are spread over this many days')
+    parser.add_argument('--hours', type=int, default=24, help='Hours of one second ticks to run')
+    parser.add_argument('--cancel', type=float, default=0.1, help='Fraction of deadlines cancelled')
+    parser.add_argument('--poll-ticks', type=int, default=20, help='Ticks to run the poll for')
+    parser.add_argument('--submits', type=int, default=500, help='Answers submitted per case')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    span = args.days * 86400
+    ticks = args.hours * 3600
+    # A few deadlines already passed (catch-up at startup), the rest ahead,
+    # with a share landing on exact hours as deadlines tend to
+    deadlines = []
+    for key in range(args.timers):
+        if rng.random() < 0.3:
+            expires = START + rng.randrange(0, span, 3600)
+        else:
+            expires = START + rng.randrange(-60, span)
+        deadlines.append((key, expires))
+    cancelled = rng.sample(range(args.timers), int(args.timers * args.cancel))
+    gone = set(cancelled)
+    expected = {key: max(expires, START + 1) for key, expires in deadlines
+                if key not in gone and expires <= START + ticks}
+
+    print(f'{args.timers} deadlines over {args.days} days, {len(cancelled)} cancelled, '
+          f'{args.hours} h of 1 s ticks ({len(expected)} due)\n')
+    print(f'{"":<14}{"schedule us":>12}{"cancel us":>10}{"tick p50 us":>12}{"tick max us":>12}'
+          f'{"run s":>8}{"memory MB":>11}')
+    for name, factory, run_ticks in (('timer wheel', TimerWheel, ticks), ('heapq', HeapTimers, ticks),
+                                     ('poll', PollTimers, args.poll_ticks)):
+        result = run(factory, deadlines, cancelled, run_ticks)
+        due = {key: tick for key, tick in expected.items() if tick <= START + run_ticks}
+        assert result['fired'] == due, f'{name} fired {len(result["fired"])} timers, expected {len(due)}'
+        total = result['total_s'] if run_ticks == ticks else result['total_s'] / run_ticks * ticks
+        print(f'{name:<14}{result["schedule_us"]:>12.2f}{result["cancel_us"]:>10.2f}'
+              f'{result["tick_p50_us"]:>12.1f}{result["tick_max_us"]:>12.1f}'
+              f'{total:>8.2f}{result["memory_mb"]:>11.1f}')
+    print(f'(poll run time extrapolated from {args.poll_ticks} ticks; every run fired exactly the due timers)')
+
+    logging.disable(logging.INFO)
+    students, _ = populate(app_module.store, 2000, 20, 20_000)
+    now = datetime.now()
+    window = {'opens_at': (now - timedelta(hours=1)).strftime(TIMESTAMP_FORMAT),
+              'closes_at': (now + timedelta(days=7)).strftime(TIMESTAMP_FORMAT)}
+    cases = {}
+    for name, fields in (('no window', {}), ('open window', window)):
+        cases[name] = []
+        for _ in range(args.submits):
+            question = app_module.store.add_question(dict(
+                fields, type='interview', title='Bench', description='D', difficulty='Easy',
+                created_at=now.strftime(TIMESTAMP_FORMAT), assigned_to='all'))
+            app_module.schedule_window(question)
+            cases[name].append(question['id'])
+    # The app's scheduler holding as many pending deadlines as above
+    for key, expires in deadlines:
+        app_module.scheduler.schedule(('bench', key), time.time() + expires - START + 120,
+                                      'question_opens', 0)
+    client = app_module.app.test_client()
+    print(f'\nsubmit_answer with {app_module.scheduler.metrics()["pending"]} timers pending'
+          f'{"p50 ms":>10}{"p95 ms":>10}')
+    # Alternating between the cases, as the store growing slows every submit
+    samples = {name: [] for name in cases}
+    for n in range(args.submits):
+        for name, question_ids in cases.items():
+            samples[name].append(submit(client, students[n % len(students)], question_ids[n]))
+    for name, latencies in samples.items():
+        print(f'{name:<47}{statistics.median(latencies):>10.2f}{percentile(latencies, 0.95):>10.2f}')
+    app_module.scheduler.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Search query latency over a large synthetic index.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_search --docs 1000000
+
+Documents are a mix of questions, code shares and group messages drawn from a
+Zipf-like vocabulary, so common words have long posting lists and rare words
+short ones, as in real text.
+"""
+import argparse
+import random
+import time
+from itertools import accumulate
+
+from search import SearchIndex
+
+DIFFICULTIES = ['easy', 'medium', 'hard']
+TYPES = ['coding', 'interview']
+
+
+def make_vocabulary(size, rng):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(words)
+
+
+def build(index, docs, vocabulary, rng):
+    cum_weights = list(accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+    for n in range(docs):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(8, 40))
+        title, body = ' '.join(words[:5]), ' '.join(words[5:])
+        if n % 3 == 0:
+            index.add('question', n, {'title': title, 'description': body},
+                      difficulty=rng.choice(DIFFICULTIES), type=rng.choice(TYPES))
+        elif n % 3 == 1:
+            index.add('code_share', n, {'title': title, 'description': '', 'code': body},
+                      help_needed=rng.random() < 0.3)
+        else:
+            index.add('group_message', n, {'content': body}, group_id=n % 500)
+
+
+def percentile(samples, fraction):
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=1_000_000)
+    parser.add_argument('--vocabulary', type=int, default=50_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    index = SearchIndex()
+    start = time.perf_counter()
+    build(index, args.docs, vocabulary, rng)
+    elapsed = time.perf_counter() - start
+    print(f'Indexed {len(index)} documents in {elapsed:.1f}s ({len(index) / elapsed:.0f} docs/s)')
+
+    # Query words drawn from the whole vocabulary, not just the head
+    mid, tail = vocabulary[100:5000], vocabulary[5000:]
+    workloads = {
+        'rare term': lambda: rng.choice(tail),
+        'two terms': lambda: f'{rng.choice(mid)} {rng.choice(tail)}',
+        'common term': lambda: rng.choice(vocabulary[:100]),
+        'prefix': lambda: rng.choice(mid)[:3] + '*',
+        'filtered': lambda: rng.choice(mid),
+    }
+    print(f'{"query":<12} {"p50 ms":>8} {"p95 ms":>8} {"max ms":>8} {"hits":>6}')
+    for name, make_query in workloads.items():
+        filters = {'kind': 'question', 'difficulty': 'hard'} if name == 'filtered' else {}
+        samples, hits = [], 0
+        for _ in range(args.queries):
+            query = make_query()
+            start = time.perf_counter()
+            hits += len(index.search(query, limit=20, **filters))
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        print(f'{name:<12} {percentile(samples, 0.5):>8.2f} {percentile(samples, 0.95):>8.2f} '
+              f'{samples[-1]:>8.2f} {hits / args.queries:>6.1f}')
+
+
+if __name__ == '__main__':
+    main()
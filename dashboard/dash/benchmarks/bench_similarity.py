@@ -0,0 +1,122 @@
+"""Copy detection cost and recall over a large synthetic submission set.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_similarity --submissions 100000
+
+Every answer is a randomly generated program; a fraction are planted copies
+of an earlier answer to the same question with renamed variables, a changed
+line and an added comment. The benchmark reports indexing latency, how many
+candidates LSH compared against the all-pairs alternative, and how many of
+the planted copies were flagged.
+"""
+import argparse
+import random
+import time
+
+from similarity import SimilarityIndex, fingerprint_submission
+
+NAMES = ['total', 'count', 'left', 'right', 'mid', 'node', 'result', 'seen', 'value', 'index',
+         'items', 'target', 'stack', 'queue', 'best', 'current', 'prev', 'step', 'acc', 'key']
+STATEMENTS = [
+    '{a} = {b} + {n}',
+    '{a} = {b} * {c}',
+    'if {a} > {b}:\n        {c} = {a}',
+    'for {a} in range({n}):\n        {b} += {a}',
+    'while {a} < {b}:\n        {a} += {n}',
+    '{a}.append({b})',
+    '{a} = [{b}, {c}]',
+    '{a} = {b}[{n}]',
+    'if {a} == {b}:\n        return {c}',
+    '{a} = {{}}',
+    '{a}[{b}] = {c}',
+    '{a} = len({b}) - {n}',
+    '{a}, {b} = {b}, {a}',
+    'try:\n        {a} = {b}[{c}]\n    except KeyError:\n        {a} = None',
+    '{a} = sorted({b}, reverse=True)',
+    'for {a}, {b} in enumerate({c}):\n        if {b} is None:\n            break',
+    '{a} = [{b} for {b} in {c} if {b}]',
+    '{a} = max({b}, {c}) // {n}',
+    '{a} = {b} if {c} else {n}',
+    'del {a}[{n}]',
+    'assert {a} is not None',
+    'print({a}, {b})',
+    '{a} = {b}.get({c}, {n})',
+    'with open({a}) as {b}:\n        {c} = {b}.read()',
+]
+
+
+def random_program(rng):
+    lines = [f'def solve({rng.choice(NAMES)}, {rng.choice(NAMES)}):']
+    for _ in range(rng.randint(6, 16)):
+        names = rng.sample(NAMES, 3)
+        lines.append('    ' + rng.choice(STATEMENTS).format(a=names[0], b=names[1], c=names[2],
+                                                            n=rng.randint(0, 9)))
+    lines.append(f'    return {rng.choice(NAMES)}')
+    return '\n'.join(lines)
+
+
+def disguise(code, rng):
+    """Rename every variable, rewrite one line and add a comment"""
+    renamed = dict(zip(NAMES, rng.sample([f'{name}_{rng.randint(1, 9)}' for name in NAMES], len(NAMES))))
+    for old, new in renamed.items():
+        code = code.replace(old, new)
+    lines = code.split('\n')
+    lines[rng.randrange(1, len(lines))] = '    x = 0'
+    lines.insert(1, '    # my own solution')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--submissions', type=int, default=100_000)
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--copy-ratio', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    answers_by_question = {question_id: [] for question_id in range(1, args.questions + 1)}
+    planted = set()
+    submissions = []
+    for submission_id in range(1, args.submissions + 1):
+        question_id = rng.randint(1, args.questions)
+        earlier = answers_by_question[question_id]
+        if earlier and rng.random() < args.copy_ratio:
+            original_id, original = rng.choice(earlier)
+            answer = disguise(original, rng)
+            planted.add((original_id, submission_id))
+        else:
+            answer = random_program(rng)
+        earlier.append((submission_id, answer))
+        submissions.append({'id': submission_id, 'student_id': submission_id,
+                            'question_id': question_id, 'answer': answer})
+
+    index = SimilarityIndex()
+    coding = {'type': 'coding'}
+    latencies = []
+    start = time.perf_counter()
+    for submission in submissions:
+        began = time.perf_counter()
+        fingerprint_submission(index, submission, coding)
+        latencies.append((time.perf_counter() - began) * 1000)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    stats = index.metrics()
+    all_pairs = sum(len(answers) * (len(answers) - 1) // 2 for answers in answers_by_question.values())
+    found = sum(1 for original_id, copy_id in planted
+                if any(match[1] == original_id for match in index.matches('submission', copy_id)))
+    flagged_pairs = sum(len(index.matches('submission', s['id'])) for s in submissions) // 2
+
+    print(f'Indexed {len(submissions)} submissions in {elapsed:.1f}s '
+          f'({len(submissions) / elapsed:.0f}/s, p50 {latencies[len(latencies) // 2]:.3f}ms, '
+          f'p95 {latencies[int(len(latencies) * 0.95)]:.3f}ms)')
+    print(f'Compared {stats["candidates"]} LSH candidates instead of {all_pairs} same-question pairs '
+          f'({all_pairs / max(stats["candidates"], 1):.0f}x fewer)')
+    print(f'Planted copies flagged: {found}/{len(planted)} ({100 * found / max(len(planted), 1):.1f}%)')
+    print(f'Pairs flagged in total: {flagged_pairs} ({flagged_pairs - found} beyond the planted copies)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Per-route latency against a large indexed store.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_store --submissions 100000
+
+Set ``DATA_BACKEND=sql`` (and optionally ``DATABASE_URL``) to measure the
+SQLAlchemy backend instead of the in-memory store.
+"""
+import argparse
+import logging
+import time
+
+from app import app, store
+from benchmarks.synthetic import populate
+
+
+def time_route(client, url, repeat):
+    """Return the mean latency of GET ``url`` in milliseconds"""
+    client.get(url)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--submissions', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    start = time.perf_counter()
+    student_ids, question_ids = populate(store, args.students, args.questions, args.submissions)
+    print(f'Loaded {store.count_submissions()} submissions in {time.perf_counter() - start:.2f}s')
+
+    student_id, question_id = student_ids[0], question_ids[0]
+    routes = [
+        f'/student/dashboard/{student_id}',
+        f'/student/view_questions/{student_id}',
+        f'/professor/view_submissions/{question_id}',
+        f'/collaboration/{student_id}',
+        '/collaboration/pair_session/1',
+        '/api/analytics_data',
+    ]
+    client = app.test_client()
+    client.post('/collaboration/pair_programming',
+                data={'student1_id': student_id, 'student2_id': student_ids[1], 'problem_title': 'Bench'})
+
+    for url in routes:
+        print(f'{url:45s} {time_route(client, url, args.repeat):8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Thundering herds and flooding clients on the polling endpoints.
+
+Loads a synthetic course, then:
+
+* releases ``--herd`` concurrent ``/api/analytics_data`` requests at once
+  (dashboards reloading together), with single-flight coalescing off and
+  on, and reports how many times the data was computed and the latency;
+* floods ``/api/get_pair_code`` from one client and reports how many
+  requests were served before the token bucket ran dry, and the latency
+  of served and rejected requests;
+* times the limiter's own cost per request (one bucket lookup).
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.bench_throttle --students 20000 --submissions 200000 --herd 32
+"""
+import argparse
+import itertools
+import logging
+import statistics
+import threading
+import time
+
+import app as app_module
+from benchmarks.synthetic import populate
+from throttle import LocalBackend
+
+# Every herd member is a new dashboard, with its own rate limit bucket
+clients = itertools.count()
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def herd(size, coalesce):
+    """``(computations, latencies in ms)`` of ``size`` simultaneous analytics reads"""
+    app_module.single_flight.enabled = coalesce
+    computed = app_module.single_flight.stats['computed']
+    calls = []
+    original = app_module.completion_data
+
+    def counted():
+        calls.append(1)
+        return original()
+
+    start = threading.Barrier(size)
+    latencies = []
+
+    def reader(n):
+        client = app_module.app.test_client()
+        start.wait()
+        began = time.perf_counter()
+        response = client.get(f'/api/analytics_data?client_id=herd-{n}')
+        latencies.append((time.perf_counter() - began) * 1000)
+        assert response.status_code == 200, response.status_code
+
+    # The view looks the function up in the module on every call
+    app_module.completion_data = counted
+    try:
+        threads = [threading.Thread(target=reader, args=(next(clients),)) for _ in range(size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        app_module.completion_data = original
+        app_module.single_flight.enabled = True
+    assert not coalesce or app_module.single_flight.stats['computed'] - computed == len(calls)
+    return len(calls), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=20_000)
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--submissions', type=int, default=200_000)
+    parser.add_argument('--herd', type=int, default=32, help='Simultaneous analytics requests')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--flood', type=int, default=2000, help='Requests sent by the flooding client')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    populate(app_module.store, args.students, args.questions, args.submissions, sessions=10)
+    print(f'{app_module.store.count_students()} students, {app_module.store.count_submissions()} submissions\n')
+
+    print(f'{"analytics herd of " + str(args.herd):<28}{"computed":>10}{"p50 ms":>10}{"p95 ms":>10}{"max ms":>10}')
+    for coalesce in (False, True):
+        computations, latencies = [], []
+        for _ in range(args.rounds):
+            count, samples = herd(args.herd, coalesce)
+            computations.append(count)
+            latencies += samples
+        name = 'single-flight' if coalesce else 'every request computes'
+        print(f'{name:<28}{statistics.mean(computations):>10.1f}{statistics.median(latencies):>10.1f}'
+              f'{percentile(latencies, 0.95):>10.1f}{max(latencies):>10.1f}')
+
+    client = app_module.app.test_client()
+    served, rejected = [], []
+    started = time.perf_counter()
+    for _ in range(args.flood):
+        began = time.perf_counter()
+        response = client.get('/api/get_pair_code/1?client_id=flood')
+        (served if response.status_code == 200 else rejected).append((time.perf_counter() - began) * 1000)
+        assert response.status_code in (200, 429), response.status_code
+    elapsed = time.perf_counter() - started
+    rule = app_module.rate_limiter.rules['get_pair_code']
+    print(f'\nflood of {args.flood} polls in {elapsed:.2f}s (limit {rule["rate"]}/s, burst {rule["burst"]}): '
+          f'{len(served)} served (p50 {statistics.median(served):.3f} ms), '
+          f'{len(rejected)} rejected with 429 (p50 {statistics.median(rejected):.3f} ms)')
+
+    backend = LocalBackend()
+    keys = [f'get_pair_code:127.0.0.1:client-{n}:{n % 500}' for n in range(10_000)]
+    started = time.perf_counter()
+    for _ in range(10):
+        for key in keys:
+            backend.take(key, 2, 10)
+    per_call = (time.perf_counter() - started) / (10 * len(keys)) * 1e6
+    print(f'\nbucket lookup: {per_call:.2f} us per request across {len(backend)} clients')
+
+    polls = []
+    for enabled in (False, True):
+        app_module.rate_limiter.enabled = enabled
+        samples = []
+        for n in range(2000):
+            began = time.perf_counter()
+            client.get(f'/api/get_pair_code/1?client_id=poll-{n}')
+            samples.append((time.perf_counter() - began) * 1e6)
+        polls.append(statistics.median(samples))
+    print(f'get_pair_code p50: {polls[0]:.0f} us unlimited, {polls[1]:.0f} us with the limiter')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Gunicorn settings used by ``benchmarks.suite`` for its real-server runs.
+
+The app is preloaded in the master and the synthetic dataset described by
+the ``BENCH_DATASET`` environment variable (JSON keyword arguments for
+``benchmarks.synthetic.generate``) is loaded there once, so every forked
+worker starts with the same records. Several workers run against a database
+only (``DATA_BACKEND=sql``), as they are served (see ``gunicorn.conf.py``).
+"""
+import json
+import os
+
+preload_app = True
+loglevel = 'warning'
+
+
+def on_starting(server):
+    # Runs in the master after the app has been preloaded
+    import app as app_module
+
+    if server.cfg.workers > 1 and app_module.app.config['DATA_BACKEND'] != 'sql':
+        raise RuntimeError('Workers share their data through a database: benchmark more than one '
+                           'with DATA_BACKEND=sql')
+    counts = json.loads(os.environ.get('BENCH_DATASET') or 'null')
+    if not counts:
+        return
+    from benchmarks.synthetic import generate
+
+    # A database is shared by all processes and is filled by the suite itself
+    if app_module.app.config['DATA_BACKEND'] != 'sql':
+        app_module.load_dataset(generate(app_module.store, **counts))
+
+
+def post_fork(server, worker):
+    # Pooled database connections must not be shared with the master
+    import app as app_module
+
+    engine = getattr(app_module.store, 'engine', None)
+    if engine is not None:
+        engine.dispose(close=False)
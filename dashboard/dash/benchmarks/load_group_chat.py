@@ -0,0 +1,110 @@
+"""Study group chat load test: message throughput and delivery latency.
+
+One group with hundreds of members, each holding an open stream, while a few
+senders post as fast as they can. A handful of members read slowly, so the
+run also shows sender backpressure and slow-consumer disconnects. Reports
+posts and deliveries per second, delivery latency percentiles, time senders
+spent waiting and how reconnecting with the ``since`` cursor recovers
+missed messages.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.load_group_chat --members 300 --messages 2000
+"""
+import argparse
+import json
+import threading
+import time
+
+from chat import ChatHub
+from store import DataStore
+
+
+def consume(hub, group_id, student_id, expected, latencies, delay, lock, received):
+    """Read one member's stream until every message has arrived, resuming when dropped"""
+    last_id, seen = 0, 0
+    while seen < expected:
+        frames = hub.stream(group_id, student_id, since=last_id)
+        for frame in frames:
+            if not frame.startswith('id:'):
+                continue
+            message = json.loads(frame.split('data: ', 1)[1])
+            last_id = message['id']
+            seen += 1
+            latency = (time.perf_counter() - float(message['content'])) * 1000
+            with lock:
+                latencies.append(latency)
+            if delay:
+                time.sleep(delay)
+            if seen >= expected:
+                break
+        frames.close()
+    received[student_id] = seen
+
+
+def percentile(samples, fraction):
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=300)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--senders', type=int, default=4)
+    parser.add_argument('--slow', type=int, default=3, help='Members that read slowly')
+    parser.add_argument('--slow-delay', type=float, default=0.002, help='Seconds a slow member spends per message')
+    parser.add_argument('--queue-size', type=int, default=256)
+    parser.add_argument('--send-timeout', type=float, default=0.05)
+    args = parser.parse_args()
+
+    store = DataStore()
+    store.load(students=[{'id': n, 'name': f'Student {n}', 'email': f's{n}@example.edu'}
+                         for n in range(1, args.members + 1)],
+               study_groups=[{'id': 1, 'name': 'Load test', 'description': '',
+                              'members': list(range(1, args.members + 1)),
+                              'created_by': 1, 'created_at': '2024-01-01 00:00:00', 'active': True}])
+    hub = ChatHub(store, queue_size=args.queue_size, send_timeout=args.send_timeout, keepalive=1)
+
+    per_sender = args.messages // args.senders
+    total = per_sender * args.senders
+    latencies, received, lock = [], {}, threading.Lock()
+    consumers = []
+    for student_id in range(1, args.members + 1):
+        delay = args.slow_delay if student_id <= args.slow else 0
+        thread = threading.Thread(target=consume, daemon=True,
+                                  args=(hub, 1, student_id, total, latencies, delay, lock, received))
+        thread.start()
+        consumers.append(thread)
+    while hub.metrics()['subscribers'] < args.members:
+        time.sleep(0.01)
+
+    def send(sender_id):
+        for _ in range(per_sender):
+            hub.post(1, sender_id, repr(time.perf_counter()))
+
+    start = time.perf_counter()
+    senders = [threading.Thread(target=send, args=(n,)) for n in range(1, args.senders + 1)]
+    for thread in senders:
+        thread.start()
+    for thread in senders:
+        thread.join()
+    posted = time.perf_counter() - start
+    for thread in consumers:
+        thread.join()
+    delivered = time.perf_counter() - start
+
+    stats = hub.metrics()
+    latencies.sort()
+    complete = sum(1 for count in received.values() if count >= total)
+    print(f'{stats["posts"]} messages to {args.members} members: posted in {posted:.2f}s '
+          f'({stats["posts"] / posted:.0f} msg/s), all delivered in {delivered:.2f}s '
+          f'({len(latencies) / delivered:.0f} deliveries/s)')
+    print(f'Delivery latency ms: p50 {percentile(latencies, 0.5):.1f}, p95 {percentile(latencies, 0.95):.1f}, '
+          f'p99 {percentile(latencies, 0.99):.1f}, max {latencies[-1]:.1f}')
+    print(f'Backpressure: senders waited {stats["sender_waits"]} times for {stats["sender_wait_ms"]:.0f}ms in total; '
+          f'{stats["disconnected"]} slow-consumer disconnects, {stats["store_reads"]} resumed from storage')
+    print(f'Members with the full history: {complete}/{args.members}')
+
+
+if __name__ == '__main__':
+    main()
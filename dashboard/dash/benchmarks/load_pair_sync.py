@@ -0,0 +1,478 @@
+"""Pair programming sync load test over HTTP: polling vs. server push.
+
+Starts gunicorn with the serving config (``gunicorn.conf.py``), opens
+``--sessions`` sessions with two clients each, and runs each mode for
+``--seconds`` against it over real sockets:
+
+* polling: every client POSTs its whole buffer every 2s and GETs every 3s
+* conditional polling: the same timers, but writes carry ``base_version``
+  and are only sent after a local edit, and GETs send ``If-None-Match``
+* push: every client opens the ``/api/pair_stream`` SSE stream and POSTs
+  single-splice deltas when it types; a client whose stream is refused
+  (every stream slot taken) falls back to conditional polling, as the
+  page does
+
+Clients make ``--edits-per-minute`` edits each, tagged so the partner can
+tell when one arrives. For every mode it reports the server's CPU time,
+bytes on the wire (headers included), response statuses, how many streams
+were opened or refused, edit delivery latency and the edits missing from
+the final buffer once every client has sent what it still held. Throughout,
+a probe loads ``/`` twice a second: if the streams held every request
+thread, it would time out.
+
+The clients run on one asyncio loop in this process, so thousands of open
+connections cost little here. Run from ``dashboard/dash``::
+
+    python -m benchmarks.load_pair_sync --sessions 500 --seconds 30
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+CLIENTS_PER_SESSION = 2
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Stats:
+    """Counters shared by every client of one run"""
+
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.statuses = Counter()
+        self.streams = Counter()
+        self.delivery_ms = []
+        self.probe_ms = []
+        self.probe_failures = 0
+
+
+class Connection:
+    """A minimal keep-alive HTTP/1.1 client connection"""
+
+    def __init__(self, port, stats):
+        self.port = port
+        self.stats = stats
+        self.reader = self.writer = None
+
+    async def _open(self):
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def _send(self, method, path, body, headers):
+        if self.writer is None:
+            await self._open()
+        lines = [f'{method} {path} HTTP/1.1', 'Host: 127.0.0.1', f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        data = ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+        self.writer.write(data)
+        await self.writer.drain()
+        self.stats.sent += len(data)
+
+    async def _head(self):
+        """Status and headers of the next response"""
+        status_line = await self.reader.readuntil(b'\r\n')
+        size, headers = len(status_line), {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            size += len(line)
+            if line == b'\r\n':
+                break
+            name, value = line.decode('latin-1').split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+        self.stats.received += size
+        return int(status_line.split()[1]), headers
+
+    async def _chunk(self):
+        """The next chunk of a chunked body; empty at its end"""
+        size_line = await self.reader.readuntil(b'\r\n')
+        size = int(size_line.split(b';')[0], 16)
+        data = await self.reader.readexactly(size + 2)
+        self.stats.received += len(size_line) + len(data)
+        return data[:-2]
+
+    async def _body(self, status, headers):
+        if 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+            self.stats.received += len(body)
+        elif headers.get('transfer-encoding') == 'chunked':
+            parts = []
+            while chunk := await self._chunk():
+                parts.append(chunk)
+            body = b''.join(parts)
+        else:
+            body = b''
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return body
+
+    async def request(self, method, path, json_body=None, headers=None):
+        """``(status, headers, body)``; reconnects once if the server closed an idle connection"""
+        body = json.dumps(json_body).encode() if json_body is not None else b''
+        headers = dict(headers or {})
+        if json_body is not None:
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            reused = self.writer is not None
+            try:
+                await self._send(method, path, body, headers)
+                status, response_headers = await self._head()
+                response = await self._body(status, response_headers)
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                if attempt == 2 or not reused:
+                    raise
+        self.stats.statuses[status] += 1
+        return status, response_headers, response
+
+    async def events(self, path):
+        """Open an SSE stream: ``(status, async iterator of (event, data))``"""
+        await self._send('GET', path, b'', {'Accept': 'text/event-stream'})
+        status, headers = await self._head()
+        self.stats.statuses[status] += 1
+        if status != 200:
+            await self._body(status, headers)
+            return status, None
+
+        async def frames():
+            buffer = b''
+            while chunk := await self._chunk():
+                buffer += chunk
+                while b'\n\n' in buffer:
+                    frame, buffer = buffer.split(b'\n\n', 1)
+                    fields = dict(line.split(': ', 1) for line in frame.decode().split('\n')
+                                  if ': ' in line and not line.startswith(':'))
+                    if 'event' in fields:
+                        yield fields['event'], json.loads(fields['data'])
+
+        return status, frames()
+
+
+class Session:
+    """One pair session: the edits each client is waiting for its partner to see"""
+
+    markers = itertools.count()
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.pending = {}
+
+    def new_edit(self, client):
+        marker = f'#m{next(self.markers)}\n'
+        self.pending[marker] = (client, time.perf_counter())
+        return marker
+
+    def seen(self, client, text, stats):
+        """Record the partner's edits found in ``text``"""
+        for marker, (sender, sent_at) in list(self.pending.items()):
+            if sender != client and marker in text:
+                stats.delivery_ms.append((time.perf_counter() - sent_at) * 1000)
+                del self.pending[marker]
+
+
+class Client:
+    """One browser tab on a pair session"""
+
+    def __init__(self, port, session, name, stats, rng, edit_probability):
+        self.session = session
+        self.name = name
+        self.stats = stats
+        self.rng = rng
+        self.edit_probability = edit_probability
+        self.http = Connection(port, stats)
+        self.port = port
+        self.code = ''
+        self.version = 0
+        self.etag = None
+        # Local edits the server has not accepted yet
+        self.unsent = []
+        self.streamed = False
+
+    def edit(self):
+        if self.rng.random() < self.edit_probability:
+            marker = self.session.new_edit(self.name)
+            self.code = marker + self.code
+            self.unsent.append(marker)
+
+    def adopt(self, snapshot):
+        """Take the server's buffer, replaying edits it has not accepted yet"""
+        self.code, self.version = snapshot['code'], snapshot['version']
+        self.session.seen(self.name, self.code, self.stats)
+        for marker in self.unsent:
+            self.code = marker + self.code
+
+    async def poll(self, conditional):
+        headers = {'If-None-Match': self.etag} if conditional and self.etag else {}
+        status, response_headers, body = await self.http.request(
+            'GET', f'/api/get_pair_code/{self.session.id}?client_id={self.name}', headers=headers)
+        if status == 200:
+            self.etag = response_headers.get('etag')
+            self.adopt(json.loads(body))
+
+    async def save(self, conditional):
+        if conditional and not self.unsent:
+            return
+        body = {'session_id': self.session.id, 'code': self.code, 'client_id': self.name}
+        if conditional:
+            body['base_version'] = self.version
+        status, _, response = await self.http.request('POST', '/api/update_pair_code', body)
+        payload = json.loads(response) if response else {}
+        if status == 200:
+            self.unsent, self.version = [], payload['version']
+        elif status == 409:
+            self.adopt(payload)
+
+    async def run_polling(self, seconds, conditional):
+        await asyncio.sleep(self.rng.random())
+        for tick in range(seconds):
+            started = time.perf_counter()
+            self.edit()
+            if tick % 2 == 0:
+                await self.save(conditional)
+            if tick % 3 == 0:
+                await self.poll(conditional)
+            await asyncio.sleep(max(0.0, 1 - (time.perf_counter() - started)))
+
+    async def run_push(self, seconds):
+        stream = Connection(self.port, self.stats)
+        status, frames = await stream.events(f'/api/pair_stream/{self.session.id}?client_id={self.name}')
+        if frames is None:
+            # No stream slot free: poll instead, as the page does
+            self.stats.streams['refused'] += 1
+            stream.close()
+            await self.run_polling(seconds, conditional=True)
+            return
+        self.stats.streams['opened'] += 1
+        self.streamed = True
+        reader = asyncio.ensure_future(self.read(frames))
+        try:
+            await asyncio.sleep(self.rng.random())
+            for _ in range(seconds):
+                started = time.perf_counter()
+                self.edit()
+                if self.unsent:
+                    await self.send_delta(self.unsent[0])
+                await asyncio.sleep(max(0.0, 1 - (time.perf_counter() - started)))
+        finally:
+            reader.cancel()
+            stream.close()
+
+    async def settle(self, conditional):
+        """Send what is still unsent, then read the buffer a last time"""
+        for _ in range(3):
+            if not self.unsent:
+                break
+            if self.streamed:
+                await self.send_delta(self.unsent[0])
+            else:
+                await self.save(conditional)
+        await self.poll(conditional=False)
+
+    async def read(self, frames):
+        async for event, data in frames:
+            if event == 'snapshot':
+                self.code, self.version = data['code'], data['version']
+                self.session.seen(self.name, data['code'], self.stats)
+            elif event == 'delta' and data['version'] > self.version:
+                self.code = self.code[:data['start']] + data['text'] + self.code[data['end']:]
+                self.version = data['version']
+                self.session.seen(self.name, data['text'], self.stats)
+
+    async def send_delta(self, marker):
+        body = {'session_id': self.session.id, 'client_id': self.name, 'base_version': self.version,
+                'start': 0, 'end': 0, 'text': marker}
+        status, _, response = await self.http.request('POST', '/api/pair_delta', body)
+        payload = json.loads(response)
+        if status == 200:
+            self.unsent.remove(marker)
+            # The stream may already have moved past this version
+            self.version = max(self.version, payload['version'])
+        elif status == 409:
+            self.unsent.remove(marker)
+            self.code, self.version = payload['code'], payload['version']
+            self.unsent.append(marker)
+
+
+async def probe(port, stats, stop):
+    """Time ``GET /`` on a fresh connection twice a second until ``stop`` is set"""
+    while not stop.is_set():
+        connection = Connection(port, Stats())
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(connection.request('GET', '/'), timeout=5)
+            stats.probe_ms.append((time.perf_counter() - started) * 1000)
+        except (asyncio.TimeoutError, OSError):
+            stats.probe_failures += 1
+        finally:
+            connection.close()
+        await asyncio.sleep(0.5)
+
+
+async def run_mode(mode, port, sessions, args):
+    stats = Stats()
+    rng = random.Random(1)
+    clients = [Client(port, session, f'c{session.id}-{n}', stats, random.Random(rng.random()),
+                      args.edits_per_minute / 60)
+               for session in sessions for n in range(CLIENTS_PER_SESSION)]
+    for session in sessions:
+        session.pending.clear()
+    # Every client starts from the current buffer, as when a page loads
+    for client in clients:
+        await client.poll(conditional=True)
+    stats.sent = stats.received = 0
+    stats.statuses.clear()
+
+    stop = asyncio.Event()
+    prober = asyncio.ensure_future(probe(port, stats, stop))
+    cpu = server_cpu(args.server_pid)
+    if mode == 'push':
+        runs = [client.run_push(args.seconds) for client in clients]
+    else:
+        runs = [client.run_polling(args.seconds, conditional=mode == 'etag') for client in clients]
+    results = await asyncio.gather(*runs, return_exceptions=True)
+    cpu = server_cpu(args.server_pid) - cpu
+    stop.set()
+    await prober
+    timed = len(stats.delivery_ms)
+    # Edits still queued are sent, and every client reads the final buffer:
+    # the edits missing from it were overwritten
+    for client in clients:
+        await client.settle(conditional=mode != 'polling')
+    for client in clients:
+        await client.poll(conditional=False)
+    del stats.delivery_ms[timed:]
+    for client in clients:
+        client.http.close()
+    errors = [result for result in results if isinstance(result, Exception)]
+    lost = sum(len(session.pending) for session in sessions)
+    return stats, cpu, lost, errors
+
+
+def server_cpu(pid):
+    """CPU seconds used so far by the server and its workers"""
+    total = 0
+    for process in [pid] + child_pids(pid):
+        try:
+            with open(f'/proc/{process}/stat') as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        total += int(fields[11]) + int(fields[12])
+    return total / os.sysconf('SC_CLK_TCK')
+
+
+def child_pids(parent):
+    children = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as stat:
+                    # The command name may contain spaces, so split after it
+                    fields = stat.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == parent:
+                children.append(int(entry))
+    return children
+
+
+def start_server(args):
+    with socket.socket() as free:
+        free.bind(('127.0.0.1', 0))
+        port = free.getsockname()[1]
+    env = dict(os.environ, BIND=f'127.0.0.1:{port}', WEB_THREADS=str(args.threads), LOG_LEVEL='WARNING')
+    if args.max_streams:
+        env['SSE_MAX_STREAMS'] = str(args.max_streams)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'main:app'],
+                              cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'gunicorn exited with status {server.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                if child_pids(server.pid):
+                    return server, port
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise SystemExit('gunicorn did not start in time')
+
+
+async def create_sessions(port, count, code_size):
+    connection = Connection(port, Stats())
+    base = ('def solve(nums, target):\n    seen = {}\n' * (code_size // 40 + 1))[:code_size]
+    sessions = []
+    for _ in range(count):
+        form = urlencode({'student1_id': 1, 'student2_id': 2, 'problem_title': 'Load test'}).encode()
+        await connection._send('POST', '/collaboration/pair_programming', form,
+                               {'Content-Type': 'application/x-www-form-urlencoded'})
+        status, headers = await connection._head()
+        await connection._body(status, headers)
+        session = Session(int(re.search(r'/(\d+)$', headers['location']).group(1)))
+        await connection.request('POST', '/api/update_pair_code', {'session_id': session.id, 'code': base})
+        sessions.append(session)
+    connection.close()
+    return sessions
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--seconds', type=int, default=30, help='Seconds each mode runs')
+    parser.add_argument('--code-size', type=int, default=2000)
+    parser.add_argument('--edits-per-minute', type=float, default=12)
+    parser.add_argument('--threads', type=int, default=32, help='WEB_THREADS of the server')
+    parser.add_argument('--max-streams', type=int, help='SSE_MAX_STREAMS of the server (default: its own)')
+    parser.add_argument('--modes', default='polling,etag,push',
+                        help='Comma-separated modes; push runs last, as closed streams free their slots late')
+    args = parser.parse_args()
+
+    server, port = start_server(args)
+    args.server_pid = server.pid
+    try:
+        loop = asyncio.new_event_loop()
+        sessions = loop.run_until_complete(create_sessions(port, args.sessions, args.code_size))
+        print(f'{args.sessions} sessions x {CLIENTS_PER_SESSION} clients over HTTP, {args.seconds}s per mode, '
+              f'gunicorn with {args.threads} threads\n')
+        print(f'{"mode":<8}{"streams":>14}{"cpu s":>8}{"sent MB":>9}{"recv MB":>9}{"edit p50":>10}'
+              f'{"edit p95":>10}{"lost":>6}{"GET / p50":>11}{"max":>8}{"timeouts":>10}  statuses')
+        for mode in args.modes.split(','):
+            stats, cpu, lost, errors = loop.run_until_complete(run_mode(mode, port, sessions, args))
+            streams = f'{stats.streams["opened"]}/{stats.streams["refused"]} refused' if mode == 'push' else '-'
+            statuses = ' '.join(f'{code}:{count}' for code, count in sorted(stats.statuses.items()))
+            print(f'{mode:<8}{streams:>14}{cpu:>8.2f}{stats.sent / 1e6:>9.2f}{stats.received / 1e6:>9.2f}'
+                  f'{percentile(stats.delivery_ms, 0.5):>10.0f}{percentile(stats.delivery_ms, 0.95):>10.0f}'
+                  f'{lost:>6}{statistics.median(stats.probe_ms) if stats.probe_ms else float("nan"):>11.1f}'
+                  f'{max(stats.probe_ms, default=float("nan")):>8.1f}{stats.probe_failures:>10}  {statuses}')
+            for error in errors[:3]:
+                print(f'  client error: {error!r}')
+        loop.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
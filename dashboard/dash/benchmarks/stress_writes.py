@@ -0,0 +1,222 @@
+"""Concurrent write stress test: no lost writes, duplicate ids or double submits.
+
+Many threads (and, for the sql backend, several processes, like gunicorn
+workers) race on the same records at once:
+
+* every thread submits answers for the same (student, question) pairs, so
+  each pair must be stored exactly once;
+* every thread replaces the feedback of every submission, so each must end
+  with exactly one feedback record and consistent aggregates;
+* every thread adds the same students to the same groups;
+* every thread creates its own groups and posts to shared group chats, so
+  nothing may be lost and every id must be unique.
+
+The interpreter's switch interval is lowered so threads interleave inside
+store methods. The run ends with a list of every invariant that was broken,
+or "no lost writes".
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.stress_writes --threads 16
+    python -m benchmarks.stress_writes --backend sql --processes 4 --threads 8
+"""
+import argparse
+import multiprocessing
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from store import DataStore
+
+TIMESTAMP = '2025-08-07 12:00:00'
+
+
+def open_store(args):
+    if args.backend == 'sql':
+        from sql_store import SqlStore
+        return SqlStore(args.database_url)
+    return DataStore()
+
+
+def setup(store, args):
+    """Students, questions and the groups everyone joins and posts to"""
+    store.load(
+        students=[{'id': n, 'name': f'Student {n}', 'email': f'stress{n}@university.edu'}
+                  for n in range(1, args.students + 1)],
+        questions=[{'id': n, 'type': 'coding', 'title': f'Question {n}', 'description': 'Stress test',
+                    'difficulty': 'Easy', 'created_at': TIMESTAMP, 'assigned_to': 'all'}
+                   for n in range(1, args.questions + 1)],
+        study_groups=[{'id': n, 'name': f'Shared group {n}', 'description': 'Stress test', 'members': [1],
+                       'created_by': 1, 'created_at': TIMESTAMP, 'active': True}
+                      for n in range(1, args.shared_groups + 1)],
+    )
+
+
+def hammer(store, worker, args, results):
+    """One thread's share of the racing writes; appends its tallies to ``results``"""
+    rng = random.Random(worker)
+    tally = {'submitted': 0, 'joined': 0, 'group_ids': [], 'message_ids': []}
+    pairs = [(s, q) for s in range(1, args.students + 1) for q in range(1, args.questions + 1)]
+    rng.shuffle(pairs)
+    for student_id, question_id in pairs:
+        tally['submitted'] += store.add_submission_if_new({
+            'student_id': student_id, 'question_id': question_id,
+            'answer': f'answer from worker {worker}', 'submitted_at': TIMESTAMP})
+
+    for student_id, question_id in pairs:
+        submission = store.find_submission(student_id, question_id)
+        store.set_feedback({'submission_id': submission['id'], 'student_id': student_id,
+                            'question_id': question_id, 'feedback': f'worker {worker}',
+                            'score': rng.randint(0, 100), 'created_at': TIMESTAMP})
+
+    joins = [(g, s) for g in range(1, args.shared_groups + 1) for s in range(2, args.students + 1)]
+    rng.shuffle(joins)
+    for group_id, student_id in joins:
+        tally['joined'] += store.add_group_member(group_id, student_id)
+
+    for n in range(args.groups):
+        group = store.add_group({'name': f'Group {worker}-{n}', 'description': 'Stress test',
+                                 'members': [1], 'created_by': 1, 'created_at': TIMESTAMP, 'active': True})
+        tally['group_ids'].append(group['id'])
+    for n in range(args.messages):
+        message = store.add_message({'group_id': n % args.shared_groups + 1, 'student_id': 1,
+                                     'content': f'{worker}:{n}', 'created_at': TIMESTAMP})
+        tally['message_ids'].append(message['id'])
+    results.append(tally)
+
+
+def run_threads(store, args, first_worker, results):
+    threads = [threading.Thread(target=hammer, args=(store, first_worker + n, args, results))
+               for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_process(args, process, queue):
+    """A worker process with its own store connection, like a gunicorn worker"""
+    sys.setswitchinterval(args.switch_interval)
+    results = []
+    run_threads(open_store(args), args, process * args.threads, results)
+    queue.put(results)
+
+
+def check(store, args, tallies, writers):
+    """Every broken invariant, as human-readable strings"""
+    problems = []
+    pairs = args.students * args.questions
+
+    submitted = sum(t['submitted'] for t in tallies)
+    if submitted != pairs:
+        problems.append(f'{submitted} submissions accepted for {pairs} distinct pairs')
+    stored = store.count_submissions()
+    if stored != pairs:
+        problems.append(f'{stored} submissions stored for {pairs} distinct pairs')
+    for question_id in range(1, args.questions + 1):
+        rows = store.submissions_for_question(question_id)
+        per_student = Counter(row['student_id'] for row in rows)
+        duplicated = [s for s, count in per_student.items() if count > 1]
+        if duplicated:
+            problems.append(f'question {question_id}: students {duplicated[:5]} have several submissions')
+        for row in rows:
+            if store.feedback_for_submission(row['id']) is None:
+                problems.append(f'submission {row["id"]} lost its feedback')
+    if store.count_feedback() != pairs:
+        problems.append(f'{store.count_feedback()} feedback records for {pairs} submissions')
+    mismatches = store.verify_aggregates()
+    if mismatches:
+        problems.append(f'{len(mismatches)} analytics aggregates drifted, e.g. {mismatches[0]}')
+
+    expected_members = list(range(1, args.students + 1))
+    joined = sum(t['joined'] for t in tallies)
+    if joined != args.shared_groups * (args.students - 1):
+        problems.append(f'{joined} successful joins for {args.shared_groups * (args.students - 1)} new memberships')
+    for group_id in range(1, args.shared_groups + 1):
+        members = store.get_group(group_id)['members']
+        if sorted(members) != expected_members:
+            problems.append(f'group {group_id} has {len(members)} members ({len(set(members))} distinct), '
+                            f'expected {len(expected_members)}')
+
+    group_ids = [group_id for t in tallies for group_id in t['group_ids']]
+    if len(set(group_ids)) != writers * args.groups:
+        problems.append(f'{len(set(group_ids))} distinct group ids for {writers * args.groups} created groups')
+    if len(store.all_groups()) != args.shared_groups + writers * args.groups:
+        problems.append(f'{len(store.all_groups())} groups stored, expected {args.shared_groups + writers * args.groups}')
+
+    message_ids = [message_id for t in tallies for message_id in t['message_ids']]
+    if len(set(message_ids)) != writers * args.messages:
+        problems.append(f'{len(set(message_ids))} distinct message ids for {writers * args.messages} posts')
+    stored_messages = 0
+    for group_id in range(1, args.shared_groups + 1):
+        ids = [message['id'] for message in store.messages_for_group(group_id)]
+        stored_messages += len(ids)
+        if ids != sorted(set(ids)):
+            problems.append(f'group {group_id} chat history is out of order or has repeats')
+    if stored_messages != writers * args.messages:
+        problems.append(f'{stored_messages} messages stored for {writers * args.messages} posts')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=('memory', 'sql'), default='memory')
+    parser.add_argument('--database-url', default='sqlite:///stress_writes.db',
+                        help='Database for the sql backend; its tables are emptied first')
+    parser.add_argument('--processes', type=int, default=1, help='Worker processes (sql backend only)')
+    parser.add_argument('--threads', type=int, default=16, help='Threads per process')
+    parser.add_argument('--students', type=int, default=100)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--shared-groups', type=int, default=4)
+    parser.add_argument('--groups', type=int, default=200, help='Groups created by each thread')
+    parser.add_argument('--messages', type=int, default=1000, help='Messages posted by each thread')
+    parser.add_argument('--switch-interval', type=float, default=1e-6,
+                        help='Seconds between forced thread switches (smaller interleaves more)')
+    args = parser.parse_args()
+    if args.processes > 1 and args.backend != 'sql':
+        parser.error('several processes cannot share the in-memory store; use --backend sql')
+
+    if args.backend == 'sql':
+        from sql_store import metadata
+        store = open_store(args)
+        metadata.drop_all(store.engine)
+        metadata.create_all(store.engine)
+    store = open_store(args)
+    setup(store, args)
+
+    sys.setswitchinterval(args.switch_interval)
+    start = time.perf_counter()
+    tallies = []
+    if args.processes > 1:
+        if hasattr(store, 'engine'):
+            store.engine.dispose()
+        queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=run_process, args=(args, n, queue))
+                     for n in range(args.processes)]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            tallies.extend(queue.get())
+        for process in processes:
+            process.join()
+    else:
+        run_threads(store, args, 0, tallies)
+    elapsed = time.perf_counter() - start
+    sys.setswitchinterval(0.005)
+
+    writers = args.processes * args.threads
+    pairs = args.students * args.questions
+    writes = writers * (2 * pairs + args.shared_groups * (args.students - 1) + args.groups + args.messages)
+    print(f'{args.backend} backend, {args.processes} process(es) x {args.threads} threads: '
+          f'{writes} racing writes in {elapsed:.2f}s ({writes / elapsed:.0f}/s)')
+    problems = check(store, args, tallies, writers)
+    for problem in problems:
+        print(f'  LOST WRITE: {problem}')
+    print('no lost writes' if not problems else f'{len(problems)} invariants broken')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
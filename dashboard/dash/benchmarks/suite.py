@@ -0,0 +1,538 @@
+"""Route-by-route benchmark suite with JSON output for regression tracking.
+
+Loads a synthetic dataset of the requested scale and drives every route of
+the app, reads and writes alike, with concurrent clients: in-process through
+the Flask test client, against a real gunicorn server over HTTP, or both.
+For each route it records p50/p95/p99 latency, throughput, status codes and
+peak resident memory, prints a table and optionally writes everything to a
+JSON file. ``--compare`` diffs a run against an earlier JSON file and flags
+routes whose p95 regressed by more than ``--threshold``.
+
+Run from ``dashboard/dash``::
+
+    python -m benchmarks.suite --scale small --target both --output baseline.json
+    python -m benchmarks.suite --scale small --target both --compare baseline.json
+
+The gunicorn target preloads the same dataset in the server's master
+process (see ``benchmarks/gunicorn_conf.py``), so record ids match on both
+sides. The two Server-Sent Events streams are long-lived and are covered by
+their own load tests instead (``load_pair_sync`` and ``load_group_chat``).
+"""
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+import app as app_module
+from benchmarks.synthetic import generate
+
+SCALES = {
+    'small': dict(students=200, questions=20, submissions=2_000, groups=20, shares=200, sessions=50, messages=2_000),
+    'medium': dict(students=2_000, questions=100, submissions=50_000, groups=200, shares=2_000, sessions=500,
+                   messages=20_000),
+    'large': dict(students=10_000, questions=200, submissions=500_000, groups=1_000, shares=10_000, sessions=2_000,
+                  messages=100_000),
+}
+
+# Endpoints that are not request/response and have dedicated load tests
+SKIPPED = {
+    'pair_stream': 'SSE stream, see benchmarks.load_pair_sync',
+    'group_stream': 'SSE stream, see benchmarks.load_group_chat',
+}
+
+# Form handlers redirect back to the page they were posted from
+REFERER = '/professor/dashboard'
+
+
+class Route:
+    """One endpoint and how to build its n-th request"""
+
+    def __init__(self, endpoint, method, url, form=None, json_body=None, expect=()):
+        self.endpoint = endpoint
+        self.method = method
+        self.url = url
+        # Form fields, or a (content type, text) pair sent as the raw body
+        self.form = form
+        self.json_body = json_body
+        # Status codes >= 400 that are a normal answer for this route
+        self.expect = set(expect)
+
+    @property
+    def name(self):
+        return f'{self.method} {self.endpoint}'
+
+    def request(self, n):
+        """``(url, form, json)`` of the n-th request"""
+        url = self.url(n) if callable(self.url) else self.url
+        form = self.form(n) if self.form else None
+        body = self.json_body(n) if self.json_body else None
+        return url, form, body
+
+
+def record_ids(dataset):
+    """The ids ``route_plan`` needs, copied before the app starts mutating records"""
+    return {
+        'students': [s['id'] for s in dataset['students']],
+        'questions': [q['id'] for q in dataset['questions']],
+        'submissions': [s['id'] for s in dataset['submissions']],
+        'answered': {(s['student_id'], s['question_id']) for s in dataset['submissions']},
+        'groups': [(g['id'], tuple(g['members'])) for g in dataset['study_groups']],
+        'sessions': [s['id'] for s in dataset['pair_sessions']],
+    }
+
+
+def free_pairs(ids):
+    """(student, question) pairs with no submission yet, for submit_answer"""
+    for question_id in ids['questions']:
+        for student_id in ids['students']:
+            if (student_id, question_id) not in ids['answered']:
+                yield student_id, question_id
+
+
+def route_plan(ids):
+    """Requests for every endpoint, spread over the synthetic records"""
+    students, questions, submissions = ids['students'], ids['questions'], ids['submissions']
+    groups, sessions = ids['groups'], ids['sessions']
+    words = ['question', 'synthetic', 'sort*', 'snippet', 'study group', 'message']
+    stylesheet = app_module.assets.manifest['css/style.css']['file']
+
+    def pick(records):
+        return lambda n: records[n % len(records)]
+
+    student, question, submission, session = pick(students), pick(questions), pick(submissions), pick(sessions)
+    group = pick(groups)
+    pairs, pairs_lock = free_pairs(ids), threading.Lock()
+
+    def submit_form(n):
+        with pairs_lock:
+            student_id, question_id = next(pairs, (students[0], questions[0]))
+        return {'student_id': student_id, 'question_id': question_id, 'answer': f'benchmark answer {n}'}
+
+    def roster_upload(n):
+        return 'text/csv', f'name,email\nBenchmark {n},benchmark{n}-{os.getpid()}@university.edu\n'
+
+    def group_member(n):
+        group_id, members = group(n)
+        return group_id, members[n % len(members)]
+
+    def message_body(n):
+        group_id, member = group_member(n)
+        return {'student_id': member, 'content': f'benchmark message {n}'}
+
+    routes = [
+        Route('index', 'GET', '/'),
+        Route('professor', 'GET', '/professor'),
+        Route('professor_portal', 'GET', '/professor/portal'),
+        Route('student', 'GET', '/student'),
+        Route('professor_dashboard', 'GET', '/professor/dashboard'),
+        Route('assign_question', 'GET', '/professor/assign_question'),
+        Route('assign_question', 'POST', '/professor/assign_question',
+              form=lambda n: {'type': 'coding', 'title': f'Benchmark question {n}',
+                              'description': 'Added by the benchmark suite', 'difficulty': 'Medium'}),
+        Route('view_questions', 'GET', '/professor/view_questions'),
+        Route('view_submissions', 'GET', lambda n: f'/professor/view_submissions/{question(n)}'),
+        Route('provide_feedback', 'POST', '/professor/provide_feedback',
+              form=lambda n: {'submission_id': submission(n), 'feedback': 'Benchmark feedback',
+                              'score': n % 101}),
+        # Synthetic questions have no test cases, so this is the rejection path
+        Route('grade_question', 'POST', lambda n: f'/professor/grade_question/{question(n)}'),
+        Route('student_dashboard', 'GET', lambda n: f'/student/dashboard/{student(n)}'),
+        Route('view_student_questions', 'GET', lambda n: f'/student/view_questions/{student(n)}'),
+        Route('submit_answer', 'POST', '/student/submit_answer', form=submit_form),
+        Route('analytics_data', 'GET', '/api/analytics_data'),
+        Route('question_analytics', 'GET', '/api/analytics/questions'),
+        Route('score_analytics', 'GET', lambda n: f'/api/analytics/scores?question_id={question(n)}'),
+        Route('trend_analytics', 'GET', lambda n: f'/api/analytics/trends?student_id={student(n)}'),
+        Route('group_analytics', 'GET', '/api/analytics/cohorts'),
+        Route('collaboration', 'GET', '/collaboration'),
+        Route('student_collaboration', 'GET', lambda n: f'/collaboration/{student(n)}'),
+        Route('group_chat', 'GET', lambda n: '/collaboration/group/{}/chat/{}'.format(*group_member(n))),
+        Route('create_study_group', 'POST', '/collaboration/create_group',
+              form=lambda n: {'group_name': f'Benchmark group {n}', 'description': 'Added by the benchmark suite',
+                              'creator_id': student(n)}),
+        Route('join_study_group', 'POST', '/collaboration/join_group',
+              form=lambda n: {'group_id': group(n)[0], 'student_id': student(n)}),
+        Route('pair_programming', 'GET', '/collaboration/pair_programming'),
+        Route('pair_programming', 'POST', '/collaboration/pair_programming',
+              form=lambda n: {'student1_id': student(n), 'student2_id': student(n + 1),
+                              'problem_title': f'Benchmark problem {n}'}),
+        Route('pair_session', 'GET', lambda n: f'/collaboration/pair_session/{session(n)}'),
+        Route('share_code', 'POST', '/collaboration/share_code',
+              form=lambda n: {'student_id': student(n), 'title': f'Benchmark snippet {n}',
+                              'code': f'def benchmark_{n}(items):\n    return sorted(items)\n',
+                              'description': 'Added by the benchmark suite'}),
+        Route('code_gallery', 'GET', '/collaboration/code_gallery'),
+        Route('bulk_data', 'GET', '/professor/bulk'),
+        Route('import_data', 'POST', '/api/import/students', form=roster_upload),
+        Route('export_data', 'GET', lambda n: f'/api/export/grades?format=csv&question_id={question(n)}'),
+        Route('questions_api', 'GET', '/api/questions'),
+        Route('question_submissions_api', 'GET', lambda n: f'/api/questions/{question(n)}/submissions'),
+        Route('student_submissions_api', 'GET', lambda n: f'/api/students/{student(n)}/submissions'),
+        Route('question_status_api', 'GET', lambda n: f'/api/students/{student(n)}/question_status'),
+        Route('code_shares_api', 'GET', '/api/code_shares'),
+        Route('search_api', 'GET', lambda n: '/api/search?' + urlencode({'q': words[n % len(words)]})),
+        Route('submission_similarity', 'GET', lambda n: f'/api/submissions/{submission(n)}/similar'),
+        Route('similarity_stats', 'GET', '/api/similarity_stats'),
+        Route('recommendations_api', 'GET', lambda n: f'/api/students/{student(n)}/recommendations'),
+        Route('recommender_stats', 'GET', '/api/recommender_stats'),
+        # Edits every session in turn, so request n saw version n // sessions. It
+        # runs before update_pair_code bumps the versions; a stale base (e.g.
+        # another gunicorn worker's copy of the session) gets 409 and rebases
+        Route('pair_delta', 'POST', '/api/pair_delta', expect={409},
+              json_body=lambda n: {'session_id': session(n), 'base_version': n // len(sessions),
+                                   'start': 0, 'end': 0, 'text': '#'}),
+        Route('update_pair_code', 'POST', '/api/update_pair_code',
+              json_body=lambda n: {'session_id': session(n), 'code': f'# revision {n}\n'}),
+        Route('get_pair_code', 'GET', lambda n: f'/api/get_pair_code/{session(n)}'),
+        Route('pair_sync_stats', 'GET', '/api/pair_sync_stats'),
+        Route('pair_history', 'GET', lambda n: f'/api/pair_history/{session(n)}?limit=50'),
+        Route('pair_code_at', 'GET', lambda n: f'/api/pair_history/{session(n)}/0'),
+        # Version 0 drops out of the history once a session has had 1000 edits
+        Route('pair_revert', 'POST', '/api/pair_revert', expect={410},
+              json_body=lambda n: {'session_id': session(n), 'version': 0}),
+        Route('blob_stats', 'GET', '/api/blob_stats'),
+        Route('group_messages', 'GET', lambda n: f'/api/groups/{group(n)[0]}/messages?limit=50'),
+        Route('group_messages', 'POST', lambda n: f'/api/groups/{group(n)[0]}/messages',
+              json_body=message_body),
+        Route('chat_stats', 'GET', '/api/chat_stats'),
+        Route('metrics', 'GET', '/metrics', expect={404}),
+        Route('render_cache_stats', 'GET', '/api/render_cache_stats'),
+        Route('throttle_stats', 'GET', '/api/throttle_stats'),
+        Route('job_status', 'GET', '/api/jobs/1', expect={404}),
+        Route('job_metrics', 'GET', '/api/jobs'),
+        Route('static', 'GET', '/static/css/style.css'),
+        Route('assets', 'GET', f'/assets/{stylesheet}'),
+        Route('asset_stats', 'GET', '/api/asset_stats'),
+        Route('scheduler_stats', 'GET', '/api/scheduler_stats'),
+        Route('change_feed_stats', 'GET', '/api/change_feed_stats'),
+    ]
+    covered = {route.endpoint for route in routes} | set(SKIPPED)
+    missing = sorted({rule.endpoint for rule in app_module.app.url_map.iter_rules()} - covered)
+    if missing:
+        print(f'warning: no benchmark requests for {", ".join(missing)}', file=sys.stderr)
+    return routes
+
+
+def percentile(samples, fraction):
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def summarize(route, latencies, statuses, errors, elapsed, rss):
+    latencies.sort()
+    summary = {
+        'endpoint': route.endpoint,
+        'method': route.method,
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+    if latencies:
+        summary.update({
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'p50_ms': round(percentile(latencies, 0.5), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'max_ms': round(latencies[-1], 3),
+        })
+    summary.update(rss)
+    return summary
+
+
+def run_route(route, requests, concurrency, send):
+    """Issue ``requests`` requests to ``route`` from ``concurrency`` threads.
+
+    ``send(url, method, form, json)`` is called on the worker thread and must
+    return the status code. Returns latencies in ms, status counts, the number
+    of failed requests and the wall time.
+    """
+    counter = itertools.count()
+    latencies, statuses, lock = [], {}, threading.Lock()
+    failures = [0]
+
+    def work():
+        local, local_statuses, local_failures = [], {}, 0
+        while (n := next(counter)) < requests:
+            url, form, body = route.request(n)
+            start = time.perf_counter()
+            try:
+                status = send(url, route.method, form, body)
+            except Exception:
+                status = 'exception'
+            local.append((time.perf_counter() - start) * 1000)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+            if status == 'exception' or (status >= 400 and status not in route.expect):
+                local_failures += 1
+        with lock:
+            latencies.extend(local)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+            failures[0] += local_failures
+
+    threads = [threading.Thread(target=work) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, failures[0], time.perf_counter() - start
+
+
+def process_memory(pid='self'):
+    """Current and peak resident set size of one process in MB"""
+    memory = {}
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                memory[line[:5]] = int(line.split()[1]) / 1024
+    return memory.get('VmRSS', 0.0), memory.get('VmHWM', 0.0)
+
+
+def child_pids(parent):
+    children = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as stat:
+                    # The command name may contain spaces, so split after it
+                    fields = stat.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == parent:
+                children.append(int(entry))
+    return children
+
+
+def run_client(routes, args):
+    """Every route in-process through Flask's test client"""
+    local = threading.local()
+
+    def send(url, method, form, body):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app_module.app.test_client()
+        content_type = None
+        if isinstance(form, tuple):
+            content_type, form = form
+        response = client.open(url, method=method, data=form, json=body, content_type=content_type,
+                               headers={'Referer': REFERER})
+        response.close()
+        return response.status_code
+
+    results = {}
+    for route in routes:
+        latencies, statuses, errors, elapsed = run_route(route, args.requests, args.concurrency, send)
+        rss, peak = process_memory()
+        results[route.name] = summarize(route, latencies, statuses, errors, elapsed,
+                                        {'rss_mb': round(rss, 1), 'peak_rss_mb': round(peak, 1)})
+        report(route.name, results[route.name])
+    return {'routes': results, 'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_gunicorn(counts, args):
+    port = free_port()
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, BENCH_DATASET=json.dumps(counts), PYTHONPATH=here, RATE_LIMITS_ENABLED='0',
+               ASSET_PIPELINE='1')
+    command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(here, 'benchmarks', 'gunicorn_conf.py'),
+               '--workers', str(args.workers), '--threads', str(args.threads),
+               '--bind', f'127.0.0.1:{port}', 'app:app']
+    server = subprocess.Popen(command, cwd=here, env=env, stdout=subprocess.DEVNULL,
+                              stderr=open(args.server_log, 'w') if args.server_log else subprocess.DEVNULL)
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'gunicorn exited with status {server.returncode}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/')
+            if connection.getresponse().status == 200 and len(child_pids(server.pid)) >= args.workers:
+                connection.close()
+                return server, port
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit('gunicorn did not start in time')
+
+
+def run_gunicorn(routes, counts, args):
+    """Every route over HTTP against a gunicorn server holding the same dataset"""
+    started = time.perf_counter()
+    server, port = start_gunicorn(counts, args)
+    startup = time.perf_counter() - started
+    local = threading.local()
+
+    def send(url, method, form, body):
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        headers = {'Referer': REFERER}
+        payload = None
+        if isinstance(form, tuple):
+            headers['Content-Type'], payload = form
+        elif form is not None:
+            payload = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            connection.request(method, url, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect once if the server closed an idle keep-alive connection
+            connection.close()
+            connection.request(method, url, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        return response.status
+
+    def server_memory():
+        pids = [server.pid] + child_pids(server.pid)
+        usage = [process_memory(pid) for pid in pids]
+        return {'rss_mb': round(sum(rss for rss, _ in usage), 1),
+                'peak_rss_mb': round(sum(peak for _, peak in usage), 1),
+                'processes': len(pids)}
+
+    results = {}
+    try:
+        for route in routes:
+            latencies, statuses, errors, elapsed = run_route(route, args.requests, args.concurrency, send)
+            results[route.name] = summarize(route, latencies, statuses, errors, elapsed, server_memory())
+            report(route.name, results[route.name])
+        memory = server_memory()
+    finally:
+        server.terminate()
+        server.wait()
+    return {'routes': results, 'startup_seconds': round(startup, 2), 'peak_rss_mb': memory['peak_rss_mb'],
+            'workers': args.workers, 'threads': args.threads}
+
+
+def report(name, result):
+    print(f'  {name:<36} p50 {result.get("p50_ms", 0):8.2f}  p95 {result.get("p95_ms", 0):8.2f}  '
+          f'p99 {result.get("p99_ms", 0):8.2f} ms  {result["throughput_rps"] or 0:8.0f} req/s  '
+          f'{result["peak_rss_mb"]:7.1f} MB peak  {result["errors"]} errors', flush=True)
+
+
+def compare(current, baseline_path, threshold):
+    """Print p95 changes against an earlier run; returns the number of regressions"""
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = 0
+    print(f'\nComparison with {baseline_path} (p95, regression above {threshold:.0%}):')
+    for target, result in current['targets'].items():
+        before = baseline.get('targets', {}).get(target, {}).get('routes', {})
+        for name, route in result['routes'].items():
+            old = before.get(name, {}).get('p95_ms')
+            new = route.get('p95_ms')
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = 'REGRESSION' if change > threshold else ''
+            regressions += bool(flag)
+            if flag or abs(change) > threshold:
+                print(f'  {target:<9} {name:<36} {old:8.2f} -> {new:8.2f} ms ({change:+.0%}) {flag}')
+    print(f'  {regressions} regressions')
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    for name in ('students', 'questions', 'submissions', 'groups', 'shares', 'sessions', 'messages'):
+        parser.add_argument(f'--{name}', type=int, help=f'Override the number of {name} of the scale')
+    parser.add_argument('--feedback-ratio', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--target', choices=('client', 'gunicorn', 'both'), default='client')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Gunicorn worker processes (more than one needs DATA_BACKEND=sql)')
+    parser.add_argument('--threads', type=int, default=16, help='Threads per gunicorn worker')
+    parser.add_argument('--startup-timeout', type=float, default=300)
+    parser.add_argument('--server-log', help='File for the gunicorn error log')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Earlier JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p95 increase counted as a regression')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    # Every request comes from one address: the limits would turn most of them into 429s
+    app_module.rate_limiter.enabled = False
+    # Pages link the production asset build, as in the gunicorn server
+    app_module.assets.enabled = True
+    app_module.assets.load()
+    counts = dict(SCALES[args.scale], feedback_ratio=args.feedback_ratio, seed=args.seed)
+    for name in SCALES[args.scale]:
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+
+    # Ids continue after the demo records, exactly as in the gunicorn master
+    started = time.perf_counter()
+    dataset = generate(app_module.store, **counts)
+    ids = record_ids(dataset)
+    app_module.load_dataset(dataset)
+    load_seconds = time.perf_counter() - started
+    print(f'Loaded the {args.scale} dataset in {load_seconds:.1f}s: '
+          + ', '.join(f'{len(records)} {table}' for table, records in dataset.items()))
+
+    results = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'backend': app_module.app.config['DATA_BACKEND'],
+            'metrics_enabled': app_module.request_metrics.enabled,
+            'scale': args.scale,
+            'dataset': counts,
+            'requests_per_route': args.requests,
+            'concurrency': args.concurrency,
+            'skipped': SKIPPED,
+        },
+        'targets': {},
+    }
+    if args.target in ('client', 'both'):
+        print(f'\nFlask test client, {args.concurrency} concurrent clients:')
+        results['targets']['client'] = dict(run_client(route_plan(ids), args),
+                                            load_seconds=round(load_seconds, 2))
+    if args.target in ('gunicorn', 'both'):
+        print(f'\ngunicorn, {args.workers} workers x {args.threads} threads, {args.concurrency} concurrent clients:')
+        results['targets']['gunicorn'] = run_gunicorn(route_plan(ids), counts, args)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f'\nWrote {args.output}')
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare, args.threshold) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Synthetic dataset generation for benchmarks and the ``flask seed`` command"""
+import random
+
+QUESTION_TYPES = ('coding', 'interview')
+DIFFICULTIES = ('Easy', 'Medium', 'Hard')
+TIMESTAMP = '2025-08-07 12:00:00'
+
+
+def generate(store, students=1000, questions=50, submissions=100_000, feedback_ratio=0.5, seed=42,
+             groups=0, group_size=8, shares=0, sessions=0, messages=0):
+    """Build synthetic records with ids continuing after what ``store`` already holds"""
+    rng = random.Random(seed)
+
+    first_student = store.next_id('students')
+    student_records = [{'id': first_student + i, 'name': f'Student {i}', 'email': f'student{first_student + i}@university.edu'}
+                       for i in range(students)]
+    first_question = store.next_id('questions')
+    question_records = [{
+        'id': first_question + i,
+        'type': rng.choice(QUESTION_TYPES),
+        'title': f'Question {i}',
+        'description': f'Synthetic question number {i}',
+        'difficulty': rng.choice(DIFFICULTIES),
+        'created_at': TIMESTAMP,
+        'assigned_to': 'all',
+    } for i in range(questions)]
+
+    student_ids = [record['id'] for record in student_records]
+    question_ids = [record['id'] for record in question_records]
+
+    # Each (student, question) pair may only be submitted once
+    pairs = set()
+    limit = min(submissions, len(student_ids) * len(question_ids))
+    while len(pairs) < limit:
+        pairs.add((rng.choice(student_ids), rng.choice(question_ids)))
+
+    submission_records = []
+    feedback_records = []
+    submission_id = store.next_id('submissions')
+    feedback_id = store.next_id('feedback')
+    for student_id, question_id in sorted(pairs):
+        submission_records.append({
+            'id': submission_id,
+            'student_id': student_id,
+            'question_id': question_id,
+            'answer': f'answer from {student_id} to {question_id}',
+            'submitted_at': TIMESTAMP,
+        })
+        if rng.random() < feedback_ratio:
+            feedback_records.append({
+                'id': feedback_id,
+                'submission_id': submission_id,
+                'student_id': student_id,
+                'question_id': question_id,
+                'feedback': 'Synthetic feedback',
+                'score': rng.randint(0, 100),
+                'created_at': TIMESTAMP,
+            })
+            feedback_id += 1
+        submission_id += 1
+
+    first_group = store.next_id('study_groups')
+    group_records = []
+    for i in range(groups):
+        members = rng.sample(student_ids, min(group_size, len(student_ids)))
+        group_records.append({
+            'id': first_group + i,
+            'name': f'Study Group {i}',
+            'description': f'Synthetic study group number {i}',
+            'members': members,
+            'created_by': members[0],
+            'created_at': TIMESTAMP,
+            'active': True,
+        })
+
+    first_share = store.next_id('code_shares')
+    share_records = [{
+        'id': first_share + i,
+        'student_id': rng.choice(student_ids),
+        'title': f'Shared snippet {i}',
+        'code': f'def solve_{i}(items):\n    return sorted(items)[:{i % 10 + 1}]\n',
+        'description': f'Synthetic code share number {i}',
+        'help_needed': rng.random() < 0.3,
+        'created_at': TIMESTAMP,
+        'comments': [],
+    } for i in range(shares)]
+
+    first_session = store.next_id('pair_sessions')
+    session_records = []
+    for i in range(sessions):
+        student1_id, student2_id = rng.sample(student_ids, 2)
+        session_records.append({
+            'id': first_session + i,
+            'student1_id': student1_id,
+            'student2_id': student2_id,
+            'problem_title': f'Pair problem {i}',
+            'code': f'# Session {i}\ndef solve(nums):\n    return nums\n',
+            'started_at': TIMESTAMP,
+            'active': True,
+        })
+
+    first_message = store.next_id('group_messages')
+    message_records = []
+    for i in range(messages if group_records else 0):
+        group = rng.choice(group_records)
+        message_records.append({
+            'id': first_message + i,
+            'group_id': group['id'],
+            'student_id': rng.choice(group['members']),
+            'content': f'Synthetic message {i}',
+            'created_at': TIMESTAMP,
+        })
+
+    return {
+        'students': student_records,
+        'questions': question_records,
+        'submissions': submission_records,
+        'feedback': feedback_records,
+        'study_groups': group_records,
+        'code_shares': share_records,
+        'pair_sessions': session_records,
+        'group_messages': message_records,
+    }
+
+
+def populate(store, students=1000, questions=50, submissions=100_000, feedback_ratio=0.5, seed=42, **extra):
+    """Load a synthetic dataset into ``store``; returns the new student and question ids.
+
+    ``extra`` takes the optional ``groups``, ``group_size``, ``shares``,
+    ``sessions`` and ``messages`` counts of ``generate``.
+    """
+    tables = generate(store, students, questions, submissions, feedback_ratio, seed, **extra)
+    store.load(**tables)
+    return ([record['id'] for record in tables['students']],
+            [record['id'] for record in tables['questions']])
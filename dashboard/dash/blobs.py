@@ -0,0 +1,103 @@
+"""Content-addressed storage for code and answer text.
+
+Code shares, pair session buffers and submitted answers are often large
+and often identical (starter code, forks of a share, checkpoints of a
+session that has not changed). ``BlobStore`` keeps each distinct text once,
+keyed by a hash of its content and reference-counted, and zlib-compresses
+texts above a size threshold. Records hold the key; the text is rebuilt
+(decompressed) only when a record is read.
+"""
+import hashlib
+import sys
+import threading
+import zlib
+
+# Texts shorter than this (in UTF-8 bytes) are kept as plain strings, where
+# zlib's header would eat most of the savings
+COMPRESS_THRESHOLD = 256
+
+
+def content_key(text):
+    """16-byte digest identifying ``text``"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class BlobStore:
+    """Deduplicated, optionally compressed texts with reference counts"""
+
+    def __init__(self, threshold=COMPRESS_THRESHOLD, level=6):
+        # None disables compression (texts are still deduplicated)
+        self.threshold = threshold
+        self.level = level
+        # key -> [key, text or zlib bytes, references]; the stored key object
+        # is handed out for every reference so they all share it
+        self._blobs = {}
+        self._lock = threading.Lock()
+        self.stats = {'puts': 0, 'deduplicated': 0, 'compressed': 0, 'reads': 0, 'decompressed': 0}
+
+    def _pack(self, text):
+        if self.threshold is not None:
+            raw = text.encode('utf-8')
+            if len(raw) >= self.threshold:
+                packed = zlib.compress(raw, self.level)
+                if len(packed) < len(raw):
+                    self.stats['compressed'] += 1
+                    return packed
+        return text
+
+    def put(self, text):
+        """Store ``text`` (or add a reference to an identical one); returns its key"""
+        key = content_key(text)
+        with self._lock:
+            self.stats['puts'] += 1
+            entry = self._blobs.get(key)
+            if entry is not None:
+                entry[2] += 1
+                self.stats['deduplicated'] += 1
+                return entry[0]
+            self._blobs[key] = [key, self._pack(text), 1]
+            return key
+
+    def get(self, key):
+        """The text stored under ``key``"""
+        value = self._blobs[key][1]
+        self.stats['reads'] += 1
+        if isinstance(value, bytes):
+            self.stats['decompressed'] += 1
+            return zlib.decompress(value).decode('utf-8')
+        return value
+
+    def release(self, key):
+        """Drop one reference; the text is deleted with its last reference"""
+        with self._lock:
+            entry = self._blobs[key]
+            entry[2] -= 1
+            if not entry[2]:
+                del self._blobs[key]
+
+    def __contains__(self, key):
+        return key in self._blobs
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def metrics(self):
+        """Counts, and the text size as stored vs. uncompressed and with every reference a copy"""
+        with self._lock:
+            entries = [(key, value, refs) for key, value, refs in self._blobs.values()]
+            stats = dict(self.stats)
+        stored = unique = referenced = objects = 0
+        for key, value, refs in entries:
+            if isinstance(value, bytes):
+                size = len(zlib.decompress(value))
+                stored += len(value)
+            else:
+                size = len(value.encode('utf-8'))
+                stored += size
+            unique += size
+            referenced += size * refs
+            objects += sys.getsizeof(key) + sys.getsizeof(value)
+        stats.update(blobs=len(entries), references=sum(refs for _, _, refs in entries),
+                     stored_bytes=stored, unique_bytes=unique, referenced_bytes=referenced,
+                     object_bytes=objects)
+        return stats
@@ -0,0 +1,389 @@
+"""Streaming bulk import and export of rosters, question banks and grades.
+
+Files are CSV (with a header row) or JSON Lines. Both directions go one row
+at a time through generators: imports parse and validate rows as they are
+read and insert them in fixed-size batches, and exports serialise rows into
+chunks as the store streams them out. Memory use depends on the batch and
+chunk sizes, not on the file size.
+
+Every rejected row is reported with its line number and the reasons, and
+the other rows of its batch are still imported.
+"""
+import csv
+import functools
+import io
+import json
+import re
+from datetime import datetime
+
+FORMATS = ('csv', 'jsonl')
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+# Rejected rows listed in a report; further ones are only counted
+MAX_ERRORS = 1000
+
+QUESTION_TYPES = ('coding', 'interview')
+DIFFICULTIES = ('Easy', 'Medium', 'Hard')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Plain ASCII local parts (dot-atoms); anything else gets the full email_validator check
+SIMPLE_LOCAL_PART = re.compile(r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*")
+
+# Cells a spreadsheet would run as a formula; exported with a leading ' (CWE-1236)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Import kind -> store table
+IMPORTS = {'students': 'students', 'questions': 'questions'}
+
+# Export kind -> columns, in file order
+EXPORTS = {
+    'students': ('id', 'name', 'email'),
+    'questions': ('id', 'type', 'title', 'description', 'difficulty', 'created_at', 'assigned_to', 'tests',
+                  'opens_at', 'closes_at'),
+    'grades': ('submission_id', 'student_id', 'student_name', 'student_email', 'question_id',
+               'question_title', 'submitted_at', 'score', 'feedback', 'graded_at'),
+}
+
+
+def guess_format(filename=None, mimetype=None, default='csv'):
+    """File format from an explicit name's extension or a MIME type"""
+    if filename and '.' in filename:
+        extension = filename.rsplit('.', 1)[1].lower()
+        if extension in ('jsonl', 'ndjson'):
+            return 'jsonl'
+        if extension == 'csv':
+            return 'csv'
+    if mimetype in ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines'):
+        return 'jsonl'
+    if mimetype == 'text/csv':
+        return 'csv'
+    return default
+
+
+class _RawReader(io.RawIOBase):
+    """File object over a stream that only has ``read`` (a server's ``wsgi.input``)"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def text_stream(binary):
+    """Decode an uploaded byte stream lazily (a UTF-8 BOM from spreadsheets is dropped)"""
+    if not isinstance(binary, io.IOBase):
+        # gunicorn hands a chunked request body over as its own reader
+        binary = io.BufferedReader(_RawReader(binary))
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+# Reading
+
+def read_rows(lines, fmt):
+    """Yield ``(line_number, row)`` for each record; ``row`` is None for an unparseable line"""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Cells beyond the header end up under the None key
+            row.pop(None, None)
+            yield reader.line_num, {field: _csv_value(value) for field, value in row.items()}
+        return
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def _text(row, field, errors, required=True, max_length=None):
+    value = row.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        errors.append(f'{field} is required')
+    elif max_length and len(value) > max_length:
+        errors.append(f'{field} is longer than {max_length} characters')
+    return value
+
+
+@functools.lru_cache(maxsize=1024)
+def _email_domain(domain):
+    from email_validator import validate_email
+
+    # The IDNA checks on the domain are most of the cost of validating an
+    # address, and a roster only has a handful of distinct domains
+    return validate_email(f'postmaster@{domain}', check_deliverability=False).domain
+
+
+def normalize_email(email):
+    """Validated, lower-cased address; raises ``EmailNotValidError`` (a ``ValueError``)"""
+    # Imported on first use, as email_validator adds a tenth to the app's startup
+    from email_validator import validate_email
+
+    local, _, domain = email.rpartition('@')
+    if len(local) <= 64 and SIMPLE_LOCAL_PART.fullmatch(local):
+        return f'{local}@{_email_domain(domain)}'.lower()
+    return validate_email(email, check_deliverability=False).normalized.lower()
+
+
+def validate_student(row, now):
+    """Roster row -> ``(student, errors)``"""
+    errors = []
+    name = _text(row, 'name', errors, max_length=120)
+    email = _text(row, 'email', errors, max_length=255)
+    if email:
+        try:
+            email = normalize_email(email)
+        except ValueError as exc:
+            errors.append(f'email is invalid: {exc}')
+    return {'name': name, 'email': email}, errors
+
+
+def _tests(value, errors):
+    """Auto-grader spec from a JSON object (or a JSON string, as in CSV cells)"""
+    if value in (None, ''):
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            errors.append('tests is not valid JSON')
+            return None
+    cases = value.get('cases') if isinstance(value, dict) else None
+    if not (isinstance(value, dict) and isinstance(value.get('function'), str) and isinstance(cases, list)
+            and cases and all(isinstance(case, dict) and isinstance(case.get('args'), list) and 'expected' in case
+                              for case in cases)):
+        errors.append('tests must be {"function": name, "cases": [{"args": [...], "expected": ...}, ...]}')
+        return None
+    return value
+
+
+def validate_question(row, now):
+    """Question bank row -> ``(question, errors)``"""
+    errors = []
+    question_type = _text(row, 'type', errors).lower()
+    if question_type and question_type not in QUESTION_TYPES:
+        errors.append(f'type must be one of {", ".join(QUESTION_TYPES)}')
+    title = _text(row, 'title', errors, max_length=255)
+    description = _text(row, 'description', errors)
+    difficulty = _text(row, 'difficulty', errors).capitalize()
+    if difficulty and difficulty not in DIFFICULTIES:
+        errors.append(f'difficulty must be one of {", ".join(DIFFICULTIES)}')
+    created_at = _text(row, 'created_at', errors, required=False) or now
+    try:
+        datetime.strptime(created_at, TIMESTAMP_FORMAT)
+    except ValueError:
+        errors.append('created_at must look like 2025-08-07 12:00:00')
+    question = {
+        'type': question_type,
+        'title': title,
+        'description': description,
+        'difficulty': difficulty,
+        'created_at': created_at,
+        'assigned_to': _text(row, 'assigned_to', errors, required=False, max_length=20) or 'all',
+    }
+    tests = _tests(row.get('tests'), errors)
+    if tests is not None:
+        if question_type != 'coding':
+            errors.append('tests are only supported for coding questions')
+        question['tests'] = tests
+    # Optional submission window
+    for field in ('opens_at', 'closes_at'):
+        value = _text(row, field, errors, required=False)
+        if not value:
+            continue
+        try:
+            datetime.strptime(value, TIMESTAMP_FORMAT)
+        except ValueError:
+            errors.append(f'{field} must look like 2025-08-07 12:00:00')
+        else:
+            question[field] = value
+    if question.get('opens_at') and question.get('closes_at') and question['closes_at'] <= question['opens_at']:
+        errors.append('closes_at must be after opens_at')
+    return question, errors
+
+
+VALIDATORS = {'students': validate_student, 'questions': validate_question}
+
+
+# Importing
+
+class ImportReport:
+    """Counts of imported and rejected rows, with the reasons for the first ``max_errors`` rejections"""
+
+    def __init__(self, kind, max_errors=MAX_ERRORS):
+        self.kind = kind
+        self.max_errors = max_errors
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, reasons):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': reasons})
+
+    def to_dict(self):
+        return {'kind': self.kind, 'imported': self.imported, 'rejected': self.rejected,
+                'errors': self.errors, 'errors_truncated': self.rejected > len(self.errors)}
+
+    def summary(self):
+        text = f'Imported {self.imported} {self.kind}'
+        if self.rejected:
+            first = '; '.join(f'line {error["line"]}: {", ".join(error["errors"])}' for error in self.errors[:3])
+            text += f', rejected {self.rejected} rows ({first})'
+        return text
+
+
+def import_rows(store, kind, rows, batch_size=BATCH_SIZE, on_batch=None):
+    """Validate ``(line_number, row)`` pairs and insert the valid ones in batches.
+
+    ``on_batch(kind, records)`` is called after each batch is stored, so
+    callers can index the new records. Returns an ``ImportReport``.
+    """
+    table, validate = IMPORTS[kind], VALIDATORS[kind]
+    report = ImportReport(kind)
+    now = datetime.now().strftime(TIMESTAMP_FORMAT)
+    batch = []
+    # Emails in the current batch; those of earlier batches are already in the store
+    batch_emails = set()
+
+    def flush():
+        if kind == 'students':
+            taken = store.registered_emails([record['email'] for _, record in batch])
+            for line, record in batch:
+                if record['email'] in taken:
+                    report.reject(line, [f'email {record["email"]} is already registered'])
+            batch[:] = [(line, record) for line, record in batch if record['email'] not in taken]
+        # Anything still clashing was written by a concurrent import
+        skipped = {id(record) for record in store.add_many(table, [record for _, record in batch])}
+        stored = []
+        for line, record in batch:
+            if id(record) in skipped:
+                report.reject(line, ['conflicts with a record added meanwhile'])
+            else:
+                stored.append(record)
+        report.imported += len(stored)
+        if on_batch and stored:
+            on_batch(kind, stored)
+        batch.clear()
+        batch_emails.clear()
+
+    for line, row in rows:
+        if row is None:
+            report.reject(line, ['not a valid record'])
+            continue
+        record, errors = validate(row, now)
+        if kind == 'students' and not errors:
+            if record['email'] in batch_emails:
+                errors.append(f'email {record["email"]} appears earlier in the file')
+            batch_emails.add(record['email'])
+        if errors:
+            report.reject(line, errors)
+            continue
+        batch.append((line, record))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return report
+
+
+# Exporting
+
+def _grade_row(row):
+    feedback = row['feedback']
+    return {
+        'submission_id': row['id'],
+        'student_id': row['student_id'],
+        'student_name': row['student_name'],
+        'student_email': row['student_email'],
+        'question_id': row['question_id'],
+        'question_title': row['question_title'],
+        'submitted_at': row['submitted_at'],
+        'score': feedback['score'] if feedback else None,
+        'feedback': feedback['feedback'] if feedback else None,
+        'graded_at': feedback['created_at'] if feedback else None,
+    }
+
+
+def _project(records, fields, transform=None):
+    """Yield each record cut down to ``fields``, closing the store's cursor when done"""
+    try:
+        for record in records:
+            if transform:
+                record = transform(record)
+            yield {field: record.get(field) for field in fields}
+    finally:
+        close = getattr(records, 'close', None)
+        if close:
+            close()
+
+
+def export_rows(store, kind, question_id=None, answers=False):
+    """``(columns, rows)`` for an export; ``rows`` streams from the store"""
+    fields = EXPORTS[kind]
+    if kind == 'students':
+        return fields, _project(store.iter_students(), fields)
+    if kind == 'questions':
+        return fields, _project(store.iter_questions(), fields)
+    transform = _grade_row
+    if answers:
+        fields += ('answer',)
+        transform = lambda row: dict(_grade_row(row), answer=row['answer'])
+    return fields, _project(store.iter_grades(question_id), fields, transform)
+
+
+def _is_escaped_formula(text):
+    return text.lstrip("'").startswith(FORMULA_PREFIXES)
+
+
+def _csv_value(cell):
+    """Undo the escaping of ``_csv_cell``, so exports import back unchanged"""
+    if isinstance(cell, str) and cell.startswith("'") and _is_escaped_formula(cell):
+        return cell[1:]
+    return cell
+
+
+def _csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    # Quoted so a spreadsheet shows it as text instead of evaluating it
+    if isinstance(value, str) and _is_escaped_formula(value):
+        return "'" + value
+    return value
+
+
+def write_rows(fields, rows, fmt, chunk_size=CHUNK_SIZE):
+    """Serialise rows and yield the output in chunks of about ``chunk_size`` characters"""
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        write = lambda row: writer.writerow([_csv_cell(row[field]) for field in fields])
+    else:
+        write = lambda row: buffer.write(json.dumps(row) + '\n')
+    try:
+        for row in rows:
+            write(row)
+            if buffer.tell() >= chunk_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        # Release the store's cursor if the client went away mid-export
+        close = getattr(rows, 'close', None)
+        if close:
+            close()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,181 @@
+"""Change feed keeping the in-memory state of several processes in step.
+
+Each process builds search and similarity indexes, cohort analytics, partner
+recommendations, chat rings and pair channels from the store, and updates
+them as its own requests write. With several gunicorn workers (or a
+``flask import`` running beside the server) the others must hear about those
+writes too. After changing its own state a process publishes a change (a
+kind and JSON arguments) to a table in the shared database; a thread in
+every other process polls the table and calls the handler registered for the
+kind, which applies the same change there from the store.
+
+Handlers see each change once, in id order. Processes skip their own changes,
+and those of the process they were forked from (a preloaded gunicorn master),
+which they already hold. Ids are handed out before the inserts commit, so a
+change may become visible after a higher id: every poll looks again at the
+changes of the last ``settle`` seconds. Changes are kept for ``retention``
+seconds; a process that fell further behind has missed some and resyncs
+instead, rebuilding its state from the store.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeFeed:
+    """Publishes this process's changes and applies other processes' changes"""
+
+    def __init__(self, store, enabled=True, interval=0.5, settle=2.0, retention=3600, batch=1000):
+        self.store = store
+        self.enabled = enabled
+        self.interval = interval
+        self.settle = settle
+        self.retention = retention
+        self.batch = batch
+        self._handlers = {}
+        self._rebuild = None
+        # Changes of these origins are already applied here: this process's and
+        # its ancestors' (they were made before the fork)
+        self._origins = set()
+        self._pid = None
+        self._origin = None
+        # Every change up to ``_floor`` is applied; ``_seen`` holds those above it
+        self._floor = store.last_change_id() if enabled else 0
+        self._seen = set()
+        # One poll at a time; ``_lock`` guards the counters and origins only, so
+        # publishing never waits for a handler
+        self._poll_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._stopping = threading.Event()
+        self._counters = {'published': 0, 'applied': 0, 'failed': 0, 'resyncs': 0, 'polls': 0}
+
+    def register(self, kind):
+        """Decorator registering the handler applying changes of ``kind``"""
+        def decorator(func):
+            self._handlers[kind] = func
+            return func
+        return decorator
+
+    def on_resync(self, func):
+        """Decorator registering the function that rebuilds this process's state from the store"""
+        self._rebuild = func
+        return func
+
+    @property
+    def origin(self):
+        """This process's id on the changes it publishes"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._origin = uuid.uuid4().hex
+                    self._origins.add(self._origin)
+                    self._pid = os.getpid()
+        return self._origin
+
+    def publish(self, kind, *args):
+        """Tell the other processes to apply ``kind``'s handler to ``args``"""
+        if not self.enabled:
+            return
+        if kind not in self._handlers:
+            raise KeyError(f'No handler registered for change {kind!r}')
+        self.store.append_change(self.origin, kind, list(args))
+        with self._lock:
+            self._counters['published'] += 1
+
+    def poll(self):
+        """Apply the changes other processes published since the last poll; returns how many"""
+        with self._poll_lock:
+            rows = self.store.changes_after(self._floor, limit=self.batch)
+            # The oldest change kept is past the next one expected: some were pruned unseen
+            if rows and rows[0]['id'] > self._floor + 1 and self.store.first_change_id() > self._floor + 1:
+                self._resync()
+                return 0
+            applied = failed = 0
+            for row in rows:
+                if row['id'] in self._seen:
+                    continue
+                self._seen.add(row['id'])
+                if row['origin'] in self._origins:
+                    continue
+                try:
+                    self._handlers[row['kind']](*row['payload'])
+                except Exception:
+                    logger.exception('Change %s (%s) failed', row['id'], row['kind'])
+                    failed += 1
+                applied += 1
+            # Every id below a change published ``settle`` seconds ago has committed;
+            # a full batch moves on regardless, or a burst would be read forever
+            settled = [row['id'] for row in rows if row['created_at'] <= time.time() - self.settle]
+            if len(rows) == self.batch:
+                settled.append(rows[-1]['id'])
+            if settled:
+                self._floor = max(settled)
+                self._seen = {change_id for change_id in self._seen if change_id > self._floor}
+        with self._lock:
+            self._counters['polls'] += 1
+            self._counters['applied'] += applied
+            self._counters['failed'] += failed
+        return applied
+
+    def _resync(self):
+        """Skip to the newest change and rebuild from the store; caller holds the poll lock"""
+        logger.warning('Missed changes older than %ss, rebuilding from the store', self.retention)
+        self._floor = self.store.last_change_id()
+        self._seen = set()
+        with self._lock:
+            self._counters['resyncs'] += 1
+        if self._rebuild is not None:
+            self._rebuild()
+
+    def start(self):
+        """Catch up, then start the polling thread, unless it already runs in this process"""
+        if not self.enabled:
+            return
+        with self._start_lock:
+            # A thread started before a fork is not alive in the child
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            # Caught up before the first request is served, so it sees every earlier write
+            self.poll()
+            self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+            self._thread.start()
+            self._thread_pid = os.getpid()
+
+    def ensure_started(self):
+        """Start polling once per process; afterwards a lock-free no-op"""
+        if self._thread_pid != os.getpid():
+            self.start()
+
+    def shutdown(self, wait=True):
+        self._stopping.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+        self._thread = None
+        self._thread_pid = None
+
+    def _run(self):
+        pruned = time.monotonic()
+        while not self._stopping.wait(self.interval):
+            try:
+                self.poll()
+                if time.monotonic() - pruned > 60:
+                    self.store.prune_changes(time.time() - self.retention)
+                    pruned = time.monotonic()
+            except Exception:
+                logger.exception('Polling the change feed failed')
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['floor'] = self._floor
+        stats['enabled'] = self.enabled
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        return stats
@@ -0,0 +1,239 @@
+"""Study group chat with server push.
+
+Every group keeps its most recent messages in a bounded ring buffer; all
+messages are written through to the store, so a reader whose ``since`` cursor
+is older than the ring is served from storage instead. Members receive new
+messages over Server-Sent Events: each message is encoded once and the same
+frame is queued for every subscriber. When a subscriber's queue is full the
+sender waits for it (up to ``send_timeout``), and a consumer that still has
+not caught up is disconnected to resume later from its cursor. Messages
+another process posted are handed to ``receive`` and pushed the same way.
+"""
+import json
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from itertools import count
+
+
+def message_event(message):
+    """Encode one message as an SSE frame whose id is the resume cursor"""
+    return f'id: {message["id"]}\nevent: message\ndata: {json.dumps(message)}\n\n'
+
+
+class GroupChannel:
+    """Recent history and subscriber queues for one study group"""
+
+    def __init__(self, recent, history, floor):
+        self.history = deque(recent, maxlen=history)
+        # Id of the newest message that is only in the store, not the ring
+        self.floor = floor
+        self.last_id = recent[-1]['id'] if recent else floor
+        self.subscribers = {}
+        # Serialises senders in the group so messages reach every queue in id order
+        self.send_lock = threading.Lock()
+
+
+class ChatHub:
+    """Posts, history reads and push delivery for study group chats"""
+
+    def __init__(self, store, history=200, queue_size=256, send_timeout=2, keepalive=15):
+        self.store = store
+        self.history = history
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.keepalive = keepalive
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._subscriber_ids = count(1)
+        self.stats = {'posts': 0, 'deliveries': 0, 'sender_waits': 0, 'sender_wait_ms': 0.0,
+                      'disconnected': 0, 'ring_reads': 0, 'store_reads': 0}
+
+    def channel(self, group_id):
+        """Return the channel for a group, loading recent history on first use"""
+        with self._lock:
+            channel = self._channels.get(group_id)
+            if channel is None:
+                if self.store.get_group(group_id) is None:
+                    return None
+                stored = self.store.messages_for_group(group_id)
+                recent = stored[-self.history:]
+                floor = stored[-len(recent) - 1]['id'] if len(stored) > len(recent) else 0
+                channel = self._channels[group_id] = GroupChannel(recent, self.history, floor)
+            return channel
+
+    def post(self, group_id, student_id, content):
+        """Store a message and fan it out; blocks while slow subscribers catch up"""
+        channel = self.channel(group_id)
+        if channel is None:
+            raise KeyError(group_id)
+        with channel.send_lock:
+            message = self.store.add_message({
+                'group_id': group_id,
+                'student_id': student_id,
+                'content': content,
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+            frame = message_event(message)
+            with self._lock:
+                if len(channel.history) == channel.history.maxlen:
+                    channel.floor = channel.history[0]['id']
+                channel.history.append(message)
+                channel.last_id = message['id']
+                subscribers = list(channel.subscribers.items())
+            delivered, waited = self._fan_out(channel, subscribers, frame)
+        with self._lock:
+            self.stats['posts'] += 1
+            self.stats['deliveries'] += delivered
+            self.stats['sender_wait_ms'] += waited * 1000
+        return message
+
+    def receive(self, message):
+        """Add a message another process stored to the ring, if loaded, and push it"""
+        with self._lock:
+            channel = self._channels.get(message['group_id'])
+        if channel is None:
+            return
+        with channel.send_lock:
+            with self._lock:
+                history = channel.history
+                if message['id'] <= channel.floor or any(m['id'] == message['id'] for m in history):
+                    return
+                # Usually the newest, but posts from several processes can land out of order
+                position = len(history)
+                while position and history[position - 1]['id'] > message['id']:
+                    position -= 1
+                if len(history) == history.maxlen:
+                    if not position:
+                        # Older than the whole ring: readers that far back go to the store
+                        channel.floor = message['id']
+                    else:
+                        channel.floor = history.popleft()['id']
+                        position -= 1
+                if message['id'] > channel.floor:
+                    history.insert(position, message)
+                channel.last_id = max(channel.last_id, message['id'])
+                subscribers = list(channel.subscribers.items())
+            delivered, waited = self._fan_out(channel, subscribers, message_event(message))
+        with self._lock:
+            self.stats['deliveries'] += delivered
+            self.stats['sender_wait_ms'] += waited * 1000
+
+    def reload(self):
+        """Forget the rings of groups nobody is watching, and catch the others up from the store"""
+        with self._lock:
+            watched = {}
+            for group_id, channel in list(self._channels.items()):
+                if channel.subscribers:
+                    watched[group_id] = channel.last_id
+                else:
+                    del self._channels[group_id]
+        for group_id, last_id in watched.items():
+            for message in self.store.messages_for_group(group_id, after=last_id):
+                self.receive(message)
+
+    def _fan_out(self, channel, subscribers, frame):
+        """Queue ``frame`` for every subscriber; returns (delivered, seconds waited)"""
+        delivered, waited = 0, 0.0
+        deadline = None
+        for subscriber_id, (_, subscriber) in subscribers:
+            try:
+                subscriber.put_nowait(frame)
+                delivered += 1
+                continue
+            except queue.Full:
+                pass
+            # Backpressure: every slow consumer of this message shares one wait budget
+            began = time.monotonic()
+            if deadline is None:
+                deadline = began + self.send_timeout
+            try:
+                subscriber.put(frame, timeout=max(deadline - began, 0))
+                delivered += 1
+            except queue.Full:
+                self._disconnect(channel, subscriber_id, subscriber)
+            waited += time.monotonic() - began
+            with self._lock:
+                self.stats['sender_waits'] += 1
+        return delivered, waited
+
+    def _disconnect(self, channel, subscriber_id, subscriber):
+        # Still behind: end its stream; the client resumes from its last event id.
+        # Drop the whole backlog so the resume point has no gap behind it.
+        with self._lock:
+            channel.subscribers.pop(subscriber_id, None)
+            self.stats['disconnected'] += 1
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        subscriber.put_nowait(None)
+
+    def messages(self, group_id, since=None, limit=None):
+        """Messages after the ``since`` id in id order, from the ring when it covers them"""
+        channel = self.channel(group_id)
+        if channel is None:
+            raise KeyError(group_id)
+        since = since or 0
+        with self._lock:
+            if since >= channel.floor:
+                self.stats['ring_reads'] += 1
+                found = [message for message in channel.history if message['id'] > since]
+                return found[:limit] if limit else found
+            self.stats['store_reads'] += 1
+        return self.store.messages_for_group(group_id, after=since, limit=limit)
+
+    def subscribe(self, group_id, student_id=None):
+        """Register a subscriber; returns ``(subscriber_id, queue, last_id)``.
+
+        Everything after ``last_id`` will arrive on the queue; anything up to it
+        must be read with ``messages``.
+        """
+        channel = self.channel(group_id)
+        if channel is None:
+            raise KeyError(group_id)
+        subscriber = queue.Queue(self.queue_size)
+        # Holding the send lock means no message can fall between history and queue
+        with channel.send_lock, self._lock:
+            subscriber_id = next(self._subscriber_ids)
+            channel.subscribers[subscriber_id] = (student_id, subscriber)
+            return subscriber_id, subscriber, channel.last_id
+
+    def unsubscribe(self, group_id, subscriber_id):
+        with self._lock:
+            channel = self._channels.get(group_id)
+            if channel is not None:
+                channel.subscribers.pop(subscriber_id, None)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['groups'] = len(self._channels)
+            stats['subscribers'] = sum(len(channel.subscribers) for channel in self._channels.values())
+            stats['backlog_max'] = max((subscriber.qsize() for channel in self._channels.values()
+                                        for _, subscriber in channel.subscribers.values()), default=0)
+        return stats
+
+    def stream(self, group_id, student_id=None, since=None):
+        """Generator of SSE frames: the backlog after ``since``, then live messages"""
+        subscriber_id, subscriber, last_id = self.subscribe(group_id, student_id)
+        try:
+            if since is not None and since < last_id:
+                for message in self.messages(group_id, since=since):
+                    if message['id'] > last_id:
+                        break
+                    yield message_event(message)
+            while True:
+                try:
+                    frame = subscriber.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(group_id, subscriber_id)
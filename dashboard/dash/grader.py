@@ -0,0 +1,163 @@
+"""Sandboxed auto-grading for coding questions.
+
+A question is gradable when it carries a ``tests`` spec::
+
+    {'function': 'two_sum', 'unordered': True,
+     'cases': [{'args': [[2, 7, 11, 15], 9], 'expected': [0, 1]}, ...]}
+
+Every submission runs in its own short-lived ``python -I`` child process, in
+an empty temporary directory, with CPU, memory, file-size, process,
+open-file and wall-time limits (see sandbox_runner.py), so
+hostile or runaway code can be killed without taking down the server. The
+child only reports what the function returned; the expected values never
+leave this process, which does the comparing. A
+reusable pool of dispatcher threads, one per core, keeps all cores busy when
+a whole question is batch-graded.
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows: run without rlimits
+    resource = None
+
+from sandbox_runner import clip
+
+RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_runner.py')
+
+
+class Grader:
+    """Runs submissions against question test cases in sandboxed processes"""
+
+    def __init__(self, workers=None, cpu_seconds=2, memory_mb=256, wall_seconds=5):
+        self.workers = workers or os.cpu_count() or 1
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_mb * 1024 * 1024
+        self.wall_seconds = wall_seconds
+        self._pool = None
+
+    @property
+    def pool(self):
+        """Dispatcher pool, created on first use and reused between jobs"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='grader')
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    @staticmethod
+    def is_gradable(question):
+        return bool(question and question.get('type') == 'coding' and question.get('tests'))
+
+    def _limit_resources(self):
+        """Runs in the child between fork and exec"""
+        # Soft limit sends SIGXCPU so the reason can be reported; hard limit kills
+        resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 1))
+        resource.setrlimit(resource.RLIMIT_AS, (self.memory_bytes, self.memory_bytes))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        # No forking or threads, and only the few descriptors the runner needs
+        resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (16, 16))
+
+    def run(self, code, tests):
+        """Grade one answer synchronously; returns ``{'score', 'results'}``"""
+        # Only the arguments go to the child: the expected values stay here
+        job = json.dumps({'code': code, 'function': tests['function'],
+                          'cases': [case['args'] for case in tests['cases']]})
+        cases = len(tests['cases'])
+        try:
+            with tempfile.TemporaryDirectory(prefix='grade-') as workdir:
+                completed = subprocess.run(
+                    [sys.executable, '-I', '-S', RUNNER], input=job, capture_output=True, text=True,
+                    timeout=self.wall_seconds, start_new_session=True, cwd=workdir,
+                    preexec_fn=self._limit_resources if resource else None, env={})
+            outcomes = json.loads(completed.stdout)
+            if not isinstance(outcomes, list) or len(outcomes) != cases:
+                raise ValueError('one outcome per case expected')
+            results = [check(case, outcome, tests.get('unordered', False))
+                       for case, outcome in zip(tests['cases'], outcomes)]
+        except subprocess.TimeoutExpired:
+            results = [{'passed': False, 'error': 'Time limit exceeded', 'time_ms': None}] * cases
+        except ValueError:
+            # Killed by an rlimit or crashed before reporting
+            results = [{'passed': False, 'error': self._crash_reason(completed), 'time_ms': None}] * cases
+
+        passed = sum(1 for result in results if result['passed'])
+        return {'score': round(100 * passed / max(cases, 1)), 'results': results}
+
+    @staticmethod
+    def _crash_reason(completed):
+        if completed.returncode == -signal.SIGXCPU:
+            return 'CPU time limit exceeded'
+        if completed.returncode < 0:
+            return f'Killed by {signal.Signals(-completed.returncode).name}'
+        lines = completed.stderr.strip().splitlines()
+        return lines[-1] if lines else f'Exited with status {completed.returncode}'
+
+    def submit(self, code, tests):
+        """Queue one answer for grading; returns a Future"""
+        return self.pool.submit(self.run, code, tests)
+
+    def grade_many(self, answers, tests):
+        """Grade many answers to the same question across all cores, in order"""
+        return list(self.pool.map(lambda code: self.run(code, tests), answers))
+
+
+def normalize(value, unordered):
+    if unordered and isinstance(value, list):
+        try:
+            return sorted(value)
+        except TypeError:
+            # Mixed types: leave the order as it is
+            return value
+    return value
+
+
+def check(case, outcome, unordered):
+    """Compare one outcome reported by the runner with the case's expected value.
+
+    Raises ``ValueError`` if the outcome is not in the runner's format.
+    """
+    if not isinstance(outcome, dict):
+        raise ValueError('outcome is not an object')
+    time_ms = outcome.get('time_ms')
+    result = {'passed': False, 'time_ms': time_ms if isinstance(time_ms, (int, float)) else None}
+    expected = case['expected']
+    if 'output' in outcome:
+        if normalize(outcome['output'], unordered) == normalize(expected, unordered):
+            result['passed'] = True
+        else:
+            result['error'] = f'expected {clip(repr(expected))}, got {clip(repr(outcome["output"]))}'
+    elif 'repr' in outcome:
+        result['error'] = f'expected {clip(repr(expected))}, got {clip(str(outcome["repr"]))}'
+    else:
+        result['error'] = clip(str(outcome.get('error')))
+    return result
+
+
+def feedback_from_result(submission, result):
+    """Build the auto-generated feedback record for a graded submission"""
+    results = result['results']
+    passed = sum(1 for r in results if r['passed'])
+    lines = [f'Auto-graded: {passed}/{len(results)} tests passed.']
+    lines.extend(f'Test {i}: {r["error"]}' for i, r in enumerate(results, 1) if not r['passed'])
+    return {
+        'submission_id': submission['id'],
+        'student_id': submission['student_id'],
+        'question_id': submission['question_id'],
+        'feedback': '\n'.join(lines),
+        'score': result['score'],
+        'test_results': results,
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
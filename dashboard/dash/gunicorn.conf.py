@@ -0,0 +1,38 @@
+"""Gunicorn settings for serving the dashboard: ``gunicorn main:app``.
+
+Each worker scales with ``WEB_THREADS``; ``WEB_CONCURRENCY`` workers spread
+the load over more cores. Several workers need ``DATA_BACKEND=sql``: the
+database holds the records, the job status records and the change feed
+(``changes.py``) through which every worker applies the others' writes to
+its own search and similarity indexes, cohort analytics, recommendations,
+chat rings, pair channels, render cache and deadline timers, within
+``CHANGE_FEED_INTERVAL`` seconds. The in-memory store cannot be shared, so
+it runs in one worker.
+
+Rate limit buckets, open push streams (``SSE_MAX_STREAMS``) and the
+``/metrics`` timings are counted per worker.
+"""
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+# Push streams hold a thread each while their tab is open: at most half of
+# these serve streams (SSE_MAX_STREAMS), so the rest keep answering requests
+threads = int(os.environ.get('WEB_THREADS', '32'))
+worker_class = 'gthread'
+
+# Seed the store and build the indexes once in the master, before forking
+preload_app = True
+
+if workers > 1 and os.environ.get('DATA_BACKEND', 'memory') != 'sql':
+    raise RuntimeError('Workers share their data through a database: set DATA_BACKEND=sql '
+                       '(and DATABASE_URL) to run more than one')
+
+
+def post_fork(server, worker):
+    from app import store
+
+    # Pooled database connections must not be shared with the master
+    engine = getattr(store, 'engine', None)
+    if engine is not None:
+        engine.dispose(close=False)
@@ -0,0 +1,252 @@
+"""In-process background job queue.
+
+Request handlers enqueue follow-up work (auto-grading, batch jobs) and return
+immediately; a bounded pool of worker threads drains the queue with retries.
+``LocalBroker`` is a stand-in for an external broker so the app runs with no
+outside services; anything with the same ``put``/``get``/``depth`` methods
+can replace it.
+
+Jobs run in the process that queued them, but with a ``journal`` (the SQL
+store) their status records are also written to the shared database, which
+hands out the job ids: a client polling a job's status gets the same answer
+from every worker.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import count
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when the broker is at capacity and cannot accept more jobs"""
+
+
+class LocalBroker:
+    """Thread-safe FIFO of job ids held in memory"""
+
+    def __init__(self, maxsize=10000):
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, job_id, timeout=None):
+        try:
+            self._queue.put(job_id, timeout=timeout)
+        except queue.Full:
+            raise JobQueueFull('Job queue is full') from None
+
+    def get(self, timeout=None):
+        """Next job id, or None if nothing arrived within ``timeout``"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def depth(self):
+        return self._queue.qsize()
+
+
+class JobQueue:
+    """Named job handlers executed by a bounded worker pool with retries"""
+
+    def __init__(self, broker=None, workers=4, max_retries=3, retry_delay=0.5,
+                 history=10000, enqueue_timeout=1, journal=None):
+        self.broker = broker or LocalBroker()
+        self.journal = journal
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.history = history
+        self.enqueue_timeout = enqueue_timeout
+        self._handlers = {}
+        self._jobs = OrderedDict()
+        self._payloads = {}
+        self._lock = threading.Lock()
+        self._ids = count(1)
+        self._threads = []
+        self._stopping = threading.Event()
+        self._running = 0
+        self._counters = {'enqueued': 0, 'succeeded': 0, 'failed': 0, 'retried': 0}
+        self._wait_ms = deque(maxlen=1000)
+        self._run_ms = deque(maxlen=1000)
+
+    def register(self, name):
+        """Decorator registering the handler for jobs called ``name``"""
+        def decorator(func):
+            self._handlers[name] = func
+            return func
+        return decorator
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self, wait=True):
+        self._stopping.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def enqueue(self, name, *args, **kwargs):
+        """Queue a job and return its id without waiting for it to run"""
+        if name not in self._handlers:
+            raise KeyError(f'No handler registered for job {name!r}')
+        self.start()
+        job = {'name': name, 'state': 'queued', 'attempts': 0, 'enqueued_at': time.time(),
+               'started_at': None, 'finished_at': None, 'error': None, 'result': None}
+        job_id = self.journal.add_job(job) if self.journal is not None else next(self._ids)
+        with self._lock:
+            self._jobs[job_id] = dict(job, id=job_id)
+            self._payloads[job_id] = (args, kwargs)
+            self._counters['enqueued'] += 1
+            # Forget the oldest finished jobs once the history is full
+            while len(self._jobs) > self.history:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest['state'] not in ('succeeded', 'failed'):
+                    break
+                del self._jobs[oldest_id]
+        try:
+            self.broker.put(job_id, timeout=self.enqueue_timeout)
+        except JobQueueFull:
+            with self._lock:
+                del self._jobs[job_id]
+                del self._payloads[job_id]
+                self._counters['enqueued'] -= 1
+            if self.journal is not None:
+                self.journal.delete_job(job_id)
+            raise
+        if self.journal is not None and job_id % 100 == 0:
+            self.journal.prune_jobs(job_id - self.history)
+        return job_id
+
+    def status(self, job_id):
+        """Copy of a job's status record, or None if it is unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        # Queued by another process, or forgotten here
+        return self.journal.get_job(job_id) if self.journal is not None else None
+
+    def _save(self, job_id):
+        """Write a job's status record to the journal, if there is one"""
+        if self.journal is None:
+            return
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job = dict(job)
+        try:
+            self.journal.update_job(job)
+        except Exception:
+            logger.exception('Could not record the status of job %s', job_id)
+
+    def metrics(self):
+        """Queue depth, in-flight jobs, outcome counters and latency percentiles"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['running'] = self._running
+            wait_ms, run_ms = sorted(self._wait_ms), sorted(self._run_ms)
+        stats['depth'] = self.broker.depth()
+        stats['workers'] = len(self._threads)
+        for label, samples in (('wait_ms', wait_ms), ('run_ms', run_ms)):
+            stats[label] = {
+                'p50': samples[len(samples) // 2] if samples else None,
+                'p95': samples[int(len(samples) * 0.95)] if samples else None,
+                'max': samples[-1] if samples else None,
+            }
+        return stats
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job_id = self.broker.get(timeout=0.5)
+            if job_id is not None:
+                self._run(job_id)
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            args, kwargs = self._payloads[job_id]
+            job['state'] = 'running'
+            job['attempts'] += 1
+            job['started_at'] = time.time()
+            if job['attempts'] == 1:
+                self._wait_ms.append((job['started_at'] - job['enqueued_at']) * 1000)
+            self._running += 1
+        self._save(job_id)
+
+        try:
+            result = self._handlers[job['name']](*args, **kwargs)
+        except Exception as e:
+            logger.exception('Job %s (%s) failed on attempt %d', job_id, job['name'], job['attempts'])
+            self._finish(job_id, error=f'{type(e).__name__}: {e}')
+        else:
+            self._finish(job_id, result=result)
+
+    def _finish(self, job_id, result=None, error=None):
+        retry = False
+        with self._lock:
+            job = self._jobs[job_id]
+            self._running -= 1
+            self._run_ms.append((time.time() - job['started_at']) * 1000)
+            job['error'] = error
+            if error is None:
+                job['state'] = 'succeeded'
+                job['result'] = result
+                self._counters['succeeded'] += 1
+            elif job['attempts'] <= self.max_retries:
+                job['state'] = 'retrying'
+                self._counters['retried'] += 1
+                retry = True
+            else:
+                job['state'] = 'failed'
+                self._counters['failed'] += 1
+            if not retry:
+                job['finished_at'] = time.time()
+                del self._payloads[job_id]
+        self._save(job_id)
+
+        if retry:
+            self._schedule_requeue(job_id, self.retry_delay * 2 ** (job['attempts'] - 1))
+
+    def _schedule_requeue(self, job_id, delay, tries=0):
+        timer = threading.Timer(delay, self._requeue, args=(job_id, delay, tries))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, job_id, delay, tries):
+        """Put a retrying job back on the broker; runs in its timer thread"""
+        try:
+            self.broker.put(job_id, timeout=self.enqueue_timeout)
+            return
+        except JobQueueFull as e:
+            if tries < self.max_retries:
+                # Backlogged: try again later rather than dropping the retry
+                logger.warning('Job queue full, retrying job %s in %.1fs', job_id, delay * 2)
+                self._schedule_requeue(job_id, delay * 2, tries + 1)
+                return
+            error = f'{type(e).__name__}: {e}'
+        except Exception as e:
+            logger.exception('Could not requeue job %s', job_id)
+            error = f'{type(e).__name__}: {e}'
+        # Nothing left to run it: fail it rather than leave it retrying forever
+        with self._lock:
+            job = self._jobs[job_id]
+            job['state'] = 'failed'
+            job['error'] = error
+            job['finished_at'] = time.time()
+            del self._payloads[job_id]
+            self._counters['failed'] += 1
+        self._save(job_id)
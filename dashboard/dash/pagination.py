@@ -0,0 +1,57 @@
+"""Cursor pagination shared by the listing pages and their JSON APIs.
+
+Listings are ordered by id, which is allocated in creation order, and the
+cursor is the id of the last record on the previous page. Stores return lazy
+iterators, so a page only ever touches ``limit + 1`` records (the extra one
+tells whether there is a next page).
+"""
+import json
+from itertools import islice
+
+from flask import Response, current_app, request
+
+
+def page_args():
+    """Read the ``after`` cursor and ``limit`` page size from the query string"""
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', type=int) or current_app.config['PAGE_SIZE']
+    return after, max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+
+
+def _close(items):
+    # Release a database cursor held by an unfinished generator
+    close = getattr(items, 'close', None)
+    if close:
+        close()
+
+
+def paginate(items, limit):
+    """Materialise one page for a template; returns ``(page, next_cursor)``"""
+    page = list(islice(items, limit + 1))
+    _close(items)
+    if len(page) > limit:
+        return page[:limit], page[limit - 1]['id']
+    return page, None
+
+
+def stream_page(items, limit, transform=None):
+    """Yield ``{"items": [...], "next_cursor": ...}`` as JSON, one item at a time"""
+    yield '{"items": ['
+    last_id = next_cursor = None
+    try:
+        for n, item in enumerate(items):
+            if n == limit:
+                next_cursor = last_id
+                break
+            if transform:
+                item = transform(item)
+            yield (',' if n else '') + json.dumps(item)
+            last_id = item['id']
+    finally:
+        _close(items)
+    yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
+
+def json_page(items, limit, transform=None):
+    """Streaming JSON response for one page"""
+    return Response(stream_page(items, limit, transform), mimetype='application/json')
@@ -0,0 +1,503 @@
+"""Server-push synchronisation for pair programming sessions.
+
+Each session has a version number that increases with every accepted edit
+and a hash of its content. Clients send edits as single-splice text deltas
+against the version they last saw; accepted deltas are fanned out to every
+other subscriber of the session over Server-Sent Events, so unchanged buffers
+never cross the wire. The polling fallback uses the same version and hash as
+an ETag and for conditional writes.
+
+Every version is also kept in an edit history (full-buffer writes are
+reduced to the splice that changed), so a session can replay its recent
+versions or revert to one of them.
+
+Accepted versions are written through to the store in order, one writer per
+session at a time, and the store refuses a version that does not follow the
+one it holds: a hub whose copy of a session is behind (another process wrote
+to it) reloads the session and the client resyncs, instead of overwriting
+newer code. ``on_version`` is told of every accepted version, so other
+processes can ``receive`` it and push it to their own subscribers.
+
+A session's channel is loaded from the store on first use and dropped again
+once it has had no subscribers and no requests for ``idle_timeout`` seconds,
+or when the session ends, so channels and their histories do not pile up.
+"""
+import hashlib
+import json
+import queue
+import threading
+import time
+from itertools import count
+
+from blobs import BlobStore
+
+
+def apply_delta(code, delta):
+    """Replace ``code[start:end]`` with ``text``"""
+    start, end = delta['start'], delta['end']
+    if not 0 <= start <= end <= len(code):
+        raise ValueError('Delta range outside the buffer')
+    return code[:start] + delta['text'] + code[end:]
+
+
+def _common_prefix(a, b):
+    """Length of the common prefix, found by bisecting with C-level slice compares"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix(a, b, limit):
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:] == b[len(b) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def diff_delta(old, new):
+    """The single splice turning ``old`` into ``new`` (common prefix and suffix kept)"""
+    start = _common_prefix(old, new)
+    tail = _common_suffix(old, new, min(len(old), len(new)) - start)
+    return {'start': start, 'end': len(old) - tail, 'text': new[start:len(new) - tail]}
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Events frame"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def content_hash(code):
+    return hashlib.sha1(code.encode('utf-8')).hexdigest()
+
+
+class EditHistory:
+    """A session's recent versions: one delta per version plus periodic checkpoints.
+
+    Checkpoints are full buffers kept in a ``BlobStore`` (deduplicated and
+    compressed); any retained version is rebuilt from the nearest checkpoint
+    at or before it. Beyond ``limit`` edits the oldest are dropped a
+    checkpoint interval at a time.
+    """
+
+    def __init__(self, blobs, code, version=0, checkpoint_every=50, limit=1000):
+        if limit < checkpoint_every:
+            raise ValueError('The history must hold at least one checkpoint interval')
+        self.blobs = blobs
+        self.checkpoint_every = checkpoint_every
+        self.limit = limit
+        self.base_version = version
+        # (start, end, text, client_id, timestamp) of versions base_version + 1, + 2, ...
+        self.edits = []
+        self.checkpoints = {version: blobs.put(code)}
+
+    def close(self):
+        """Release the checkpoints of a history that is no longer used"""
+        for key in self.checkpoints.values():
+            self.blobs.release(key)
+        self.checkpoints = {}
+
+    @property
+    def version(self):
+        return self.base_version + len(self.edits)
+
+    def record(self, delta, code, client_id=None):
+        """Append the edit that produced ``code``, the new current buffer"""
+        self.edits.append((delta['start'], delta['end'], delta['text'], client_id, time.time()))
+        if self.version % self.checkpoint_every == 0:
+            self.checkpoints[self.version] = self.blobs.put(code)
+        if len(self.edits) > self.limit:
+            # Rebase on the oldest checkpoint that keeps at most ``limit`` edits
+            base = min(version for version in self.checkpoints if version >= self.version - self.limit)
+            del self.edits[:base - self.base_version]
+            for version in [version for version in self.checkpoints if version < base]:
+                self.blobs.release(self.checkpoints.pop(version))
+            self.base_version = base
+
+    def code_at(self, version):
+        """The buffer as of ``version``; ValueError if it is not in the history"""
+        if not self.base_version <= version <= self.version:
+            raise ValueError(f'Version {version} is not in the history '
+                             f'(versions {self.base_version}-{self.version} are)')
+        checkpoint = max(v for v in self.checkpoints if v <= version)
+        code = self.blobs.get(self.checkpoints[checkpoint])
+        for start, end, text, _, _ in self.edits[checkpoint - self.base_version:version - self.base_version]:
+            code = code[:start] + text + code[end:]
+        return code
+
+    def entries(self, after=None, limit=None):
+        """Edits that produced the versions after ``after``, oldest first"""
+        first = max(after - self.base_version, 0) if after is not None else 0
+        edits = self.edits[first:] if limit is None else self.edits[first:first + limit]
+        return [{'version': self.base_version + first + n + 1, 'start': start, 'end': end, 'text': text,
+                 'client_id': client_id, 'at': at}
+                for n, (start, end, text, client_id, at) in enumerate(edits)]
+
+
+class SessionChannel:
+    """Current buffer, version, content hash, history and subscriber queues for one session"""
+
+    def __init__(self, code, history):
+        self.version = history.version
+        self.subscribers = {}
+        self.history = history
+        self.set_code(code)
+        self.last_used = time.monotonic()
+        # Serialises writers of the session so the store receives its versions in order
+        self.write_lock = threading.Lock()
+
+    def set_code(self, code):
+        self.code = code
+        self.digest = content_hash(code)
+
+    @property
+    def etag(self):
+        return f'{self.version}-{self.digest[:16]}'
+
+
+class PairSyncHub:
+    """Tracks session versions and fans deltas out to subscribed clients"""
+
+    def __init__(self, store, queue_size=256, keepalive=15, blobs=None, history=1000, checkpoint_every=50,
+                 idle_timeout=600, on_version=None):
+        self.store = store
+        # Called with (session_id, version, delta, client_id) for each accepted version, in order
+        self.on_version = on_version
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        # History checkpoints share the store's blobs when it has them
+        self.blobs = blobs if blobs is not None else BlobStore()
+        self.history_limit = history
+        self.checkpoint_every = checkpoint_every
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._subscriber_ids = count(1)
+        self._next_sweep = time.monotonic() + idle_timeout
+        self.stats = {'evicted': 0, 'polls': 0, 'polls_not_modified': 0,
+                      'writes': 0, 'writes_noop': 0, 'writes_stale': 0,
+                      'deltas': 0, 'deltas_stale': 0, 'reverts': 0, 'writes_conflict': 0}
+
+    def channel(self, session_id):
+        """Return the channel for a session, creating it from the store on first use"""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._evict_idle(now)
+            channel = self._channels.get(session_id)
+            if channel is not None:
+                channel.last_used = now
+                return channel
+        # Loaded outside the hub lock, so a slow store does not stall every other session
+        session = self.store.get_session(session_id)
+        if session is None:
+            return None
+        loaded = SessionChannel(session['code'], self._history(session))
+        with self._lock:
+            channel = self._channels.setdefault(session_id, loaded)
+            channel.last_used = now
+        if channel is not loaded:
+            # Another request loaded it first
+            loaded.history.close()
+        return channel
+
+    def _evict_idle(self, now):
+        """Drop channels without subscribers unused for ``idle_timeout``; caller holds the lock"""
+        self._next_sweep = now + self.idle_timeout / 2
+        for session_id, channel in list(self._channels.items()):
+            if channel.subscribers or now - channel.last_used < self.idle_timeout or channel.write_lock.locked():
+                continue
+            del self._channels[session_id]
+            channel.history.close()
+            self.stats['evicted'] += 1
+
+    def close(self, session_id):
+        """Drop the channel of a session that has ended, closing its subscribers' streams"""
+        with self._lock:
+            channel = self._channels.pop(session_id, None)
+            if channel is None:
+                return
+            self.stats['evicted'] += 1
+            for _, subscriber in channel.subscribers.values():
+                try:
+                    subscriber.put_nowait(None)
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+                    subscriber.put_nowait(None)
+            channel.subscribers.clear()
+        with channel.write_lock:
+            channel.history.close()
+
+    def _history(self, session):
+        return EditHistory(self.blobs, session['code'], version=session.get('version', 0),
+                           checkpoint_every=self.checkpoint_every, limit=self.history_limit)
+
+    def _persist(self, session_id, channel, code):
+        """Write the channel's next version through to the store; caller holds its write lock.
+
+        Returns False when the store holds a different version (another
+        process wrote to the session): the channel is then reloaded from the
+        store and its subscribers sent the stored buffer.
+        """
+        if self.store.update_session_code(session_id, code, channel.version + 1):
+            return True
+        with self._lock:
+            self.stats['writes_conflict'] += 1
+        self._reload(session_id, channel)
+        return False
+
+    def _reload(self, session_id, channel):
+        """Replace a channel's buffer and history with the stored session; caller holds its write lock"""
+        session = self.store.get_session(session_id)
+        if session is None:
+            return
+        with self._lock:
+            channel.history.close()
+            channel.history = self._history(session)
+            channel.version = channel.history.version
+            channel.set_code(session['code'])
+            self._publish(channel, 'snapshot', {'code': channel.code, 'version': channel.version})
+
+    def _accepted(self, session_id, version, delta, client_id):
+        """Report an accepted version; caller holds the channel's write lock, so they arrive in order"""
+        if self.on_version is not None:
+            self.on_version(session_id, version, delta, client_id)
+
+    def receive(self, session_id, version, delta, client_id=None):
+        """Apply a version another process accepted, if this hub holds the session.
+
+        The next version is applied as a delta and pushed to the subscribers;
+        after a gap the channel is reloaded from the store instead.
+        """
+        with self._lock:
+            channel = self._channels.get(session_id)
+        if channel is None:
+            return
+        with channel.write_lock:
+            with self._lock:
+                if version <= channel.version:
+                    return
+                if version == channel.version + 1:
+                    code = apply_delta(channel.code, delta)
+                    channel.set_code(code)
+                    channel.version = version
+                    channel.history.record(delta, code, client_id)
+                    self._publish(channel, 'delta', dict(delta, version=version, client_id=client_id),
+                                  exclude=client_id)
+                    return
+            self._reload(session_id, channel)
+
+    def snapshot(self, session_id):
+        channel = self.channel(session_id)
+        if channel is None:
+            return None
+        with self._lock:
+            return {'code': channel.code, 'version': channel.version}
+
+    def poll(self, session_id, if_none_match=None):
+        """Conditional read for the polling fallback.
+
+        Returns ``(etag, snapshot)``; the snapshot is None when ``if_none_match``
+        (a callable testing an ETag) says the client already has this version.
+        """
+        channel = self.channel(session_id)
+        if channel is None:
+            raise KeyError(session_id)
+        with self._lock:
+            self.stats['polls'] += 1
+            etag = channel.etag
+            if if_none_match is not None and if_none_match(etag):
+                self.stats['polls_not_modified'] += 1
+                return etag, None
+            return etag, {'code': channel.code, 'version': channel.version}
+
+    def apply(self, session_id, base_version, delta, client_id=None):
+        """Apply a delta made against ``base_version``.
+
+        Returns ``(accepted, payload)``: the new version on success, or the
+        current snapshot when the client is behind and must resync.
+        """
+        channel = self.channel(session_id)
+        if channel is None:
+            raise KeyError(session_id)
+        with channel.write_lock:
+            with self._lock:
+                self.stats['deltas'] += 1
+                if base_version != channel.version:
+                    self.stats['deltas_stale'] += 1
+                    return False, {'code': channel.code, 'version': channel.version}
+                code = apply_delta(channel.code, delta)
+            if not self._persist(session_id, channel, code):
+                with self._lock:
+                    self.stats['deltas_stale'] += 1
+                    return False, {'code': channel.code, 'version': channel.version}
+            with self._lock:
+                channel.set_code(code)
+                channel.version += 1
+                channel.history.record(delta, code, client_id)
+                event = {'version': channel.version, 'client_id': client_id,
+                         'start': delta['start'], 'end': delta['end'], 'text': delta['text']}
+                self._publish(channel, 'delta', event, exclude=client_id)
+                version = channel.version
+            self._accepted(session_id, version, delta, client_id)
+            return True, {'version': version}
+
+    def replace(self, session_id, code, client_id=None, base_version=None):
+        """Replace the whole buffer (polling fallback).
+
+        Identical content is a no-op that keeps the version. When
+        ``base_version`` is given and the session has moved past it, the write
+        is rejected so the client can rebase. Returns ``(accepted, payload)``
+        like ``apply``.
+        """
+        channel = self.channel(session_id)
+        if channel is None:
+            raise KeyError(session_id)
+        digest = content_hash(code)
+        with channel.write_lock:
+            with self._lock:
+                self.stats['writes'] += 1
+                if digest == channel.digest:
+                    self.stats['writes_noop'] += 1
+                    return True, {'version': channel.version, 'changed': False}
+                if base_version is not None and base_version != channel.version:
+                    self.stats['writes_stale'] += 1
+                    return False, {'code': channel.code, 'version': channel.version}
+            if not self._persist(session_id, channel, code):
+                with self._lock:
+                    self.stats['writes_stale'] += 1
+                    return False, {'code': channel.code, 'version': channel.version}
+            with self._lock:
+                delta = diff_delta(channel.code, code)
+                channel.history.record(delta, code, client_id)
+                channel.code, channel.digest = code, digest
+                channel.version += 1
+                version = channel.version
+                self._publish(channel, 'snapshot', {'code': code, 'version': version}, exclude=client_id)
+            self._accepted(session_id, version, delta, client_id)
+            return True, {'version': version, 'changed': True}
+
+    def history(self, session_id, after=None, limit=None):
+        """Retained edits after version ``after``, with the range of versions still available"""
+        channel = self.channel(session_id)
+        if channel is None:
+            raise KeyError(session_id)
+        with self._lock:
+            return {'first_version': channel.history.base_version, 'version': channel.version,
+                    'edits': channel.history.entries(after, limit)}
+
+    def code_at(self, session_id, version):
+        """The buffer as of a retained ``version``; ValueError if it is too old"""
+        channel = self.channel(session_id)
+        if channel is None:
+            raise KeyError(session_id)
+        with self._lock:
+            return channel.history.code_at(version)
+
+    def revert(self, session_id, version, client_id=None):
+        """Restore the buffer of an earlier version as a new version.
+
+        The history is kept: the revert is one more edit, sent to every
+        subscriber (including the reverting client) as a delta.
+        """
+        channel = self.channel(session_id)
+        if channel is None:
+            raise KeyError(session_id)
+        with channel.write_lock:
+            with self._lock:
+                code = channel.history.code_at(version)
+                if code == channel.code:
+                    return {'version': channel.version, 'changed': False}
+            if not self._persist(session_id, channel, code):
+                # Reloaded from the store: the reverted-to version is gone
+                raise ValueError(f'Version {version} is no longer in the history; the session was changed')
+            with self._lock:
+                self.stats['reverts'] += 1
+                delta = diff_delta(channel.code, code)
+                channel.set_code(code)
+                channel.version += 1
+                channel.history.record(delta, code, client_id)
+                new_version = channel.version
+                self._publish(channel, 'delta', dict(delta, version=new_version, client_id=client_id))
+            # Every other process's subscribers get it too, the reverting client's included
+            self._accepted(session_id, new_version, delta, None)
+            return {'version': new_version, 'changed': True}
+
+    def _publish(self, channel, event, data, exclude=None):
+        """Queue an event for every subscriber; caller holds the lock"""
+        frame = sse_event(event, data)
+        for subscriber_id, (client_id, subscriber) in list(channel.subscribers.items()):
+            if exclude is not None and client_id == exclude:
+                continue
+            try:
+                subscriber.put_nowait(frame)
+            except queue.Full:
+                # Too far behind to catch up from deltas: close its stream so the
+                # client reconnects and starts again from a fresh snapshot
+                del channel.subscribers[subscriber_id]
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(None)
+
+    def subscribe(self, session_id, client_id=None):
+        """Register a subscriber; returns ``(subscriber_id, queue)`` seeded with a snapshot"""
+        channel = self.channel(session_id)
+        if channel is None:
+            raise KeyError(session_id)
+        subscriber = queue.Queue(self.queue_size)
+        with self._lock:
+            subscriber_id = next(self._subscriber_ids)
+            channel.subscribers[subscriber_id] = (client_id, subscriber)
+            subscriber.put_nowait(sse_event('snapshot', {'code': channel.code, 'version': channel.version}))
+        return subscriber_id, subscriber
+
+    def unsubscribe(self, session_id, subscriber_id):
+        with self._lock:
+            channel = self._channels.get(session_id)
+            if channel is not None:
+                channel.subscribers.pop(subscriber_id, None)
+                # Idle from when its last subscriber left
+                channel.last_used = time.monotonic()
+
+    def metrics(self):
+        """Counters for polls and writes, including how many were avoided"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['sessions'] = len(self._channels)
+            stats['history_edits'] = sum(len(channel.history.edits) for channel in self._channels.values())
+            stats['subscribers'] = sum(len(channel.subscribers) for channel in self._channels.values())
+        return stats
+
+    def subscriber_count(self, session_id):
+        with self._lock:
+            channel = self._channels.get(session_id)
+            return len(channel.subscribers) if channel else 0
+
+    def stream(self, session_id, client_id=None):
+        """Generator of SSE frames for one client, ending when it is dropped"""
+        subscriber_id, subscriber = self.subscribe(session_id, client_id)
+        try:
+            while True:
+                try:
+                    frame = subscriber.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(session_id, subscriber_id)
@@ -0,0 +1,265 @@
+"""Request metrics in Prometheus format and an on-demand sampling profiler.
+
+``RequestMetrics`` times every request by endpoint and splits the time into
+template rendering and data-store access, alongside response sizes. It only
+hooks into the app when enabled, so a disabled instance costs nothing per
+request. Data-access time comes from wrapping the store in
+``InstrumentedStore``.
+
+Any request can be profiled by adding ``?profile=1`` with the admin token
+(the ``X-Profile-Token`` header or ``profile_token`` argument). The response
+is then replaced by the sampled stacks in folded format, one
+``frame;frame;frame count`` line per distinct stack, ready for
+flamegraph.pl or speedscope.
+"""
+import bisect
+import functools
+import hmac
+import inspect
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import Response, before_render_template, g, request, template_rendered
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class InstrumentedStore:
+    """Store proxy adding the time spent in each call to the current request"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getattr__(self, name):
+        attribute = getattr(self._store, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = attribute(*args, **kwargs)
+            finally:
+                _add_data_time(time.perf_counter() - start)
+            if inspect.isgenerator(result):
+                return _timed_iteration(result)
+            return result
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, timed)
+        return timed
+
+
+# Data-access seconds of the request running on this thread (None outside requests)
+_request_timing = threading.local()
+
+
+def _add_data_time(seconds):
+    if getattr(_request_timing, 'data_seconds', None) is not None:
+        _request_timing.data_seconds += seconds
+
+
+def _timed_iteration(generator):
+    """Re-yield a lazy store result, timing the work done on each step"""
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                _add_data_time(time.perf_counter() - start)
+            yield item
+    finally:
+        generator.close()
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread"""
+
+    # The sampler needs the GIL at least once per interval, so the interpreter's
+    # thread switch interval is lowered while any profile is running
+    _active = 0
+    _saved_switch_interval = None
+    _switch_lock = threading.Lock()
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name='profiler', daemon=True)
+
+    def start(self):
+        with self._switch_lock:
+            if SamplingProfiler._active == 0:
+                SamplingProfiler._saved_switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self._saved_switch_interval, self.interval / 4))
+            SamplingProfiler._active += 1
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+        with self._switch_lock:
+            SamplingProfiler._active -= 1
+            if SamplingProfiler._active == 0:
+                sys.setswitchinterval(self._saved_switch_interval)
+
+    def _sample(self):
+        while not self._stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """Collapsed stacks, most sampled first"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestMetrics:
+    """Per-endpoint latency, render time, data-access time and payload size"""
+
+    def __init__(self, app=None, enabled=True, profile_token=None, profile_interval=0.001):
+        self.enabled = enabled
+        self.profile_token = profile_token
+        self.profile_interval = profile_interval
+        self.latency = Histogram('eduhub_request_duration_seconds', 'Time to produce the response',
+                                 ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.render = Histogram('eduhub_template_render_seconds', 'Time spent rendering templates',
+                                ('endpoint',), LATENCY_BUCKETS)
+        self.data = Histogram('eduhub_data_access_seconds', 'Time spent in data store calls',
+                              ('endpoint',), LATENCY_BUCKETS)
+        self.size = Histogram('eduhub_response_size_bytes', 'Response body size (unstreamed responses)',
+                              ('endpoint',), SIZE_BUCKETS)
+        self.responses = defaultdict(int)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.enabled:
+            app.before_request(self._before)
+            app.after_request(self._after)
+            before_render_template.connect(self._render_started, app)
+            template_rendered.connect(self._render_finished, app)
+        if self.profile_token:
+            app.before_request(self._start_profile)
+            app.after_request(self._finish_profile)
+
+    def instrument(self, store):
+        """The store to use: wrapped for data-access timing when enabled"""
+        return InstrumentedStore(store) if self.enabled else store
+
+    # Timings live in a thread-local rather than flask.g: the hooks run on every
+    # request and context-local proxies cost several times more per access
+    def _before(self):
+        timing = _request_timing
+        timing.render_seconds = timing.data_seconds = 0.0
+        timing.started = time.perf_counter()
+
+    def _render_started(self, sender, **extra):
+        _request_timing.render_started = time.perf_counter()
+
+    def _render_finished(self, sender, **extra):
+        timing = _request_timing
+        # Templates can also be rendered outside a request (no _before ran)
+        timing.render_seconds = getattr(timing, 'render_seconds', 0.0) + time.perf_counter() - timing.render_started
+
+    def _after(self, response):
+        timing = _request_timing
+        started = getattr(timing, 'started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        data_seconds = timing.data_seconds
+        timing.started = timing.data_seconds = None
+        current = request._get_current_object()
+        endpoint = current.endpoint or 'unmatched'
+        self.latency.observe((endpoint, current.method), elapsed)
+        if timing.render_seconds:
+            self.render.observe((endpoint,), timing.render_seconds)
+        self.data.observe((endpoint,), data_seconds)
+        # Streamed bodies have no length up front and are not counted
+        if response.content_length is not None:
+            self.size.observe((endpoint,), response.content_length)
+        with self._lock:
+            self.responses[(endpoint, response.status_code)] += 1
+        return response
+
+    def _authorized(self):
+        token = request.headers.get('X-Profile-Token') or request.args.get('profile_token') or ''
+        return hmac.compare_digest(token, self.profile_token)
+
+    def _start_profile(self):
+        if request.args.get('profile') == '1' and self._authorized():
+            g.profiler = SamplingProfiler(threading.get_ident(), self.profile_interval).start()
+
+    def _finish_profile(self, response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.stop()
+        header = f'# {profiler.samples} samples every {profiler.interval * 1000:g}ms of {request.path}\n'
+        return Response(header + profiler.folded(), mimetype='text/plain')
+
+    def exposition(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for histogram in (self.latency, self.render, self.data, self.size):
+            lines.extend(histogram.render())
+        lines.append('# HELP eduhub_responses_total Responses by endpoint and status code')
+        lines.append('# TYPE eduhub_responses_total counter')
+        with self._lock:
+            responses = sorted(self.responses.items())
+        for (endpoint, status), count in responses:
+            lines.append(f'eduhub_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,116 @@
+"""Rendered-response cache for read-heavy pages.
+
+Pages are cached under their endpoint, view arguments, query string and the
+current generation of every entity they display. Write routes bump the
+generation of the entities they change, so stale pages are never served and
+simply age out of the LRU. Send ``X-Cache-Bypass: 1`` to skip the cache.
+
+An entity can be scoped to one record, e.g. ``status:42`` for a student's
+own view: bumping ``status:42`` invalidates only that student's pages, while
+bumping ``status`` invalidates them for every student.
+"""
+import functools
+import threading
+from collections import OrderedDict
+
+from flask import Response, make_response, request, session
+
+BYPASS_HEADER = 'X-Cache-Bypass'
+
+
+class RenderCache:
+    """LRU of rendered page bodies bounded by a total byte budget"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'bypasses': 0, 'evictions': 0}
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def bump(self, *entities):
+        """Invalidate every cached page that displays any of ``entities``"""
+        with self._lock:
+            for entity in entities:
+                self._generations[entity] = self._generations.get(entity, 0) + 1
+
+    def generations(self, entities):
+        with self._lock:
+            return tuple((self._generations.get(entity.partition(':')[0], 0), self._generations.get(entity, 0))
+                         for entity in entities)
+
+    def get(self, key):
+        """``(body, mimetype)`` cached under ``key``, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def put(self, key, body, mimetype='text/html'):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = (body, mimetype)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(entries=len(self._entries), bytes=self._size, max_bytes=self.max_bytes,
+                         generations=dict(self._generations))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def cached(self, *entities):
+        """Decorator caching a view's 200 responses until ``entities`` change.
+
+        An entity may be a function of the view arguments returning its
+        name, e.g. ``lambda student_id: f'status:{student_id}'``.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                # Pending flash messages are rendered into the page, so never share it
+                if not self.enabled or request.headers.get(BYPASS_HEADER) or session.get('_flashes'):
+                    with self._lock:
+                        self.stats['bypasses'] += 1
+                    response = make_response(view(*args, **kwargs))
+                    response.headers['X-Cache'] = 'BYPASS'
+                    return response
+
+                names = [entity(**kwargs) if callable(entity) else entity for entity in entities]
+                key = (request.endpoint, tuple(sorted(kwargs.items())),
+                       tuple(sorted(request.args.items(multi=True))), self.generations(names))
+                entry = self.get(key)
+                if entry is not None:
+                    return Response(entry[0], mimetype=entry[1], headers={'X-Cache': 'HIT'})
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    self.put(key, response.get_data(), response.mimetype)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
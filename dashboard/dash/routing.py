@@ -0,0 +1,26 @@
+"""URL rules that compile their ``url_for`` builders on first use.
+
+Werkzeug turns every rule into two URL builder functions (generating and
+compiling Python source) as soon as the rule is registered, which is most
+of the time the app takes to register its routes at startup. Matching
+requests does not need them, and most pages only build URLs for a few
+endpoints, so ``LazyBuildRule`` compiles each builder the first time
+``url_for`` asks for it.
+"""
+from werkzeug.routing import Rule
+
+
+class LazyBuildRule(Rule):
+    """A ``Rule`` whose URL builders are compiled when first called"""
+
+    def _compile_builder(self, append_unknown=True):
+        compile_builder = super()._compile_builder
+        name = '_build_unknown' if append_unknown else '_build'
+
+        def build(rule, *args, **kwargs):
+            builder = compile_builder(append_unknown).__get__(rule, None)
+            # Later calls go straight to the compiled builder
+            setattr(rule, name, builder)
+            return builder(*args, **kwargs)
+
+        return build
@@ -0,0 +1,107 @@
+"""Child-process entry point for running one submission.
+
+Reads ``{"code", "function", "cases"}`` as JSON on stdin, where each case is
+the argument list of one call, and writes one outcome per case as JSON:
+``{"output": ...}`` with what the function returned, ``{"repr": ...}`` if that
+is not JSON, or ``{"error": ...}`` if it raised. The expected values never
+reach this process: grader.py compares the outputs itself, so a submission
+that tampers with the runner or forges the results gains nothing.
+
+Outcomes go to the original stdout, moved to a spare descriptor before the
+submission runs; fd 1 then points at stderr. Each case runs the code in a
+fresh namespace. Resource limits and the empty working directory are set up
+by the parent (see grader.py); an audit hook installed here once the runner
+has loaded refuses process, network and any file access, the imports that
+would reach around it, and the frame and garbage collector introspection
+that would reach the runner itself.
+"""
+import io
+import json
+import os
+import sys
+import time
+import types
+
+# Loaded before the hook shuts off file access, so submissions can import them
+import bisect  # noqa: F401
+import collections  # noqa: F401
+import functools  # noqa: F401
+import heapq  # noqa: F401
+import itertools  # noqa: F401
+import math  # noqa: F401
+import operator  # noqa: F401
+import re  # noqa: F401
+import string  # noqa: F401
+import typing  # noqa: F401
+
+BLOCKED_EVENTS = {
+    'os.system', 'os.exec', 'os.fork', 'os.forkpty', 'os.posix_spawn', 'os.spawn', 'os.kill',
+    'os.killpg', 'os.putenv', 'os.unsetenv', 'os.remove', 'os.rename', 'os.rmdir', 'os.mkdir',
+    'os.chmod', 'os.chown', 'os.link', 'os.symlink', 'os.truncate', 'os.listdir', 'os.scandir',
+    'os.chdir', 'shutil.rmtree', 'subprocess.Popen', 'socket.__new__', 'socket.connect',
+    'socket.bind', 'ctypes.dlopen', 'sys._getframe', 'sys._current_frames', 'sys.settrace',
+    'sys.setprofile', 'gc.get_objects', 'gc.get_referrers', 'gc.get_referents',
+    # Restricted attributes: frames of tracebacks and generators lead back to the runner
+    'object.__getattr__',
+}
+# Built-in or extension modules giving processes, sockets or raw memory
+BLOCKED_MODULES = {'_posixsubprocess', 'subprocess', 'socket', '_socket', 'ctypes', '_ctypes'}
+# Longest repr of a value quoted back in a test's error
+MAX_REPR = 200
+
+
+def sandbox_hook(event, args):
+    if event in BLOCKED_EVENTS:
+        raise PermissionError(f'{event} is not allowed in submissions')
+    if event == 'open':
+        raise PermissionError('Opening files is not allowed in submissions')
+    if event == 'import' and args[0].partition('.')[0] in BLOCKED_MODULES:
+        raise PermissionError(f'Importing {args[0]} is not allowed in submissions')
+
+
+def clip(text, limit=MAX_REPR):
+    return text if len(text) <= limit else text[:limit] + '...'
+
+
+def run_case(code, function_name, args):
+    """Run the code in a fresh namespace and call the function once; returns its outcome"""
+    namespace = {'__name__': '__submission__'}
+    try:
+        exec(compile(code, '<submission>', 'exec'), namespace)
+        function = namespace[function_name]
+    except BaseException as e:
+        # Any failure while loading the code fails the test
+        return {'error': clip(f'{type(e).__name__}: {e}'), 'time_ms': 0.0}
+
+    start = time.perf_counter()
+    try:
+        output = function(*args)
+    except BaseException as e:
+        outcome = {'error': clip(f'{type(e).__name__}: {e}')}
+    else:
+        try:
+            outcome = {'output': json.loads(json.dumps(output))}
+        except BaseException:
+            try:
+                outcome = {'repr': clip(repr(output))}
+            except BaseException as e:
+                outcome = {'error': clip(f'{type(e).__name__} in repr(): {e}')}
+    outcome['time_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return outcome
+
+
+def main():
+    job = json.load(sys.stdin)
+    results_channel = os.fdopen(os.dup(1), 'w')
+    # The submission's writes to stdout, even to fd 1, cannot reach the outcomes
+    os.dup2(2, 1)
+    sys.stdout = io.StringIO()
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    sys.addaudithook(sandbox_hook)
+    outcomes = [run_case(job['code'], job['function'], args) for args in job['cases']]
+    results_channel.write(json.dumps(outcomes))
+    results_channel.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""Timed events on a hierarchical timer wheel.
+
+Questions open and close at set times, and a close kicks off batch grading
+and an analytics snapshot. Instead of polling every question for expiry,
+each deadline is a timer in a hierarchical timing wheel (Varghese & Lauck):
+``levels`` wheels of ``slots`` slots, where a slot of level ``n`` covers
+``slots ** n`` ticks. Scheduling and cancelling are O(1) dict operations.
+Each tick empties one level-0 slot, and every ``slots ** n`` ticks one slot
+of level ``n`` is re-placed a level or more down. A timer moves at most
+``levels - 1`` times before it fires, so the cost per timer is O(1)
+amortized whatever the number pending. Timers past the horizon
+(``slots ** levels`` ticks, 194 days at 64 slots, 4 levels and 1 s ticks)
+wait in the top level and are re-placed each time it turns.
+
+``Scheduler`` drives a wheel from a daemon thread against the wall clock
+and calls the handler registered for each timer's event, as ``JobQueue``
+does for jobs. Handlers run on that thread, so heavy work belongs on the
+job queue. Timers live in this process only: after a restart the app
+schedules them again from the records they belong to.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    """Timers keyed by any hashable, firing at integer ticks; not thread-safe"""
+
+    def __init__(self, tick=0, slots=64, levels=4):
+        if slots < 2 or slots & (slots - 1):
+            raise ValueError('slots must be a power of two')
+        self.bits = slots.bit_length() - 1
+        self.mask = slots - 1
+        self.levels = levels
+        self.horizon = 1 << (self.bits * levels)
+        # Last tick processed: timers due at or before it have fired
+        self.tick = tick
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        # key -> (level, slot dict holding it), so cancelling needs no search
+        self._slots = {}
+        # Timers per level, to skip the ticks where nothing can happen
+        self._counts = [0] * levels
+        self.stats = {'cascaded': 0}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def schedule(self, key, expires, value=None):
+        """Fire ``key`` at tick ``expires`` (the next tick if that has passed), replacing its earlier timer"""
+        self.cancel(key)
+        self._place(key, expires, value, self.tick + 1)
+
+    def cancel(self, key):
+        """Drop ``key``'s timer; returns False if it had none"""
+        found = self._slots.pop(key, None)
+        if found is None:
+            return False
+        level, slot = found
+        del slot[key]
+        self._counts[level] -= 1
+        return True
+
+    def _place(self, key, expires, value, earliest):
+        # The level whose slots are the finest that still reach the timer
+        target = min(max(expires, earliest), self.tick + self.horizon - 1)
+        delta, level = target - self.tick, 0
+        while delta >> (self.bits * (level + 1)):
+            level += 1
+        slot = self._wheels[level][(target >> (self.bits * level)) & self.mask]
+        slot[key] = (expires, value)
+        self._slots[key] = (level, slot)
+        self._counts[level] += 1
+
+    def advance(self, tick):
+        """Process every tick up to ``tick``; returns ``[(key, expires, value)]`` that fired"""
+        fired = []
+        while self.tick < tick:
+            if not self._slots:
+                # Nothing pending: skip the empty ticks
+                self.tick = tick
+                break
+            # Below the lowest level holding timers every slot is empty, so
+            # nothing happens before that level's next slot boundary
+            lowest = next(level for level, count in enumerate(self._counts) if count)
+            if lowest:
+                span = 1 << (self.bits * lowest)
+                idle_until = min(tick, (self.tick // span + 1) * span - 1)
+                if idle_until > self.tick:
+                    self.tick = idle_until
+                    continue
+            self.tick += 1
+            now = self.tick
+            # Higher levels first, so timers can fall through several levels at once
+            for level in range(self.levels - 1, 0, -1):
+                shift = self.bits * level
+                if now & ((1 << shift) - 1) == 0:
+                    self._cascade(level, (now >> shift) & self.mask)
+            wheel = self._wheels[0]
+            index = now & self.mask
+            slot = wheel[index]
+            if slot:
+                wheel[index] = {}
+                self._counts[0] -= len(slot)
+                for key, (expires, value) in slot.items():
+                    if expires > now:
+                        # Past the horizon of a one-level wheel: round again
+                        self._place(key, expires, value, now + 1)
+                        continue
+                    del self._slots[key]
+                    fired.append((key, expires, value))
+        return fired
+
+    def _cascade(self, level, index):
+        wheel = self._wheels[level]
+        slot = wheel[index]
+        if slot:
+            wheel[index] = {}
+            self._counts[level] -= len(slot)
+            self.stats['cascaded'] += len(slot)
+            for key, (expires, value) in slot.items():
+                # Timers due now go to the level-0 slot about to be emptied
+                self._place(key, expires, value, self.tick)
+
+
+class Scheduler:
+    """Named events fired at wall-clock times by a timer wheel on a background thread"""
+
+    def __init__(self, tick=1.0, slots=64, levels=4, clock=time.time):
+        self.tick = tick
+        self.clock = clock
+        self.wheel = TimerWheel(int(clock() // tick), slots, levels)
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        # Process the ticking thread was started in
+        self._pid = None
+        self._stopping = threading.Event()
+        self._counters = {'scheduled': 0, 'cancelled': 0, 'fired': 0, 'failed': 0}
+        self._late_ms = deque(maxlen=1000)
+
+    def register(self, name):
+        """Decorator registering the handler for events called ``name``"""
+        def decorator(func):
+            self._handlers[name] = func
+            return func
+        return decorator
+
+    def schedule(self, key, when, name, *args):
+        """Call ``name``'s handler with ``args`` at ``when`` (seconds since the epoch).
+
+        A timer fires at the first tick at or after ``when``, never early.
+        Scheduling a key again replaces its earlier timer.
+        """
+        if name not in self._handlers:
+            raise KeyError(f'No handler registered for event {name!r}')
+        with self._lock:
+            self.wheel.schedule(key, math.ceil(when / self.tick), (when, name, args))
+            self._counters['scheduled'] += 1
+
+    def cancel(self, key):
+        with self._lock:
+            cancelled = self.wheel.cancel(key)
+            self._counters['cancelled'] += cancelled
+        return cancelled
+
+    def run_due(self, now=None):
+        """Fire every timer due by ``now`` (default: the clock); returns how many fired"""
+        now = self.clock() if now is None else now
+        with self._lock:
+            fired = self.wheel.advance(int(now // self.tick))
+        for key, _, (when, name, args) in fired:
+            try:
+                self._handlers[name](*args)
+            except Exception:
+                logger.exception('Scheduled event %s (%r) failed', name, key)
+                failed = True
+            else:
+                failed = False
+            with self._lock:
+                self._counters['fired'] += 1
+                self._counters['failed'] += failed
+                self._late_ms.append(max(0.0, now - when) * 1000)
+        return len(fired)
+
+    def start(self):
+        """Start the ticking thread, unless it already runs in this process"""
+        with self._lock:
+            # A thread started before a fork is not alive in the child
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def ensure_started(self):
+        """Start the ticking thread once per process; afterwards a lock-free no-op"""
+        if self._pid != os.getpid():
+            self.start()
+
+    def shutdown(self, wait=True):
+        self._stopping.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+        self._thread = None
+        self._pid = None
+
+    def _run(self):
+        # Wake just after each tick boundary
+        while not self._stopping.wait(self.tick - self.clock() % self.tick + 0.001):
+            self.run_due()
+
+    def metrics(self):
+        """Pending timers, event counters and how late events fired"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending'] = len(self.wheel)
+            stats['cascaded'] = self.wheel.stats['cascaded']
+            late_ms = sorted(self._late_ms)
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        stats['tick_seconds'] = self.tick
+        stats['late_ms'] = {
+            'p50': late_ms[len(late_ms) // 2] if late_ms else None,
+            'p95': late_ms[int(len(late_ms) * 0.95)] if late_ms else None,
+            'max': late_ms[-1] if late_ms else None,
+        }
+        return stats
@@ -0,0 +1,174 @@
+"""Full-text search over questions, code shares and group messages.
+
+An in-memory inverted index maps each term to compact posting arrays of
+(document, term frequency) and is updated incrementally as records are
+written. Queries are ranked with BM25; a trailing ``*`` on a query word
+matches every indexed term with that prefix.
+"""
+import heapq
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from itertools import islice, takewhile
+
+TOKEN_RE = re.compile(r'[A-Za-z0-9]+')
+CAMEL_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+')
+STOPWORDS = frozenset('a an and are as at be by for from in is it of on or that the this to with'.split())
+
+# Per-field weights: a title match counts more than a body match
+FIELD_WEIGHTS = {'title': 3, 'description': 1, 'code': 1, 'content': 1}
+
+
+def tokenize(text):
+    """Lowercase word tokens, also splitting camelCase and snake_case identifiers"""
+    tokens = []
+    for word in TOKEN_RE.findall(text or ''):
+        parts = CAMEL_RE.findall(word)
+        lowered = word.lower()
+        if lowered not in STOPWORDS:
+            tokens.append(lowered)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts if part.lower() not in STOPWORDS)
+    return tokens
+
+
+def _fold(value):
+    # Filter values match case-insensitively ('Easy' == 'easy')
+    return value.lower() if isinstance(value, str) else value
+
+
+class SearchIndex:
+    """Incrementally updated inverted index with BM25 ranking"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}       # term -> (array of doc numbers, array of term frequencies)
+        self._terms = []          # sorted vocabulary for prefix expansion
+        self._docs = []           # doc number -> (kind, record id, filter attributes)
+        self._lengths = array('I')
+        self._doc_numbers = {}    # (kind, record id) -> live doc number
+        self._deleted = set()
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._doc_numbers)
+
+    def add(self, kind, record_id, fields, **filters):
+        """Index (or re-index) one record; ``fields`` maps field name to text"""
+        frequencies = {}
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1)
+            for token in tokenize(text):
+                frequencies[token] = frequencies.get(token, 0) + weight
+        length = sum(frequencies.values())
+        filters = {key: _fold(value) for key, value in filters.items()}
+
+        with self._lock:
+            self._remove_locked(kind, record_id)
+            doc = len(self._docs)
+            self._docs.append((kind, record_id, filters))
+            self._lengths.append(length)
+            self._doc_numbers[(kind, record_id)] = doc
+            self._total_length += length
+            for term, tf in frequencies.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = self._postings[term] = (array('I'), array('I'))
+                    insort(self._terms, term)
+                posting[0].append(doc)
+                posting[1].append(tf)
+
+    def remove(self, kind, record_id):
+        with self._lock:
+            self._remove_locked(kind, record_id)
+
+    def _remove_locked(self, kind, record_id):
+        # Postings are append-only; removed documents are skipped at query time
+        doc = self._doc_numbers.pop((kind, record_id), None)
+        if doc is not None:
+            self._deleted.add(doc)
+            self._total_length -= self._lengths[doc]
+
+    def _expand(self, word):
+        """Index terms matching a query word (prefix match when it ends in ``*``)"""
+        if not word.endswith('*'):
+            return [word] if word in self._postings else []
+        prefix = word[:-1].lower()
+        if not prefix:
+            return []
+        start = bisect_left(self._terms, prefix)
+        return list(takewhile(lambda term: term.startswith(prefix), islice(self._terms, start, None)))
+
+    def search(self, query, limit=20, kind=None, **filters):
+        """Top ``limit`` hits as ``{'kind', 'id', 'score'}`` dicts, best first"""
+        words = []
+        for raw in query.split():
+            if raw.endswith('*'):
+                words.append(raw.lower())
+            else:
+                words.extend(tokenize(raw))
+
+        with self._lock:
+            live = len(self._doc_numbers)
+            if not live or not words:
+                return []
+            # Length normalisation k1 * (1 - b + b * length / average), split into two constants
+            base = self.k1 * (1 - self.b)
+            slope = self.k1 * self.b * live / max(self._total_length, 1)
+            lengths, deleted = self._lengths, self._deleted
+            scores = {}
+            for word in words:
+                for term in self._expand(word):
+                    docs, tfs = self._postings[term]
+                    df = len(docs)
+                    weight = math.log(1 + (live - df + 0.5) / (df + 0.5)) * (self.k1 + 1)
+                    for doc, tf in zip(docs, tfs):
+                        if deleted and doc in deleted:
+                            continue
+                        scores[doc] = scores.get(doc, 0.0) + weight * tf / (tf + base + slope * lengths[doc])
+
+            filters = {key: _fold(value) for key, value in filters.items()}
+            if kind is not None or filters:
+                scores = {doc: score for doc, score in scores.items() if self._matches(doc, kind, filters)}
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [{'kind': self._docs[doc][0], 'id': self._docs[doc][1], 'score': round(score, 4)}
+                    for doc, score in best]
+
+    def _matches(self, doc, kind, filters):
+        doc_kind, _, attributes = self._docs[doc]
+        if kind is not None and doc_kind != kind:
+            return False
+        return all(attributes.get(key) == value for key, value in filters.items())
+
+
+def index_question(index, question):
+    index.add('question', question['id'],
+              {'title': question['title'], 'description': question['description']},
+              difficulty=question['difficulty'], type=question['type'])
+
+
+def index_share(index, share):
+    index.add('code_share', share['id'],
+              {'title': share['title'], 'description': share['description'], 'code': share['code']},
+              help_needed=bool(share['help_needed']))
+
+
+def index_message(index, message):
+    index.add('group_message', message['id'], {'content': message['content']}, group_id=message['group_id'])
+
+
+def build_index(store):
+    """Index every question, code share and group message already in ``store``"""
+    index = SearchIndex()
+    for question in store.iter_questions():
+        index_question(index, question)
+    for share in store.iter_shares():
+        index_share(index, share)
+    for group in store.all_groups():
+        for message in store.messages_for_group(group['id']):
+            index_message(index, message)
+    return index
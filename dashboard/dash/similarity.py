@@ -0,0 +1,179 @@
+"""Near-duplicate detection for submitted answers and shared code.
+
+Code is normalised to a token stream in which identifiers, numbers and
+strings collapse to placeholders and comments disappear, so renaming
+variables or reformatting does not hide a copy. Prose (answers to interview
+questions) keeps its lower-cased words instead: abstracted the same way,
+any two English answers would look alike. Overlapping token shingles
+are hashed into a one-permutation MinHash signature, and an LSH band table
+turns each new signature into a handful of candidates instead of a scan of
+every earlier answer.
+"""
+import re
+import threading
+import zlib
+from collections import defaultdict
+
+COMMENT_RE = re.compile(r'#[^\n]*|//[^\n]*|/\*.*?\*/', re.S)
+TOKEN_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|[A-Za-z_]\w*|\d+(?:\.\d+)?|\S')
+WORD_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+KEYWORDS = frozenset('''
+    and as assert break class continue def del elif else except finally for from global if import in
+    is lambda nonlocal not or pass raise return try while with yield None True False self print len
+    range int str list dict set append
+    function var let const new this null true false switch case public private static void
+'''.split())
+
+MAX_HASH = 0xFFFFFFFF
+
+
+def normalize(code):
+    """Token stream with identifiers, literals and comments abstracted away"""
+    tokens = []
+    for token in TOKEN_RE.findall(COMMENT_RE.sub(' ', code or '')):
+        if token in KEYWORDS:
+            tokens.append(token)
+        elif token[0] in '"\'':
+            tokens.append('S')
+        elif token[0].isdigit():
+            tokens.append('N')
+        elif token[0].isalpha() or token[0] == '_':
+            tokens.append('V')
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def words(text):
+    """Lower-cased words of a prose answer"""
+    return WORD_RE.findall((text or '').lower())
+
+
+class SimilarityIndex:
+    """MinHash signatures in an LSH band table, updated one answer at a time"""
+
+    def __init__(self, shingle=8, word_shingle=3, bins=64, bands=16, threshold=0.5, min_tokens=16):
+        if bins % bands:
+            raise ValueError('bins must be a multiple of bands')
+        self.shingle = shingle
+        self.word_shingle = word_shingle
+        self.bins = bins
+        self.bands = bands
+        self.rows = bins // bands
+        self.threshold = threshold
+        self.min_tokens = min_tokens
+        self._signatures = {}                  # (kind, id) -> (signature, scope, owner)
+        # Per band: (scope, band values) -> record keys, and band values -> scopes present
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+        self._scopes = [defaultdict(set) for _ in range(bands)]
+        self._matches = defaultdict(dict)      # (kind, id) -> {(kind, id): score}
+        self._lock = threading.Lock()
+        self.stats = {'indexed': 0, 'skipped': 0, 'candidates': 0, 'matches': 0}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def signature(self, code, prose=False):
+        """One-permutation MinHash of the code's (or prose's) shingles, or None if too short"""
+        tokens = words(code) if prose else normalize(code)
+        if len(tokens) < self.min_tokens:
+            return None
+        shingle = self.word_shingle if prose else self.shingle
+        bins = self.bins
+        width = MAX_HASH // bins + 1
+        minima = [None] * bins
+        for start in range(len(tokens) - shingle + 1):
+            value = zlib.crc32(' '.join(tokens[start:start + shingle]).encode())
+            slot, offset = divmod(value, width)
+            if minima[slot] is None or offset < minima[slot]:
+                minima[slot] = offset
+        # Densify: an empty bin borrows from the next non-empty one, offset by the distance
+        signature = list(minima)
+        for i, value in enumerate(minima):
+            if value is None:
+                for distance in range(1, bins):
+                    borrowed = minima[(i + distance) % bins]
+                    if borrowed is not None:
+                        signature[i] = borrowed + distance * width
+                        break
+        return tuple(signature)
+
+    @staticmethod
+    def estimate(first, second):
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(a == b for a, b in zip(first, second)) / len(first)
+
+    def add(self, kind, record_id, code, scope=None, owner=None, prose=False):
+        """Index one answer and return its matches above the threshold, best first.
+
+        Records with a ``scope`` (e.g. a question id) only match records with the
+        same scope or none; records of the same ``owner`` never match each other.
+        """
+        signature = self.signature(code, prose)
+        key = (kind, record_id)
+        with self._lock:
+            if signature is None:
+                self.stats['skipped'] += 1
+                return []
+            candidates = set()
+            for band in range(self.bands):
+                values = signature[band * self.rows:(band + 1) * self.rows]
+                buckets, scopes = self._buckets[band], self._scopes[band]
+                # Scoped records only meet their own scope and unscoped ones; unscoped meet all
+                for other_scope in (scopes[values] if scope is None else (scope, None)):
+                    candidates.update(buckets.get((other_scope, values), ()))
+                buckets[(scope, values)].append(key)
+                scopes[values].add(scope)
+            self._signatures[key] = (signature, scope, owner)
+            self.stats['indexed'] += 1
+            self.stats['candidates'] += len(candidates)
+
+            for other in candidates:
+                other_signature, _, other_owner = self._signatures[other]
+                if other == key or (owner is not None and owner == other_owner):
+                    continue
+                score = self.estimate(signature, other_signature)
+                if score >= self.threshold:
+                    self._matches[key][other] = score
+                    self._matches[other][key] = score
+                    self.stats['matches'] += 1
+            return self._sorted(key)
+
+    def matches(self, kind, record_id):
+        """Recorded matches of one record as ``[(kind, id, score)]``, best first"""
+        with self._lock:
+            return self._sorted((kind, record_id))
+
+    def _sorted(self, key):
+        found = self._matches.get(key, {})
+        return [(kind, record_id, round(score, 3))
+                for (kind, record_id), score in sorted(found.items(), key=lambda item: -item[1])]
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['buckets'] = sum(len(buckets) for buckets in self._buckets)
+            stats['flagged'] = len(self._matches)
+        return stats
+
+
+def fingerprint_submission(index, submission, question):
+    """Index an answer: as code for coding questions, as prose for the others"""
+    return index.add('submission', submission['id'], submission['answer'],
+                     scope=submission['question_id'], owner=submission['student_id'],
+                     prose=question.get('type') != 'coding')
+
+
+def fingerprint_share(index, share):
+    return index.add('code_share', share['id'], share['code'], owner=share['student_id'])
+
+
+def build_similarity_index(store):
+    """Fingerprint every submission and code share already in ``store``"""
+    index = SimilarityIndex()
+    for share in store.iter_shares():
+        fingerprint_share(index, share)
+    for question in store.iter_questions():
+        for submission in store.submissions_for_question(question['id']):
+            fingerprint_submission(index, submission, question)
+    return index
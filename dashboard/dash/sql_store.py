@@ -0,0 +1,825 @@
+"""SQLAlchemy persistence backend for the dashboard.
+
+``SqlStore`` exposes the same interface as ``store.DataStore`` but keeps every
+record in a relational database, so data and ids survive restarts and can be
+shared with other processes (the ``flask import`` commands, say). Select it
+with ``DATA_BACKEND=sql`` and point ``DATABASE_URL`` at SQLite
+(local/testing) or PostgreSQL.
+
+Ids come from the database, and write races between threads or processes
+are settled by its constraints: each check-then-write below attempts the write
+and treats a unique-constraint violation as the answer.
+
+Several gunicorn workers can serve from one database: besides the records it
+holds the job status records and the change feed the workers use to keep
+their in-memory indexes in step (see changes.py).
+
+The analytics counters (submissions, feedback and score sum per student and
+overall) are rows of their own, updated in the same transaction as the
+writes they count, so dashboards read them instead of grouping every
+submission.
+"""
+import time
+from collections import defaultdict
+
+from sqlalchemy import (JSON, Boolean, Column, Float, ForeignKey, Index, Integer, MetaData, String, Table,
+                        Text, and_, bindparam, create_engine, delete, event, func, insert, literal, or_, select,
+                        text, update)
+from sqlalchemy.exc import IntegrityError
+
+metadata = MetaData()
+
+students = Table(
+    'students', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(120), nullable=False),
+    Column('email', String(255), nullable=False, unique=True),
+)
+
+questions = Table(
+    'questions', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('type', String(20), nullable=False),
+    Column('title', String(255), nullable=False),
+    Column('description', Text, nullable=False),
+    Column('difficulty', String(20), nullable=False),
+    Column('created_at', String(19), nullable=False),
+    Column('assigned_to', String(20), nullable=False, default='all'),
+    Column('tests', JSON),
+    # Submission window (open when unset) and when the close-out work ran
+    Column('opens_at', String(19)),
+    Column('closes_at', String(19)),
+    Column('closed_at', String(19)),
+    Column('close_summary', JSON),
+)
+
+submissions = Table(
+    'submissions', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('student_id', Integer, ForeignKey('students.id'), nullable=False),
+    Column('question_id', Integer, ForeignKey('questions.id'), nullable=False),
+    Column('answer', Text, nullable=False),
+    Column('submitted_at', String(19), nullable=False),
+    Index('ix_submissions_student_question', 'student_id', 'question_id', unique=True),
+    Index('ix_submissions_question', 'question_id'),
+)
+
+feedback = Table(
+    'feedback', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('submission_id', Integer, ForeignKey('submissions.id'), nullable=False, unique=True),
+    Column('student_id', Integer, ForeignKey('students.id'), nullable=False, index=True),
+    Column('question_id', Integer, ForeignKey('questions.id'), nullable=False),
+    Column('feedback', Text, nullable=False),
+    Column('score', Integer, nullable=False),
+    Column('test_results', JSON),
+    Column('created_at', String(19), nullable=False),
+)
+
+study_groups = Table(
+    'study_groups', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(255), nullable=False),
+    Column('description', Text, nullable=False),
+    Column('created_by', Integer, ForeignKey('students.id'), nullable=False),
+    Column('created_at', String(19), nullable=False),
+    Column('active', Boolean, nullable=False, default=True),
+)
+
+group_members = Table(
+    'group_members', metadata,
+    Column('group_id', Integer, ForeignKey('study_groups.id'), primary_key=True),
+    Column('student_id', Integer, ForeignKey('students.id'), primary_key=True),
+    Index('ix_group_members_student', 'student_id'),
+)
+
+pair_sessions = Table(
+    'pair_sessions', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('student1_id', Integer, ForeignKey('students.id'), nullable=False, index=True),
+    Column('student2_id', Integer, ForeignKey('students.id'), nullable=False, index=True),
+    Column('problem_title', String(255), nullable=False),
+    Column('code', Text, nullable=False),
+    Column('started_at', String(19), nullable=False),
+    Column('active', Boolean, nullable=False, default=True),
+    # Bumped by every accepted pair edit; writes are conditional on it
+    Column('version', Integer, nullable=False, default=0),
+)
+
+code_shares = Table(
+    'code_shares', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('student_id', Integer, ForeignKey('students.id'), nullable=False, index=True),
+    Column('title', String(255), nullable=False),
+    Column('code', Text, nullable=False),
+    Column('description', Text, nullable=False, default=''),
+    Column('help_needed', Boolean, nullable=False, default=False),
+    Column('created_at', String(19), nullable=False),
+    Column('comments', JSON, nullable=False, default=list),
+)
+
+group_messages = Table(
+    'group_messages', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('group_id', Integer, ForeignKey('study_groups.id'), nullable=False),
+    Column('student_id', Integer, ForeignKey('students.id'), nullable=False),
+    Column('content', Text, nullable=False),
+    Column('created_at', String(19), nullable=False),
+    Index('ix_group_messages_group', 'group_id', 'id'),
+)
+
+# Running analytics counters: one row per student, and the totals in row 1 of stat_totals
+STAT_COLUMNS = ('submissions', 'feedback', 'score_sum')
+
+student_stats = Table(
+    'student_stats', metadata,
+    Column('student_id', Integer, ForeignKey('students.id'), primary_key=True),
+    *(Column(name, Integer, nullable=False, default=0) for name in STAT_COLUMNS),
+)
+
+stat_totals = Table(
+    'stat_totals', metadata,
+    Column('id', Integer, primary_key=True),
+    *(Column(name, Integer, nullable=False, default=0) for name in STAT_COLUMNS),
+)
+
+# Changes each process made to its in-memory state, for the others to apply
+# (see changes.py). Ids are never reused, even once the oldest are pruned
+changes = Table(
+    'changes', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('origin', String(32), nullable=False),
+    Column('kind', String(40), nullable=False),
+    Column('payload', JSON, nullable=False),
+    Column('created_at', Float, nullable=False, index=True),
+    sqlite_autoincrement=True,
+)
+
+# Background job status records, readable by every worker (see jobs.py)
+jobs = Table(
+    'jobs', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('state', String(20), nullable=False),
+    Column('record', JSON, nullable=False),
+    sqlite_autoincrement=True,
+)
+
+TABLES = {
+    'students': students,
+    'questions': questions,
+    'submissions': submissions,
+    'feedback': feedback,
+    'study_groups': study_groups,
+    'pair_sessions': pair_sessions,
+    'code_shares': code_shares,
+    'group_messages': group_messages,
+}
+
+# Foreign-key order for bulk loads
+LOAD_ORDER = ('students', 'questions', 'submissions', 'feedback', 'study_groups',
+              'pair_sessions', 'code_shares', 'group_messages')
+
+
+def _enable_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+class SqlStore:
+    """Relational repository with the same interface as ``DataStore``"""
+
+    def __init__(self, url, pool_size=5, max_overflow=10, batch_size=5000, write_retries=3, echo=False):
+        engine_options = {'echo': echo, 'future': True}
+        if url.startswith('sqlite'):
+            self.engine = create_engine(url, **engine_options)
+            event.listen(self.engine, 'connect', _enable_sqlite_pragmas)
+        else:
+            self.engine = create_engine(url, pool_size=pool_size, max_overflow=max_overflow,
+                                        pool_pre_ping=True, **engine_options)
+        self.batch_size = batch_size
+        self.write_retries = write_retries
+        metadata.create_all(self.engine)
+        if self._scalar(select(stat_totals.c.id)) is None:
+            self._rebuild_stats()
+
+    # Generic helpers
+
+    def _one(self, query):
+        with self.engine.connect() as conn:
+            row = conn.execute(query).mappings().first()
+        return dict(row) if row else None
+
+    def _all(self, query):
+        with self.engine.connect() as conn:
+            return [dict(row) for row in conn.execute(query).mappings()]
+
+    def _iter(self, query):
+        """Stream rows as dicts without materialising the whole result"""
+        with self.engine.connect() as conn:
+            for row in conn.execution_options(yield_per=500).execute(query).mappings():
+                yield dict(row)
+
+    @staticmethod
+    def _page(query, id_column, after=None, limit=None):
+        """Apply a keyset cursor (ids after ``after``) and page size to ``query``"""
+        if after is not None:
+            query = query.where(id_column > after)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.order_by(id_column)
+
+    def _all_scalars(self, query):
+        with self.engine.connect() as conn:
+            return conn.execute(query).scalars().all()
+
+    def _scalar(self, query):
+        with self.engine.connect() as conn:
+            return conn.execute(query).scalar()
+
+    def _insert(self, table, record):
+        values = {key: value for key, value in record.items() if key in table.c}
+        with self.engine.begin() as conn:
+            record['id'] = conn.execute(insert(table).values(**values)).inserted_primary_key[0]
+            self._count_inserted(conn, table, [record])
+        return record
+
+    def next_id(self, table):
+        """Peek at the id the next insert into ``table`` will receive"""
+        return (self._scalar(select(func.max(TABLES[table].c.id))) or 0) + 1
+
+    def load(self, **tables):
+        """Bulk-load records with batched executemany inserts in a single transaction"""
+        deltas = defaultdict(self._empty_stats)
+        with self.engine.begin() as conn:
+            for name in LOAD_ORDER:
+                records = tables.get(name)
+                if not records:
+                    continue
+                table = TABLES[name]
+                members = []
+                batch = []
+                for record in records:
+                    # executemany needs the same keys in every row: fill optional columns
+                    batch.append({column.name: record.get(column.name) for column in table.c
+                                  if column.name in record or column.nullable})
+                    if name == 'study_groups':
+                        members.extend({'group_id': record['id'], 'student_id': member_id}
+                                       for member_id in record['members'])
+                    elif name == 'submissions':
+                        deltas[record['student_id']]['submissions'] += 1
+                    elif name == 'feedback':
+                        deltas[record['student_id']]['feedback'] += 1
+                        deltas[record['student_id']]['score_sum'] += record['score']
+                    if len(batch) >= self.batch_size:
+                        conn.execute(insert(table), batch)
+                        batch = []
+                if batch:
+                    conn.execute(insert(table), batch)
+                if members:
+                    conn.execute(insert(group_members), members)
+                if name == 'students':
+                    self._count_inserted(conn, students, records)
+            self._apply_deltas(conn, deltas)
+            self._advance_sequences(conn, [name for name in LOAD_ORDER if tables.get(name)])
+
+    @staticmethod
+    def _advance_sequences(conn, names):
+        """Move PostgreSQL id sequences past ids that were inserted explicitly.
+
+        Loaded records carry their own ids, which a SERIAL sequence does not
+        see: without this the next insert would be given an id already taken.
+        SQLite picks the next id from the table itself.
+        """
+        if conn.dialect.name != 'postgresql':
+            return
+        for name in names:
+            conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                              f"coalesce(max(id), 1), max(id) IS NOT NULL) FROM {name}"))
+
+    def add_many(self, table, records):
+        """Insert a batch of records (students or questions) in one statement.
+
+        Returns the records skipped because they clash with a unique key,
+        i.e. students whose email is already registered. Only when the batch
+        hits such a clash are its rows retried one at a time to find them.
+        """
+        if not records:
+            return []
+        table = TABLES[table]
+        rows = [{column.name: record.get(column.name) for column in table.c
+                 if column.name in record or column.nullable} for record in records]
+        try:
+            with self.engine.begin() as conn:
+                ids = conn.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True),
+                                   rows).scalars().all()
+                for record, record_id in zip(records, ids):
+                    record['id'] = record_id
+                self._count_inserted(conn, table, records)
+        except IntegrityError:
+            skipped = []
+            for record in records:
+                try:
+                    self._insert(table, record)
+                except IntegrityError:
+                    skipped.append(record)
+            return skipped
+        return []
+
+    # Students
+
+    def add_student(self, student):
+        return self._insert(students, student)
+
+    def get_student(self, student_id):
+        return self._one(select(students).where(students.c.id == student_id))
+
+    def all_students(self):
+        return self._all(select(students).order_by(students.c.id))
+
+    def iter_students(self):
+        """Every student, oldest first, streamed"""
+        return self._iter(select(students).order_by(students.c.id))
+
+    def registered_emails(self, emails):
+        """The subset of ``emails`` that already belong to a student"""
+        return set(self._all_scalars(select(students.c.email).where(students.c.email.in_(list(emails)))))
+
+    def count_students(self):
+        return self._scalar(select(func.count()).select_from(students))
+
+    def student_name(self, student_id):
+        name = self._scalar(select(students.c.name).where(students.c.id == student_id))
+        return name or 'Unknown'
+
+    # Questions
+
+    def add_question(self, question):
+        return self._insert(questions, question)
+
+    def get_question(self, question_id):
+        return self._one(select(questions).where(questions.c.id == question_id))
+
+    def all_questions(self):
+        return self._all(select(questions).order_by(questions.c.id))
+
+    def iter_questions(self, after=None, limit=None):
+        return self._iter(self._page(select(questions), questions.c.id, after, limit))
+
+    def count_questions(self):
+        return self._scalar(select(func.count()).select_from(questions))
+
+    def update_question(self, question_id, fields):
+        """Set ``fields`` on a question; returns the updated question or None"""
+        with self.engine.begin() as conn:
+            result = conn.execute(update(questions).where(questions.c.id == question_id).values(**fields))
+        return self.get_question(question_id) if result.rowcount else None
+
+    def close_question(self, question_id, closed_at):
+        """Record that a question's submission window has closed.
+
+        Returns False if it was already claimed (or is unknown): only one
+        process's conditional update matches, so one starts the close-out work.
+        """
+        with self.engine.begin() as conn:
+            result = conn.execute(update(questions)
+                                  .where(questions.c.id == question_id, questions.c.closed_at.is_(None))
+                                  .values(closed_at=closed_at))
+        return result.rowcount > 0
+
+    def pending_windows(self, now):
+        """Questions whose window opens after ``now`` or whose close has not finished yet"""
+        return self._all(select(questions)
+                         .where(or_(questions.c.opens_at > now,
+                                    and_(questions.c.closes_at.is_not(None),
+                                         or_(questions.c.close_summary.is_(None),
+                                             questions.c.close_summary == JSON.NULL))))
+                         .order_by(questions.c.id))
+
+    # Submissions
+
+    def add_submission(self, submission):
+        return self._insert(submissions, submission)
+
+    def add_submission_if_new(self, submission):
+        """Add a submission unless the student already answered the question.
+
+        Returns False for a repeat; the unique (student, question) index
+        makes the check and the insert atomic.
+        """
+        try:
+            self._insert(submissions, submission)
+        except IntegrityError:
+            if self.find_submission(submission['student_id'], submission['question_id']) is None:
+                raise
+            return False
+        return True
+
+    def get_submission(self, submission_id):
+        return self._one(select(submissions).where(submissions.c.id == submission_id))
+
+    def find_submission(self, student_id, question_id):
+        """Return the submission a student made for a question, if any"""
+        return self._one(select(submissions).where(submissions.c.student_id == student_id,
+                                                   submissions.c.question_id == question_id))
+
+    def iter_submissions(self):
+        """Every submission, oldest first, streamed"""
+        return self._iter(select(submissions).order_by(submissions.c.id))
+
+    def submissions_for_student(self, student_id):
+        return self._all(select(submissions).where(submissions.c.student_id == student_id)
+                         .order_by(submissions.c.id))
+
+    def submissions_for_question(self, question_id):
+        return self._all(select(submissions).where(submissions.c.question_id == question_id)
+                         .order_by(submissions.c.id))
+
+    def _with_feedback(self, query):
+        """Stream a submission join query whose feedback columns are prefixed ``fb_``"""
+        for row in self._iter(query):
+            fb = {key[3:]: row.pop(key) for key in list(row) if key.startswith('fb_')}
+            row['feedback'] = fb if fb['id'] is not None else None
+            yield row
+
+    def _feedback_columns(self):
+        return [column.label(f'fb_{column.name}') for column in feedback.c]
+
+    def submission_details_for_question(self, question_id, after=None, limit=None):
+        """Submissions for a question joined with student name and feedback in one query"""
+        query = (select(submissions, students.c.name.label('student_name'), *self._feedback_columns())
+                 .select_from(submissions
+                              .outerjoin(students, students.c.id == submissions.c.student_id)
+                              .outerjoin(feedback, feedback.c.submission_id == submissions.c.id))
+                 .where(submissions.c.question_id == question_id))
+        for row in self._with_feedback(self._page(query, submissions.c.id, after, limit)):
+            row['student_name'] = row['student_name'] or 'Unknown'
+            yield row
+
+    def submission_details_for_student(self, student_id, after=None, limit=None):
+        """Submissions by a student joined with question title/type and feedback in one query"""
+        query = (select(submissions, questions.c.title.label('question_title'),
+                        questions.c.type.label('question_type'), *self._feedback_columns())
+                 .select_from(submissions
+                              .outerjoin(questions, questions.c.id == submissions.c.question_id)
+                              .outerjoin(feedback, feedback.c.submission_id == submissions.c.id))
+                 .where(submissions.c.student_id == student_id))
+        for row in self._with_feedback(self._page(query, submissions.c.id, after, limit)):
+            row['question_title'] = row['question_title'] or 'Unknown'
+            row['question_type'] = row['question_type'] or 'Unknown'
+            yield row
+
+    def iter_grades(self, question_id=None):
+        """Every submission (or a question's) joined with student, question title and feedback in one query"""
+        query = (select(submissions, students.c.name.label('student_name'),
+                        students.c.email.label('student_email'),
+                        questions.c.title.label('question_title'), *self._feedback_columns())
+                 .select_from(submissions
+                              .outerjoin(students, students.c.id == submissions.c.student_id)
+                              .outerjoin(questions, questions.c.id == submissions.c.question_id)
+                              .outerjoin(feedback, feedback.c.submission_id == submissions.c.id))
+                 .order_by(submissions.c.id))
+        if question_id is not None:
+            query = query.where(submissions.c.question_id == question_id)
+        for row in self._with_feedback(query):
+            row['student_name'] = row['student_name'] or 'Unknown'
+            row['question_title'] = row['question_title'] or 'Unknown'
+            yield row
+
+    def question_status(self, student_id):
+        """Question id -> ``{submission_id, feedback_id, score}`` for every question the student answered"""
+        query = (select(submissions.c.question_id, submissions.c.id.label('submission_id'),
+                        feedback.c.id.label('feedback_id'), feedback.c.score)
+                 .select_from(submissions.outerjoin(feedback, feedback.c.submission_id == submissions.c.id))
+                 .where(submissions.c.student_id == student_id))
+        return {row.pop('question_id'): row for row in self._all(query)}
+
+    def count_submissions(self, student_id=None, question_id=None):
+        query = select(func.count()).select_from(submissions)
+        if student_id is not None:
+            query = query.where(submissions.c.student_id == student_id)
+        if question_id is not None:
+            query = query.where(submissions.c.question_id == question_id)
+        return self._scalar(query)
+
+    # Feedback
+
+    def set_feedback(self, new_feedback):
+        """Store feedback for a submission, replacing any earlier feedback for it"""
+        values = {key: value for key, value in new_feedback.items() if key in feedback.c}
+        for attempt in range(self.write_retries):
+            try:
+                with self.engine.begin() as conn:
+                    replaced = conn.execute(delete(feedback)
+                                            .where(feedback.c.submission_id == new_feedback['submission_id'])
+                                            .returning(feedback.c.student_id, feedback.c.score)).all()
+                    new_feedback['id'] = conn.execute(insert(feedback).values(**values)).inserted_primary_key[0]
+                    for student_id, score in replaced:
+                        self._count(conn, student_id, feedback=-1, score_sum=-score)
+                    self._count(conn, new_feedback['student_id'], feedback=1, score_sum=new_feedback['score'])
+                return new_feedback
+            except IntegrityError:
+                # A concurrent writer inserted feedback for the same submission
+                # between our delete and insert: replace theirs on the next try
+                if attempt == self.write_retries - 1:
+                    raise
+
+    def feedback_for_submission(self, submission_id):
+        return self._one(select(feedback).where(feedback.c.submission_id == submission_id))
+
+    def iter_feedback(self):
+        """Every feedback record, streamed"""
+        return self._iter(select(feedback).order_by(feedback.c.id))
+
+    def feedback_for_student(self, student_id):
+        return self._all(select(feedback).where(feedback.c.student_id == student_id)
+                         .order_by(feedback.c.id))
+
+    def count_feedback(self, student_id=None):
+        query = select(func.count()).select_from(feedback)
+        if student_id is not None:
+            query = query.where(feedback.c.student_id == student_id)
+        return self._scalar(query)
+
+    # Analytics aggregates (counter rows kept in step with every write)
+
+    @staticmethod
+    def _empty_stats():
+        return {'submissions': 0, 'feedback': 0, 'score_sum': 0}
+
+    def _count(self, conn, student_id, **deltas):
+        """Add ``deltas`` to a student's counters and the totals, in ``conn``'s transaction"""
+        result = conn.execute(update(student_stats).where(student_stats.c.student_id == student_id)
+                              .values({name: student_stats.c[name] + delta for name, delta in deltas.items()}))
+        if not result.rowcount:
+            conn.execute(insert(student_stats).values(student_id=student_id, **dict(self._empty_stats(), **deltas)))
+        conn.execute(update(stat_totals).where(stat_totals.c.id == 1)
+                     .values({name: stat_totals.c[name] + delta for name, delta in deltas.items()}))
+
+    def _count_inserted(self, conn, table, records):
+        """Count rows just inserted into ``table`` (students start at zero)"""
+        if table is students:
+            conn.execute(insert(student_stats),
+                         [dict(self._empty_stats(), student_id=record['id']) for record in records])
+        elif table is submissions:
+            for record in records:
+                self._count(conn, record['student_id'], submissions=1)
+
+    def _apply_deltas(self, conn, deltas):
+        """Add per-student counter ``deltas`` (a bulk load's) in batched updates"""
+        if not deltas:
+            return
+        conn.execute(update(student_stats).where(student_stats.c.student_id == bindparam('sid'))
+                     .values({name: student_stats.c[name] + bindparam(f'd_{name}') for name in STAT_COLUMNS}),
+                     [dict({f'd_{name}': value for name, value in stats.items()}, sid=student_id)
+                      for student_id, stats in deltas.items()])
+        total = {name: sum(stats[name] for stats in deltas.values()) for name in STAT_COLUMNS}
+        conn.execute(update(stat_totals).where(stat_totals.c.id == 1)
+                     .values({name: stat_totals.c[name] + total[name] for name in STAT_COLUMNS}))
+
+    def _recount(self):
+        """Every student's counters computed from scratch with grouped queries"""
+        submission_counts = (select(submissions.c.student_id, func.count().label('submissions'))
+                             .group_by(submissions.c.student_id).subquery())
+        feedback_counts = (select(feedback.c.student_id, func.count().label('feedback'),
+                                  func.sum(feedback.c.score).label('score_sum'))
+                           .group_by(feedback.c.student_id).subquery())
+        return (select(students.c.id.label('student_id'),
+                       *(func.coalesce(counts.c[name], 0).label(name)
+                         for counts, name in ((submission_counts, 'submissions'), (feedback_counts, 'feedback'),
+                                              (feedback_counts, 'score_sum'))))
+                .select_from(students
+                             .outerjoin(submission_counts, submission_counts.c.student_id == students.c.id)
+                             .outerjoin(feedback_counts, feedback_counts.c.student_id == students.c.id)))
+
+    def _rebuild_stats(self):
+        """Fill the counter rows from a recount, for a database created before they existed"""
+        recount = self._recount().subquery()
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(delete(student_stats))
+                conn.execute(insert(student_stats).from_select(['student_id', *STAT_COLUMNS], select(recount)))
+                conn.execute(insert(stat_totals).from_select(
+                    ['id', *STAT_COLUMNS],
+                    select(literal(1), *(func.coalesce(func.sum(recount.c[name]), 0) for name in STAT_COLUMNS))))
+        except IntegrityError:
+            # Another worker starting at the same time rebuilt them first
+            pass
+
+    def student_stats(self, student_id):
+        row = self._one(select(*(student_stats.c[name] for name in STAT_COLUMNS))
+                        .where(student_stats.c.student_id == student_id))
+        return row or self._empty_stats()
+
+    def all_student_stats(self):
+        query = (select(students.c.id, *(func.coalesce(student_stats.c[name], 0) for name in STAT_COLUMNS))
+                 .select_from(students.outerjoin(student_stats, student_stats.c.student_id == students.c.id)))
+        with self.engine.connect() as conn:
+            return {student_id: dict(zip(STAT_COLUMNS, values)) for student_id, *values in conn.execute(query)}
+
+    def totals(self):
+        return self._one(select(*(stat_totals.c[name] for name in STAT_COLUMNS)).where(stat_totals.c.id == 1))
+
+    def average_score(self, student_id=None):
+        stats = self.totals() if student_id is None else self.student_stats(student_id)
+        return stats['score_sum'] / stats['feedback'] if stats['feedback'] else 0
+
+    def verify_aggregates(self):
+        """Recount the aggregates from scratch; returns a list of mismatches.
+
+        Counters and recount are read by one statement, so writes committed
+        meanwhile cannot show up as drift.
+        """
+        recount = self._recount().subquery()
+        query = (select(recount, *(student_stats.c[name].label(f'counted_{name}') for name in STAT_COLUMNS),
+                        *(select(stat_totals.c[name]).where(stat_totals.c.id == 1).scalar_subquery()
+                          .label(f'total_{name}') for name in STAT_COLUMNS))
+                 .select_from(recount.outerjoin(student_stats, student_stats.c.student_id == recount.c.student_id)))
+        mismatches = []
+        expected_totals, actual_totals = self._empty_stats(), None
+        for row in self._all(query):
+            wanted = {name: row[name] for name in STAT_COLUMNS}
+            actual = {name: row[f'counted_{name}'] for name in STAT_COLUMNS}
+            if row['counted_submissions'] is None:
+                actual = None
+            if actual != wanted:
+                mismatches.append((row['student_id'], actual, wanted))
+            for name in STAT_COLUMNS:
+                expected_totals[name] += wanted[name]
+            actual_totals = {name: row[f'total_{name}'] for name in STAT_COLUMNS}
+        if actual_totals is None:
+            actual_totals = self.totals()
+        if actual_totals != expected_totals:
+            mismatches.append(('totals', actual_totals, expected_totals))
+        return mismatches
+
+    # Study groups
+
+    def _groups(self, query):
+        """Load groups together with their member lists in two queries"""
+        groups = self._all(query)
+        if not groups:
+            return groups
+        by_id = {group['id']: group for group in groups}
+        for group in groups:
+            group['members'] = []
+        member_query = (select(group_members).where(group_members.c.group_id.in_(by_id))
+                        .order_by(group_members.c.group_id))
+        with self.engine.connect() as conn:
+            for group_id, student_id in conn.execute(member_query):
+                by_id[group_id]['members'].append(student_id)
+        return groups
+
+    def add_group(self, group):
+        values = {key: value for key, value in group.items() if key in study_groups.c}
+        with self.engine.begin() as conn:
+            group['id'] = conn.execute(insert(study_groups).values(**values)).inserted_primary_key[0]
+            if group['members']:
+                conn.execute(insert(group_members),
+                             [{'group_id': group['id'], 'student_id': member_id} for member_id in group['members']])
+        return group
+
+    def get_group(self, group_id):
+        groups = self._groups(select(study_groups).where(study_groups.c.id == group_id))
+        return groups[0] if groups else None
+
+    def all_groups(self):
+        return self._groups(select(study_groups).order_by(study_groups.c.id))
+
+    def groups_for_student(self, student_id):
+        member_of = select(group_members.c.group_id).where(group_members.c.student_id == student_id)
+        return self._groups(select(study_groups).where(study_groups.c.id.in_(member_of))
+                            .order_by(study_groups.c.id))
+
+    def is_group_member(self, group_id, student_id):
+        return self._scalar(select(group_members.c.group_id).where(group_members.c.group_id == group_id,
+                                                                   group_members.c.student_id == student_id)) is not None
+
+    def add_group_member(self, group_id, student_id):
+        """Add a student to a group; returns False if they were already a member"""
+        if self._scalar(select(study_groups.c.id).where(study_groups.c.id == group_id)) is None:
+            return False
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(insert(group_members).values(group_id=group_id, student_id=student_id))
+        except IntegrityError:
+            # Already a member, possibly added by a concurrent request
+            if not self.is_group_member(group_id, student_id):
+                raise
+            return False
+        return True
+
+    # Pair programming sessions
+
+    def add_session(self, session):
+        return self._insert(pair_sessions, session)
+
+    def get_session(self, session_id):
+        return self._one(select(pair_sessions).where(pair_sessions.c.id == session_id))
+
+    def update_session_code(self, session_id, code, version=None):
+        """Replace a session's code buffer; returns False if the session is unknown.
+
+        With ``version``, the update is conditional on the stored version
+        being the one before it, so a writer whose copy is behind (another
+        worker wrote since) changes nothing.
+        """
+        query = update(pair_sessions).where(pair_sessions.c.id == session_id)
+        if version is not None:
+            query = query.where(pair_sessions.c.version == version - 1).values(version=version)
+        with self.engine.begin() as conn:
+            result = conn.execute(query.values(code=code))
+        return result.rowcount > 0
+
+    def active_sessions_for_student(self, student_id):
+        return self._all(select(pair_sessions)
+                         .where(pair_sessions.c.active,
+                                or_(pair_sessions.c.student1_id == student_id,
+                                    pair_sessions.c.student2_id == student_id))
+                         .order_by(pair_sessions.c.id))
+
+    # Code shares
+
+    def add_share(self, share):
+        return self._insert(code_shares, share)
+
+    def get_share(self, share_id):
+        return self._one(select(code_shares).where(code_shares.c.id == share_id))
+
+    def all_shares(self):
+        return self._all(select(code_shares).order_by(code_shares.c.id))
+
+    def iter_shares(self, after=None, limit=None):
+        return self._iter(self._page(select(code_shares), code_shares.c.id, after, limit))
+
+    def count_shares(self, help_needed=None):
+        query = select(func.count()).select_from(code_shares)
+        if help_needed:
+            query = query.where(code_shares.c.help_needed)
+        return self._scalar(query)
+
+    def shares_for_student(self, student_id, limit=None):
+        query = select(code_shares).where(code_shares.c.student_id == student_id).order_by(code_shares.c.id.desc())
+        if limit:
+            query = query.limit(limit)
+        return self._all(query)[::-1]
+
+    # Group messages
+
+    def add_message(self, message):
+        return self._insert(group_messages, message)
+
+    def get_message(self, message_id):
+        return self._one(select(group_messages).where(group_messages.c.id == message_id))
+
+    def messages_for_group(self, group_id, after=None, limit=None):
+        return self._all(self._page(select(group_messages).where(group_messages.c.group_id == group_id),
+                                    group_messages.c.id, after, limit))
+
+    # Change feed
+
+    def append_change(self, origin, kind, payload):
+        with self.engine.begin() as conn:
+            conn.execute(insert(changes).values(origin=origin, kind=kind, payload=payload, created_at=time.time()))
+
+    def changes_after(self, change_id, limit=None):
+        """Changes with ids above ``change_id``, oldest first"""
+        return self._all(self._page(select(changes), changes.c.id, change_id, limit))
+
+    def first_change_id(self):
+        return self._scalar(select(func.min(changes.c.id))) or 0
+
+    def last_change_id(self):
+        return self._scalar(select(func.max(changes.c.id))) or 0
+
+    def prune_changes(self, before):
+        """Delete changes published before ``before`` (seconds since the epoch)"""
+        with self.engine.begin() as conn:
+            conn.execute(delete(changes).where(changes.c.created_at < before))
+
+    # Background jobs
+
+    def add_job(self, record):
+        """Store a new job's status record; returns the job id"""
+        with self.engine.begin() as conn:
+            job_id = conn.execute(insert(jobs).values(state=record['state'], record={})).inserted_primary_key[0]
+            conn.execute(update(jobs).where(jobs.c.id == job_id).values(record=dict(record, id=job_id)))
+        return job_id
+
+    def update_job(self, record):
+        with self.engine.begin() as conn:
+            conn.execute(update(jobs).where(jobs.c.id == record['id']).values(state=record['state'], record=record))
+
+    def get_job(self, job_id):
+        return self._scalar(select(jobs.c.record).where(jobs.c.id == job_id))
+
+    def delete_job(self, job_id):
+        with self.engine.begin() as conn:
+            conn.execute(delete(jobs).where(jobs.c.id == job_id))
+
+    def prune_jobs(self, before_id):
+        """Delete the records of finished jobs with ids below ``before_id``"""
+        with self.engine.begin() as conn:
+            conn.execute(delete(jobs).where(jobs.c.id < before_id, jobs.c.state.in_(('succeeded', 'failed'))))
@@ -0,0 +1,542 @@
+"""Indexed in-memory data store for the dashboard.
+
+Records are kept as plain dicts (the templates read them directly), stored in
+primary-key dicts with secondary indexes so route lookups are O(1) instead of
+linear scans over every list. Listings page through sorted id lists with a
+cursor (the last id seen), so each page costs O(log n + page size).
+
+The store is safe to share between request threads. Writes, including id
+allocation and the index and aggregate updates that go with them, are
+serialized by one lock. Reads take no lock: each is a dict lookup or a
+C-level copy of a list or dict (atomic under the GIL), and id lists are
+sliced before iterating. Group member lists, which templates iterate, are
+replaced instead of appended to. The store lives in one process, so the
+app serves from one worker with it; several workers share the sql backend
+instead (see gunicorn.conf.py).
+
+Answers, shared code and pair session buffers are kept in a content-addressed
+``BlobStore`` (deduplicated, compressed when large): stored records hold the
+blob key, and reads return copies with the text filled back in.
+"""
+import functools
+import threading
+from bisect import bisect_right, insort
+from collections import defaultdict
+
+from blobs import BlobStore
+
+# Text field of each table that lives in the blob store
+BLOB_FIELDS = {'submissions': 'answer', 'code_shares': 'code', 'pair_sessions': 'code'}
+# Reads of a record rewritten while they run, before giving up on its text
+HYDRATE_ATTEMPTS = 5
+
+
+def _locked(method):
+    """Run a method under the store's lock"""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+
+class DataStore:
+    """In-memory repository with primary-key dicts and secondary indexes"""
+
+    TABLES = ('students', 'questions', 'submissions', 'feedback', 'study_groups',
+              'pair_sessions', 'code_shares', 'group_messages')
+
+    def __init__(self, blobs=None):
+        # Reentrant so bulk loads and compound writes can call other writers
+        self._lock = threading.RLock()
+        self.blobs = blobs if blobs is not None else BlobStore()
+        self._tables = {name: {} for name in self.TABLES}
+        self._next_ids = {name: 1 for name in self.TABLES}
+
+        # Secondary indexes
+        self._submissions_by_student = defaultdict(dict)
+        self._submissions_by_question = defaultdict(dict)
+        self._submission_by_pair = {}
+        self._student_by_email = {}
+        # Per-student question status: question id -> submission/feedback ids and score
+        self._status_by_student = defaultdict(dict)
+        self._feedback_by_submission = {}
+        self._feedback_by_student = defaultdict(dict)
+        self._groups_by_student = defaultdict(dict)
+        self._sessions_by_student = defaultdict(dict)
+        self._shares_by_student = defaultdict(dict)
+        self._messages_by_group = defaultdict(list)
+
+        # Ascending id lists for cursor pagination
+        self._question_ids = []
+        self._share_ids = []
+        self._submission_ids_by_student = defaultdict(list)
+        self._submission_ids_by_question = defaultdict(list)
+        self._help_needed_shares = 0
+
+        # Running analytics aggregates, maintained on every write
+        self._student_stats = defaultdict(self._empty_stats)
+        self._totals = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats():
+        return {'submissions': 0, 'feedback': 0, 'score_sum': 0}
+
+    # Generic helpers
+
+    def _insert(self, table, record):
+        """Store a record, allocating its id if it does not have one yet.
+
+        Returns the stored record: for tables with a blob field that is a
+        copy holding the blob key, and ``record`` itself keeps its text.
+        """
+        if 'id' not in record:
+            record['id'] = self._next_ids[table]
+        self._next_ids[table] = max(self._next_ids[table], record['id'] + 1)
+        field = BLOB_FIELDS.get(table)
+        stored = record
+        if field is not None:
+            stored = dict(record)
+            stored[field] = self.blobs.put(record[field])
+        self._tables[table][record['id']] = stored
+        return stored
+
+    def _hydrate(self, table, record):
+        """A copy of a stored record with the text of its blob field, or None"""
+        if record is None:
+            return None
+        field = BLOB_FIELDS[table]
+        for _ in range(HYDRATE_ATTEMPTS):
+            key = record[field]
+            try:
+                return dict(record, **{field: self.blobs.get(key)})
+            except KeyError:
+                # Rewritten since it was looked up, and the old text released
+                record = self._tables[table].get(record['id'], record)
+                if record[field] == key:
+                    break
+        raise RuntimeError(f'{table} record {record["id"]} has no text in the blob store '
+                           f'(key {record[field].hex()})')
+
+    @staticmethod
+    def _add_ordered(ids, record_id):
+        """Keep ``ids`` sorted; new records almost always go at the end.
+
+        Readers only ever copy slices of these lists, so shifting entries
+        in place cannot show them a torn list.
+        """
+        if not ids or record_id > ids[-1]:
+            ids.append(record_id)
+        else:
+            insort(ids, record_id)
+
+    def _iter_ids(self, table, ids, after=None, limit=None):
+        """Yield records of ``table`` whose ids come after the ``after`` cursor, in id order"""
+        start = bisect_right(ids, after) if after is not None else 0
+        page = ids[start:] if limit is None else ids[start:start + limit]
+        records = self._tables[table]
+        for record_id in page:
+            yield self._hydrate(table, records[record_id]) if table in BLOB_FIELDS else records[record_id]
+
+    def next_id(self, table):
+        """Peek at the id the next insert into ``table`` will receive"""
+        return self._next_ids[table]
+
+    @_locked
+    def load(self, **tables):
+        """Bulk-load seed records, e.g. ``load(students=[...], questions=[...])``"""
+        adders = {
+            'students': self.add_student,
+            'questions': self.add_question,
+            'submissions': self.add_submission,
+            'feedback': self.set_feedback,
+            'study_groups': self.add_group,
+            'pair_sessions': self.add_session,
+            'code_shares': self.add_share,
+            'group_messages': self.add_message,
+        }
+        for table, records in tables.items():
+            add = adders[table]
+            for record in records:
+                add(record)
+
+    @_locked
+    def add_many(self, table, records):
+        """Insert a batch of records (students or questions) atomically.
+
+        Returns the records skipped because they clash with a unique key,
+        i.e. students whose email is already registered.
+        """
+        skipped = []
+        for record in records:
+            if table == 'students' and record['email'] in self._student_by_email:
+                skipped.append(record)
+            else:
+                self.load(**{table: [record]})
+        return skipped
+
+    # Students
+
+    @_locked
+    def add_student(self, student):
+        self._insert('students', student)
+        self._student_by_email[student['email']] = student
+        return student
+
+    def get_student(self, student_id):
+        return self._tables['students'].get(student_id)
+
+    def all_students(self):
+        return list(self._tables['students'].values())
+
+    def iter_students(self):
+        """Every student, oldest first"""
+        return iter(self.all_students())
+
+    def registered_emails(self, emails):
+        """The subset of ``emails`` that already belong to a student"""
+        return {email for email in emails if email in self._student_by_email}
+
+    def count_students(self):
+        return len(self._tables['students'])
+
+    def student_name(self, student_id):
+        student = self.get_student(student_id)
+        return student['name'] if student else 'Unknown'
+
+    # Questions
+
+    @_locked
+    def add_question(self, question):
+        self._insert('questions', question)
+        self._add_ordered(self._question_ids, question['id'])
+        return question
+
+    def get_question(self, question_id):
+        return self._tables['questions'].get(question_id)
+
+    def all_questions(self):
+        return list(self._tables['questions'].values())
+
+    def iter_questions(self, after=None, limit=None):
+        return self._iter_ids('questions', self._question_ids, after, limit)
+
+    def count_questions(self):
+        return len(self._tables['questions'])
+
+    @_locked
+    def update_question(self, question_id, fields):
+        """Set ``fields`` on a question; returns the updated question or None"""
+        question = self._tables['questions'].get(question_id)
+        if question is None:
+            return None
+        # Replaced, not changed in place, as readers may hold the old dict
+        question = self._tables['questions'][question_id] = dict(question, **fields)
+        return question
+
+    @_locked
+    def close_question(self, question_id, closed_at):
+        """Record that a question's submission window has closed.
+
+        Returns False if it was already claimed (or is unknown); the check and
+        the write are atomic, so one caller starts the close-out work.
+        """
+        question = self._tables['questions'].get(question_id)
+        if question is None or question.get('closed_at'):
+            return False
+        self._tables['questions'][question_id] = dict(question, closed_at=closed_at)
+        return True
+
+    def pending_windows(self, now):
+        """Questions whose window opens after ``now`` or whose close has not finished yet"""
+        return [question for question in list(self._tables['questions'].values())
+                if (question.get('opens_at') or '') > now
+                or (question.get('closes_at') and not question.get('close_summary'))]
+
+    # Submissions
+
+    @_locked
+    def add_submission(self, submission):
+        stored = self._insert('submissions', submission)
+        student_id, question_id = submission['student_id'], submission['question_id']
+        self._submissions_by_student[student_id][submission['id']] = stored
+        self._submissions_by_question[question_id][submission['id']] = stored
+        self._submission_by_pair[(student_id, question_id)] = stored
+        self._status_by_student[student_id][question_id] = {
+            'submission_id': submission['id'], 'feedback_id': None, 'score': None}
+        self._add_ordered(self._submission_ids_by_student[student_id], submission['id'])
+        self._add_ordered(self._submission_ids_by_question[question_id], submission['id'])
+        self._student_stats[student_id]['submissions'] += 1
+        self._totals['submissions'] += 1
+        return submission
+
+    @_locked
+    def add_submission_if_new(self, submission):
+        """Add a submission unless the student already answered the question.
+
+        Returns False for a repeat; the check and the insert are atomic.
+        """
+        if (submission['student_id'], submission['question_id']) in self._submission_by_pair:
+            return False
+        self.add_submission(submission)
+        return True
+
+    def get_submission(self, submission_id):
+        return self._hydrate('submissions', self._tables['submissions'].get(submission_id))
+
+    def find_submission(self, student_id, question_id):
+        """Return the submission a student made for a question, if any"""
+        return self._hydrate('submissions', self._submission_by_pair.get((student_id, question_id)))
+
+    def iter_submissions(self):
+        """Every submission, oldest first"""
+        for submission in list(self._tables['submissions'].values()):
+            yield self._hydrate('submissions', submission)
+
+    def submissions_for_student(self, student_id):
+        return [self._hydrate('submissions', submission)
+                for submission in list(self._submissions_by_student.get(student_id, {}).values())]
+
+    def submissions_for_question(self, question_id):
+        return [self._hydrate('submissions', submission)
+                for submission in list(self._submissions_by_question.get(question_id, {}).values())]
+
+    def submission_details_for_question(self, question_id, after=None, limit=None):
+        """Submissions for a question joined with student name and feedback, in id order"""
+        ids = self._submission_ids_by_question.get(question_id, [])
+        for submission in self._iter_ids('submissions', ids, after, limit):
+            # Already a copy
+            submission.update(student_name=self.student_name(submission['student_id']),
+                              feedback=self.feedback_for_submission(submission['id']))
+            yield submission
+
+    def submission_details_for_student(self, student_id, after=None, limit=None):
+        """Submissions by a student joined with question title/type and feedback, in id order"""
+        ids = self._submission_ids_by_student.get(student_id, [])
+        for submission in self._iter_ids('submissions', ids, after, limit):
+            question = self.get_question(submission['question_id'])
+            submission.update(question_title=question['title'] if question else 'Unknown',
+                              question_type=question['type'] if question else 'Unknown',
+                              feedback=self.feedback_for_submission(submission['id']))
+            yield submission
+
+    def iter_grades(self, question_id=None):
+        """Every submission (or a question's) joined with student, question title and feedback, in id order"""
+        if question_id is None:
+            rows = self.iter_submissions()
+        else:
+            rows = self._iter_ids('submissions', self._submission_ids_by_question.get(question_id, []))
+        for submission in rows:
+            student = self.get_student(submission['student_id'])
+            question = self.get_question(submission['question_id'])
+            submission.update(student_name=student['name'] if student else 'Unknown',
+                              student_email=student['email'] if student else None,
+                              question_title=question['title'] if question else 'Unknown',
+                              feedback=self.feedback_for_submission(submission['id']))
+            yield submission
+
+    def question_status(self, student_id):
+        """Question id -> ``{submission_id, feedback_id, score}`` for every question the student answered"""
+        return dict(self._status_by_student.get(student_id, {}))
+
+    def count_submissions(self, student_id=None, question_id=None):
+        if student_id is not None:
+            return len(self._submissions_by_student.get(student_id, ()))
+        if question_id is not None:
+            return len(self._submissions_by_question.get(question_id, ()))
+        return len(self._tables['submissions'])
+
+    # Feedback
+
+    @_locked
+    def set_feedback(self, new_feedback):
+        """Store feedback for a submission, replacing any earlier feedback for it"""
+        previous = self._feedback_by_submission.get(new_feedback['submission_id'])
+        if previous is not None:
+            del self._tables['feedback'][previous['id']]
+            del self._feedback_by_student[previous['student_id']][previous['id']]
+            self._count_feedback(previous, -1)
+        self._insert('feedback', new_feedback)
+        self._feedback_by_submission[new_feedback['submission_id']] = new_feedback
+        self._feedback_by_student[new_feedback['student_id']][new_feedback['id']] = new_feedback
+        self._count_feedback(new_feedback, 1)
+        # Replaced rather than updated, so a copy handed to a reader stays consistent
+        self._status_by_student[new_feedback['student_id']][new_feedback['question_id']] = {
+            'submission_id': new_feedback['submission_id'], 'feedback_id': new_feedback['id'],
+            'score': new_feedback['score']}
+        return new_feedback
+
+    def _count_feedback(self, record, sign):
+        """Apply (sign=1) or retract (sign=-1) a feedback record from the aggregates"""
+        for stats in (self._student_stats[record['student_id']], self._totals):
+            stats['feedback'] += sign
+            stats['score_sum'] += sign * record['score']
+
+    def feedback_for_submission(self, submission_id):
+        return self._feedback_by_submission.get(submission_id)
+
+    def iter_feedback(self):
+        """Every feedback record"""
+        return iter(list(self._tables['feedback'].values()))
+
+    def feedback_for_student(self, student_id):
+        return list(self._feedback_by_student.get(student_id, {}).values())
+
+    def count_feedback(self, student_id=None):
+        if student_id is None:
+            return len(self._tables['feedback'])
+        return len(self._feedback_by_student.get(student_id, ()))
+
+    # Analytics aggregates
+
+    def student_stats(self, student_id):
+        """Precomputed submission/feedback counts and score sum for a student"""
+        stats = self._student_stats.get(student_id)
+        return dict(stats) if stats else self._empty_stats()
+
+    def all_student_stats(self):
+        """Precomputed stats for every student, keyed by student id"""
+        return {student_id: self.student_stats(student_id) for student_id in list(self._tables['students'])}
+
+    def totals(self):
+        """Precomputed global submission/feedback counts and score sum"""
+        return dict(self._totals)
+
+    def average_score(self, student_id=None):
+        stats = self.totals() if student_id is None else self.student_stats(student_id)
+        return stats['score_sum'] / stats['feedback'] if stats['feedback'] else 0
+
+    @_locked
+    def verify_aggregates(self):
+        """Recompute the aggregates from scratch; returns a list of mismatches"""
+        expected = defaultdict(self._empty_stats)
+        for submission in self._tables['submissions'].values():
+            expected[submission['student_id']]['submissions'] += 1
+        for record in self._tables['feedback'].values():
+            expected[record['student_id']]['feedback'] += 1
+            expected[record['student_id']]['score_sum'] += record['score']
+
+        expected_totals = self._empty_stats()
+        for stats in expected.values():
+            for key, value in stats.items():
+                expected_totals[key] += value
+
+        mismatches = []
+        for student_id in set(expected) | set(self._student_stats):
+            actual = self.student_stats(student_id)
+            wanted = expected.get(student_id, self._empty_stats())
+            if actual != wanted:
+                mismatches.append((student_id, actual, wanted))
+        if self._totals != expected_totals:
+            mismatches.append(('totals', dict(self._totals), expected_totals))
+        return mismatches
+
+    # Study groups
+
+    @_locked
+    def add_group(self, group):
+        self._insert('study_groups', group)
+        for member_id in group['members']:
+            self._groups_by_student[member_id][group['id']] = group
+        return group
+
+    def get_group(self, group_id):
+        return self._tables['study_groups'].get(group_id)
+
+    def all_groups(self):
+        return list(self._tables['study_groups'].values())
+
+    def groups_for_student(self, student_id):
+        return list(self._groups_by_student.get(student_id, {}).values())
+
+    def is_group_member(self, group_id, student_id):
+        return group_id in self._groups_by_student.get(student_id, ())
+
+    @_locked
+    def add_group_member(self, group_id, student_id):
+        """Add a student to a group; returns False if they were already a member"""
+        group = self.get_group(group_id)
+        if group is None or self.is_group_member(group_id, student_id):
+            return False
+        # Copy-on-write: pages rendering the old member list keep a stable copy
+        group['members'] = group['members'] + [student_id]
+        self._groups_by_student[student_id][group_id] = group
+        return True
+
+    # Pair programming sessions
+
+    @_locked
+    def add_session(self, session):
+        stored = self._insert('pair_sessions', session)
+        self._sessions_by_student[session['student1_id']][session['id']] = stored
+        self._sessions_by_student[session['student2_id']][session['id']] = stored
+        return session
+
+    def get_session(self, session_id):
+        return self._hydrate('pair_sessions', self._tables['pair_sessions'].get(session_id))
+
+    @_locked
+    def update_session_code(self, session_id, code, version=None):
+        """Replace a session's code buffer; returns False if the session is unknown.
+
+        With ``version``, the buffer is only replaced if that version follows
+        the stored one, so writes applied out of order are refused.
+        """
+        session = self._tables['pair_sessions'].get(session_id)
+        if session is None:
+            return False
+        if version is not None:
+            if version != session.get('version', 0) + 1:
+                return False
+            session['version'] = version
+        previous, session['code'] = session['code'], self.blobs.put(code)
+        self.blobs.release(previous)
+        return True
+
+    def active_sessions_for_student(self, student_id):
+        return [self._hydrate('pair_sessions', s)
+                for s in list(self._sessions_by_student.get(student_id, {}).values()) if s['active']]
+
+    # Code shares
+
+    @_locked
+    def add_share(self, share):
+        stored = self._insert('code_shares', share)
+        self._shares_by_student[share['student_id']][share['id']] = stored
+        self._add_ordered(self._share_ids, share['id'])
+        self._help_needed_shares += bool(share.get('help_needed'))
+        return share
+
+    def get_share(self, share_id):
+        return self._hydrate('code_shares', self._tables['code_shares'].get(share_id))
+
+    def all_shares(self):
+        return [self._hydrate('code_shares', share) for share in list(self._tables['code_shares'].values())]
+
+    def iter_shares(self, after=None, limit=None):
+        return self._iter_ids('code_shares', self._share_ids, after, limit)
+
+    def count_shares(self, help_needed=None):
+        if help_needed:
+            return self._help_needed_shares
+        return len(self._tables['code_shares'])
+
+    def shares_for_student(self, student_id, limit=None):
+        shares = list(self._shares_by_student.get(student_id, {}).values())
+        return [self._hydrate('code_shares', share) for share in (shares[-limit:] if limit else shares)]
+
+    # Group messages
+
+    @_locked
+    def add_message(self, message):
+        self._insert('group_messages', message)
+        self._messages_by_group[message['group_id']].append(message)
+        return message
+
+    def get_message(self, message_id):
+        return self._tables['group_messages'].get(message_id)
+
+    def messages_for_group(self, group_id, after=None, limit=None):
+        messages = self._messages_by_group.get(group_id, [])
+        start = bisect_right(messages, after, key=lambda message: message['id']) if after is not None else 0
+        return messages[start:start + limit] if limit else messages[start:]
@@ -0,0 +1,31 @@
+"""Snapshots of the analytics columns do not change under later writes."""
+import numpy as np
+
+from analytics import CohortAnalytics
+
+
+def submissions(count):
+    return [{'id': n, 'student_id': n % 7, 'question_id': n % 3, 'submitted_at': '2026-01-01 10:00:00'}
+            for n in range(1, count + 1)]
+
+
+def test_snapshot_keeps_its_scores_when_scores_change():
+    analytics = CohortAnalytics()
+    analytics.add_submissions(submissions(100))
+    analytics.set_scores([{'submission_id': n, 'score': 50} for n in range(1, 101)])
+    snapshot = analytics.snapshot()
+    analytics.set_scores([{'submission_id': n, 'score': 90} for n in range(1, 101)])
+    analytics.add_submissions(submissions(200)[100:])
+    assert np.all(snapshot['score'] == 50) and len(snapshot['score']) == 100
+    assert np.all(analytics.snapshot()['score'][:100] == 90)
+
+
+def test_scores_are_updated_in_place_when_no_snapshot_is_out():
+    analytics = CohortAnalytics()
+    analytics.add_submissions(submissions(10))
+    analytics.snapshot()
+    analytics.set_score({'submission_id': 1, 'score': 10})
+    column = analytics._columns['score']
+    analytics.set_score({'submission_id': 2, 'score': 20})
+    assert analytics._columns['score'] is column
+    assert list(analytics.snapshot()['score'][:2]) == [10, 20]
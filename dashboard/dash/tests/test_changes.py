@@ -0,0 +1,87 @@
+"""Processes sharing a database apply each other's changes and job records."""
+import time
+
+import pytest
+
+from changes import ChangeFeed
+from jobs import JobQueue
+from pair_sync import PairSyncHub
+from sql_store import SqlStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqlStore(f'sqlite:///{tmp_path / "shared.db"}')
+    store.load(students=[{'id': 1, 'name': 'A', 'email': 'a@example.edu'},
+                         {'id': 2, 'name': 'B', 'email': 'b@example.edu'}],
+               pair_sessions=[{'id': 1, 'student1_id': 1, 'student2_id': 2, 'problem_title': 'P',
+                               'code': '', 'started_at': '2026-01-01 00:00:00', 'active': True}])
+    return store
+
+
+def feed_with_log(store):
+    feed, log = ChangeFeed(store), []
+    feed.register('note')(log.append)
+    return feed, log
+
+
+def test_changes_reach_the_other_processes_once(store):
+    first, first_log = feed_with_log(store)
+    second, second_log = feed_with_log(store)
+
+    first.publish('note', 'one')
+    first.publish('note', 'two')
+    assert second.poll() == 2
+    assert second_log == ['one', 'two']
+    # Nothing twice, and nothing back to the publisher
+    assert second.poll() == 0
+    assert first.poll() == 0
+    assert first_log == []
+
+
+def test_a_process_that_missed_changes_rebuilds(store):
+    first, _ = feed_with_log(store)
+    second, second_log = feed_with_log(store)
+    rebuilt = []
+    second.on_resync(lambda: rebuilt.append(True))
+
+    first.publish('note', 'lost')
+    store.prune_changes(time.time() + 1)
+    first.publish('note', 'kept')
+    second.poll()
+    assert rebuilt == [True] and second_log == []
+    first.publish('note', 'next')
+    second.poll()
+    assert second_log == ['next']
+
+
+def test_job_status_is_readable_from_every_process(store):
+    first, second = JobQueue(workers=1, journal=store), JobQueue(workers=1, journal=store)
+    first.register('add')(lambda a, b: a + b)
+    second.register('add')(lambda a, b: a + b)
+    job_id = first.enqueue('add', 1, 2)
+    assert second.enqueue('add', 3, 4) != job_id
+
+    deadline = time.time() + 10
+    while second.status(job_id)['state'] != 'succeeded' and time.time() < deadline:
+        time.sleep(0.05)
+    assert second.status(job_id)['result'] == 3
+    first.shutdown()
+    second.shutdown()
+
+
+def test_pair_edits_are_pushed_by_the_other_process(store):
+    feeds, hubs = {}, {}
+    for name in ('first', 'second'):
+        feeds[name] = ChangeFeed(store)
+        hubs[name] = PairSyncHub(store, on_version=lambda *args, feed=feeds[name]: feed.publish('pair', *args))
+        feeds[name].register('pair')(hubs[name].receive)
+    _, subscriber = hubs['second'].subscribe(1, client_id='b')
+    subscriber.get_nowait()
+
+    assert hubs['first'].apply(1, 0, {'start': 0, 'end': 0, 'text': 'x = 1'}, client_id='a')[0]
+    feeds['second'].poll()
+    assert '"text": "x = 1"' in subscriber.get_nowait()
+    assert hubs['second'].snapshot(1) == {'code': 'x = 1', 'version': 1}
+    # Current again, so its own next edit is not a conflict
+    assert hubs['second'].apply(1, 1, {'start': 5, 'end': 5, 'text': '\n'}, client_id='b')[0]
@@ -0,0 +1,66 @@
+"""Submissions cannot fake their grade from inside the sandbox."""
+import json
+
+import pytest
+
+from grader import Grader
+
+TESTS = {'function': 'add', 'unordered': False,
+         'cases': [{'args': [1, 2], 'expected': 3}, {'args': [5, 5], 'expected': 10}]}
+FORGED = json.dumps([{'passed': True, 'output': 3, 'time_ms': 0.0}] * 2)
+
+
+@pytest.fixture(scope='module')
+def grader():
+    grader = Grader(workers=1)
+    yield grader
+    grader.shutdown()
+
+
+def test_correct_answer_passes(grader):
+    assert grader.run('def add(a, b):\n    return a + b\n', TESTS)['score'] == 100
+
+
+def test_wrong_answer_reports_expected_and_actual(grader):
+    result = grader.run('def add(a, b):\n    return a - b\n', TESTS)
+    assert result['score'] == 0
+    assert result['results'][0]['error'] == 'expected 3, got -1'
+
+
+def test_patching_the_runner_comparison_does_not_pass(grader):
+    code = ("import sys\n"
+            "sys.modules['__main__'].normalize = lambda v, u: 0\n"
+            "def add(a, b):\n    return None\n")
+    assert grader.run(code, TESTS)['score'] == 0
+
+
+def test_forged_results_on_stdout_are_ignored(grader):
+    code = ("import sys, posix\n"
+            f"sys.__stdout__.write({FORGED!r})\n"
+            "sys.__stdout__.flush()\n"
+            "posix._exit(0)\n"
+            "def add(a, b):\n    return None\n")
+    result = grader.run(code, TESTS)
+    assert result['score'] == 0
+
+
+def test_forged_results_on_fd_1_are_ignored(grader):
+    code = ("import os\n"
+            f"os.write(1, {FORGED!r}.encode())\n"
+            "def add(a, b):\n    return None\n")
+    assert grader.run(code, TESTS)['score'] == 0
+
+
+def test_runner_frames_are_out_of_reach(grader):
+    code = ("def add(a, b):\n"
+            "    try:\n        raise ValueError\n"
+            "    except ValueError as e:\n        return e.__traceback__.tb_frame.f_back.f_globals['__name__']\n")
+    result = grader.run(code, TESTS)
+    assert result['score'] == 0
+    assert 'object.__getattr__ is not allowed' in result['results'][0]['error']
+
+
+def test_each_case_gets_a_fresh_namespace(grader):
+    code = ("calls = []\n"
+            "def add(a, b):\n    calls.append(1)\n    return a + b + len(calls) - 1\n")
+    assert grader.run(code, TESTS)['score'] == 100
@@ -0,0 +1,64 @@
+"""Pair session channels are loaded outside the hub lock and evicted when idle."""
+import time
+
+import pytest
+
+from blobs import BlobStore
+from pair_sync import PairSyncHub
+from store import DataStore
+
+
+@pytest.fixture
+def store():
+    store = DataStore()
+    store.load(students=[{'id': 1, 'name': 'A', 'email': 'a@example.edu'},
+                         {'id': 2, 'name': 'B', 'email': 'b@example.edu'}],
+               pair_sessions=[{'id': 1, 'student1_id': 1, 'student2_id': 2, 'problem_title': 'P',
+                               'code': 'print(1)', 'started_at': '2026-01-01 00:00:00', 'active': True}])
+    return store
+
+
+def test_store_is_read_outside_the_hub_lock(store):
+    hub = PairSyncHub(store)
+    get_session = store.get_session
+
+    def checked_get_session(session_id):
+        assert not hub._lock.locked()
+        return get_session(session_id)
+
+    store.get_session = checked_get_session
+    assert hub.channel(1).code == 'print(1)'
+    assert hub.channel(2) is None
+
+
+def test_idle_channels_are_evicted_and_reloaded(store):
+    blobs = BlobStore()
+    hub = PairSyncHub(store, blobs=blobs, idle_timeout=0.05)
+    assert hub.apply(1, 0, {'start': 0, 'end': 0, 'text': '# '})[0]
+    subscriber_id, _ = hub.subscribe(1)
+    time.sleep(0.1)
+
+    # Watched channels stay, however long since the last edit
+    hub.channel(2)
+    assert hub.metrics()['sessions'] == 1
+
+    hub.unsubscribe(1, subscriber_id)
+    time.sleep(0.1)
+    hub.channel(2)
+    assert hub.metrics()['sessions'] == 0
+    assert hub.metrics()['evicted'] == 1
+    assert len(blobs) == 0
+
+    # The next request reloads the session as stored
+    assert hub.snapshot(1) == {'code': '# print(1)', 'version': 1}
+
+
+def test_closing_a_session_ends_its_streams(store):
+    blobs = BlobStore()
+    hub = PairSyncHub(store, blobs=blobs)
+    _, subscriber = hub.subscribe(1)
+    hub.close(1)
+    subscriber.get_nowait()
+    assert subscriber.get_nowait() is None
+    assert hub.metrics()['sessions'] == 0
+    assert len(blobs) == 0
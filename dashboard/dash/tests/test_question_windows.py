@@ -0,0 +1,43 @@
+"""Question windows keep closing when the job queue is backlogged."""
+import time
+
+import pytest
+
+import app as app_module
+from jobs import JobQueueFull, LocalBroker
+
+
+class FullBroker(LocalBroker):
+    def put(self, job_id, timeout=None):
+        raise JobQueueFull('Job queue is full')
+
+
+@pytest.fixture
+def question():
+    return app_module.store.add_question({
+        'type': 'interview', 'title': 'Window', 'description': 'D', 'difficulty': 'Easy',
+        'created_at': '2026-01-01 00:00:00', 'assigned_to': 'all', 'closes_at': '2026-01-02 00:00:00'})
+
+
+def test_close_is_rescheduled_when_the_job_queue_is_full(question, monkeypatch):
+    monkeypatch.setattr(app_module.job_queue, 'broker', FullBroker())
+    scheduler = app_module.scheduler
+    scheduler.cancel(('closes', question['id']))
+
+    app_module.question_closes(question['id'])
+    assert ('closes', question['id']) in scheduler.wheel
+
+    # Once the queue has room, the retried close runs the close-out job
+    monkeypatch.undo()
+    assert scheduler.run_due(time.time() + 10) >= 1
+    deadline = time.time() + 10
+    while not app_module.store.get_question(question['id']).get('close_summary') and time.time() < deadline:
+        time.sleep(0.05)
+    assert app_module.store.get_question(question['id'])['close_summary']
+
+
+def test_first_request_starts_the_scheduler():
+    app_module.scheduler.shutdown()
+    assert not app_module.scheduler.metrics()['running']
+    app_module.app.test_client().get('/api/scheduler_stats')
+    assert app_module.scheduler.metrics()['running']
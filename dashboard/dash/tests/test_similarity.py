@@ -0,0 +1,41 @@
+"""Prose answers are compared by their words, not by their shape as code."""
+from similarity import SimilarityIndex, fingerprint_submission
+
+INTERVIEW = {'id': 1, 'type': 'interview'}
+CODING = {'id': 2, 'type': 'coding'}
+
+
+def submission(submission_id, student_id, answer, question):
+    return {'id': submission_id, 'student_id': student_id, 'question_id': question['id'], 'answer': answer}
+
+
+def test_different_prose_answers_are_not_flagged():
+    index = SimilarityIndex()
+    # As code tokens (every word a V) these two look 77% alike
+    first = ('Hash tables give constant time lookups because each key maps straight to a bucket through '
+             'its hash, which makes them great when you need fast membership checks over many items.')
+    second = ('Recursion lets a function solve a problem by calling itself on smaller pieces until reaching '
+              'a base condition, which often gives shorter code than an explicit loop over every item.')
+    fingerprint_submission(index, submission(1, 1, first, INTERVIEW), INTERVIEW)
+    assert fingerprint_submission(index, submission(2, 2, second, INTERVIEW), INTERVIEW) == []
+
+
+def test_copied_prose_answer_is_flagged():
+    index = SimilarityIndex()
+    answer = ('I would start by asking the interviewer about the expected load, then sketch a simple '
+              'design with one database and a cache in front of it before worrying about sharding.')
+    fingerprint_submission(index, submission(1, 1, answer, INTERVIEW), INTERVIEW)
+    matches = fingerprint_submission(index, submission(2, 2, answer.replace('simple', 'basic'), INTERVIEW),
+                                     INTERVIEW)
+    assert [record_id for _, record_id, _ in matches] == [1]
+
+
+def test_renamed_code_is_flagged():
+    index = SimilarityIndex()
+    code = ('def two_sum(nums, target):\n    seen = {}\n    for i, n in enumerate(nums):\n'
+            '        if target - n in seen:\n            return [seen[target - n], i]\n'
+            '        seen[n] = i\n    return []\n')
+    fingerprint_submission(index, submission(1, 1, code, CODING), CODING)
+    renamed = code.replace('seen', 'index').replace('nums', 'values')
+    matches = fingerprint_submission(index, submission(2, 2, renamed, CODING), CODING)
+    assert [record_id for _, record_id, _ in matches] == [1]
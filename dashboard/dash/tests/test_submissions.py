@@ -0,0 +1,66 @@
+"""Submitting an answer stores it and queues the rest of the work."""
+import time
+
+import pytest
+
+import app as app_module
+from jobs import JobQueueFull, LocalBroker
+
+
+class FullBroker(LocalBroker):
+    def put(self, job_id, timeout=None):
+        raise JobQueueFull('Job queue is full')
+
+
+TWO_SUM = '''def two_sum(nums, target):
+    seen = {}
+    for index, value in enumerate(nums):
+        if target - value in seen:
+            return [seen[target - value], index]
+        seen[value] = index
+'''
+
+
+@pytest.fixture
+def question():
+    return app_module.store.add_question({
+        'type': 'coding', 'title': 'Two Sum again', 'description': 'D', 'difficulty': 'Easy',
+        'created_at': '2026-01-01 00:00:00', 'assigned_to': 'all',
+        'tests': app_module.seed_questions[0]['tests']})
+
+
+def submit(question, answer):
+    app_module.app.test_client().post('/student/submit_answer', data={
+        'student_id': 1, 'question_id': question['id'], 'answer': answer})
+    return app_module.store.submissions_for_question(question['id'])[-1]
+
+
+def test_submit_queues_indexing_and_grading(question, monkeypatch):
+    queued = []
+    monkeypatch.setattr(app_module.job_queue, 'enqueue', lambda name, *args: queued.append((name, args)))
+    analysed = len(app_module.cohort_analytics)
+    indexed = app_module.similarity_index.metrics()['indexed']
+
+    submission = submit(question, TWO_SUM)
+    assert queued == [('index_submission', (submission['id'],))]
+    assert len(app_module.cohort_analytics) == analysed
+    assert app_module.similarity_index.metrics()['indexed'] == indexed
+
+    # The job indexes the answer, then queues its grading
+    monkeypatch.undo()
+    assert app_module.index_submission_job(submission['id']) == {'graded': True}
+    assert len(app_module.cohort_analytics) == analysed + 1
+    assert app_module.similarity_index.metrics()['indexed'] == indexed + 1
+    deadline = time.time() + 30
+    while not app_module.store.feedback_for_submission(submission['id']) and time.time() < deadline:
+        time.sleep(0.05)
+    assert app_module.store.feedback_for_submission(submission['id'])['score'] == 100
+
+
+def test_submit_indexes_inline_when_the_job_queue_is_full(question, monkeypatch):
+    monkeypatch.setattr(app_module.job_queue, 'broker', FullBroker())
+    analysed = len(app_module.cohort_analytics)
+
+    submission = submit(question, 'def two_sum(nums, target):\n    return []')
+    assert len(app_module.cohort_analytics) == analysed + 1
+    assert not app_module.store.feedback_for_submission(submission['id'])
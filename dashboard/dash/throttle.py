@@ -0,0 +1,233 @@
+"""Rate limiting and request coalescing for the polling endpoints.
+
+Open pair programming tabs poll and save on fixed timers, and every
+professor dashboard reloads the analytics. ``RateLimiter`` gives each
+client a token bucket per rule (``rate`` tokens a second, up to ``burst``)
+and answers 429 with ``Retry-After`` once it is empty. ``SingleFlight``
+lets concurrent identical reads share one computation: the first caller
+runs it and the others wait for its result. ``StreamLimit`` caps the
+Server-Sent Events streams open at once: each holds a request thread for as
+long as its tab is open, so past the cap new streams are refused (503) and
+those clients poll instead of taking the threads every other request needs.
+
+Buckets live in a ``LocalBackend``, held in this process's memory; anything
+with the same ``take``/``__len__`` methods (a shared store for several
+workers, say) can replace it. With several gunicorn workers each one keeps
+its own buckets, so a client gets up to ``workers`` times the rate.
+"""
+import functools
+import math
+import threading
+import time
+
+from flask import jsonify, make_response
+
+
+class LocalBackend:
+    """Token buckets in a dict, for one process"""
+
+    def __init__(self, max_keys=100_000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        # key -> [tokens, updated, time the bucket is full again]
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.stats = {'pruned': 0}
+
+    def take(self, key, rate, burst, cost=1):
+        """Take ``cost`` tokens from ``key``'s bucket.
+
+        Returns ``(allowed, tokens left, seconds until cost tokens are available)``.
+        """
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = [tokens, now, now + (burst - tokens) / rate]
+        return allowed, tokens, 0.0 if allowed else (cost - tokens) / rate
+
+    def _prune(self, now):
+        # A full bucket is the same as no bucket; if too few have refilled,
+        # drop the half closest to full (those clients get their burst early)
+        full = [key for key, bucket in self._buckets.items() if bucket[2] <= now]
+        if len(full) < self.max_keys // 10:
+            by_refill = sorted(self._buckets, key=lambda key: self._buckets[key][2])
+            full = by_refill[:len(by_refill) // 2]
+        for key in full:
+            del self._buckets[key]
+        self.stats['pruned'] += len(full)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RateLimiter:
+    """Per-client token-bucket limits on views"""
+
+    def __init__(self, backend=None, enabled=True):
+        self.backend = backend if backend is not None else LocalBackend()
+        self.enabled = enabled
+        self.rules = {}
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def limit(self, name, rate, burst, key):
+        """Decorator allowing ``rate`` requests a second (bursts of ``burst``) per key.
+
+        ``key`` is called with the view arguments and returns the bucket the
+        request draws from (e.g. client and session), or None for no limit.
+        """
+        self.rules[name] = {'rate': rate, 'burst': burst}
+        self.stats[name] = {'allowed': 0, 'limited': 0}
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                bucket = key(**kwargs) if self.enabled else None
+                if bucket is None:
+                    return view(*args, **kwargs)
+
+                allowed, tokens, retry_after = self.backend.take(f'{name}:{bucket}', rate, burst)
+                with self._lock:
+                    self.stats[name]['allowed' if allowed else 'limited'] += 1
+                if not allowed:
+                    retry_after = math.ceil(retry_after)
+                    response = jsonify({'success': False, 'error': 'Too many requests',
+                                        'retry_after': retry_after})
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(retry_after)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                response.headers['X-RateLimit-Limit'] = str(burst)
+                response.headers['X-RateLimit-Remaining'] = str(int(tokens))
+                return response
+            return wrapper
+        return decorator
+
+    def metrics(self):
+        with self._lock:
+            rules = {name: dict(self.rules[name], **counts) for name, counts in self.stats.items()}
+        return {'enabled': self.enabled, 'buckets': len(self.backend), 'rules': rules,
+                'backend': dict(getattr(self.backend, 'stats', {}))}
+
+
+class _Stream:
+    """A streaming response body that gives its slot back when the server closes it"""
+
+    def __init__(self, limit, frames):
+        self._limit = limit
+        self._frames = frames
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._frames)
+
+    def close(self):
+        # Called by the WSGI server when the response ends or the client has gone,
+        # even if the body was never iterated
+        if self._closed:
+            return
+        self._closed = True
+        self._limit._release()
+        close = getattr(self._frames, 'close', None)
+        if close is not None:
+            close()
+
+
+class StreamLimit:
+    """At most ``limit`` streaming responses open at once in this process"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._open = 0
+        self._lock = threading.Lock()
+        self.stats = {'opened': 0, 'refused': 0}
+
+    def open(self, frames):
+        """``frames`` as a response body holding a slot until it is closed, or None if all are taken"""
+        with self._lock:
+            if self._open >= self.limit:
+                self.stats['refused'] += 1
+                return None
+            self._open += 1
+            self.stats['opened'] += 1
+        return _Stream(self, frames)
+
+    def _release(self):
+        with self._lock:
+            self._open -= 1
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, open=self._open, limit=self.limit)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent calls for the same key share the first caller's result"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'computed': 0, 'shared': 0, 'errors': 0}
+
+    def do(self, key, function):
+        """``function()``'s result, computed once for all callers waiting on ``key``.
+
+        Only calls that overlap share a result: the key is free again as
+        soon as the computation finishes. An exception is raised in every
+        waiting caller.
+        """
+        if not self.enabled:
+            return function()
+        with self._lock:
+            self.stats['calls'] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.stats['shared'] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = function()
+        except BaseException as exc:
+            flight.error = exc
+            with self._lock:
+                self.stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self.stats['computed'] += 1
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats, in_flight=len(self._flights))
+        stats['shared_rate'] = stats['shared'] / stats['calls'] if stats['calls'] else 0.0
+        return stats